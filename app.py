@@ -16,9 +16,27 @@ with sqlite3.connect("data.db", timeout=30) as conn:
     conn.execute("PRAGMA synchronous = NORMAL;")
     conn.execute("PRAGMA locking_mode = EXCLUSIVE;")
 
+# Dauern aus Datenbanken früherer Versionen einmalig auf ganze Sekunden umstellen
+from helpers import migrate_duration_storage, normalize_existing_data
+migrate_duration_storage("data.db")
+
+# Dimensionswerte aus älteren Importen einmalig normalisieren; video/non_video werden
+# dabei neu aufgebaut, ihre Cubes hier gleich mit (der Bitmap-Index folgt beim ersten Zugriff)
+if normalize_existing_data("data.db"):
+    from cube import materialize_cubes
+    for tbl in ("video", "non_video"):
+        try:
+            materialize_cubes(tbl, "data.db")
+        except Exception as e:
+            print(f"⚠️ Cube für {tbl} nicht erstellt: {e}")
+
 # 3) Server‐Objekt für Deployment
 server = app.server
 
+# Download-Route für Exporte aus dem Spool-Verzeichnis
+from export_jobs import register_export_routes
+register_export_routes(server)
+
 # 4) Layout und Callback‐Registrierung
 from layout import create_layout
 from callbacks import register_callbacks
@@ -0,0 +1,105 @@
+// table_ops.js – clientseitige Zeilenoperationen für die Prozentwert-Tabellen
+//
+// Auswahl, Duplizieren, Löschen, "Wert übernehmen" und Zelländerungen laufen ohne
+// Server-Roundtrip auf der sichtbaren Seite. Alle Änderungen werden zusätzlich im
+// Diff-Store der Tabelle gesammelt:
+//   {updated: {id: zeile}, added: [zeile, ...], deleted: [id, ...], next_id: -n}
+// Neue Zeilen erhalten negative, vorläufige IDs. Erst "Update Percentages" (bzw.
+// ein Seitenwechsel) schickt den Diff an den Server (table_backend.apply_diff).
+
+(function () {
+    var noUpdate = function () { return window.dash_clientside.no_update; };
+
+    function copyDiff(diff) {
+        diff = diff || {};
+        return {
+            updated: Object.assign({}, diff.updated || {}),
+            added: (diff.added || []).slice(),
+            deleted: (diff.deleted || []).slice(),
+            next_id: diff.next_id || -1
+        };
+    }
+
+    function markUpdated(diff, row) {
+        if (row.id < 0) {
+            diff.added = diff.added.map(function (r) { return r.id === row.id ? row : r; });
+        } else {
+            diff.updated[row.id] = row;
+        }
+    }
+
+    function markDeleted(diff, id) {
+        if (id < 0) {
+            diff.added = diff.added.filter(function (r) { return r.id !== id; });
+        } else {
+            delete diff.updated[id];
+            if (diff.deleted.indexOf(id) < 0) {
+                diff.deleted.push(id);
+            }
+        }
+    }
+
+    function validRows(data, selected) {
+        return (selected || []).filter(function (i) { return i >= 0 && i < data.length; });
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        table_ops: {
+            select_all: function (n, data) {
+                if (!n) { return noUpdate(); }
+                return (data || []).map(function (_, i) { return i; });
+            },
+
+            deselect_all: function (n) {
+                if (!n) { return noUpdate(); }
+                return [];
+            },
+
+            duplicate: function (n, data, selected, diff) {
+                var rows = validRows(data || [], selected);
+                if (!n || !rows.length) { return [noUpdate(), noUpdate()]; }
+                diff = copyDiff(diff);
+                var copies = rows.map(function (i) {
+                    var row = Object.assign({}, data[i], {id: diff.next_id});
+                    diff.next_id -= 1;
+                    diff.added.push(row);
+                    return row;
+                });
+                return [data.concat(copies), diff];
+            },
+
+            delete_rows: function (n, data, selected, diff) {
+                var rows = validRows(data || [], selected);
+                if (!n || !rows.length) { return [noUpdate(), noUpdate(), noUpdate()]; }
+                diff = copyDiff(diff);
+                rows.forEach(function (i) { markDeleted(diff, data[i].id); });
+                var kept = data.filter(function (_, i) { return rows.indexOf(i) < 0; });
+                return [kept, [], diff];
+            },
+
+            apply_field: function (n, data, selected, field, value, diff) {
+                var rows = validRows(data || [], selected);
+                if (!n || !rows.length || !field) { return [noUpdate(), noUpdate()]; }
+                diff = copyDiff(diff);
+                var out = data.slice();
+                rows.forEach(function (i) {
+                    out[i] = Object.assign({}, out[i]);
+                    out[i][field] = value;
+                    markUpdated(diff, out[i]);
+                });
+                return [out, diff];
+            },
+
+            record_edits: function (timestamp, data, previous, diff) {
+                if (!data || !previous) { return noUpdate(); }
+                var before = {};
+                previous.forEach(function (row) { before[row.id] = JSON.stringify(row); });
+                var changed = data.filter(function (row) { return before[row.id] !== JSON.stringify(row); });
+                if (!changed.length) { return noUpdate(); }
+                diff = copyDiff(diff);
+                changed.forEach(function (row) { markUpdated(diff, row); });
+                return diff;
+            }
+        }
+    });
+})();
@@ -0,0 +1,158 @@
+# bench_nonvideo_percentages.py – Vergleich alte vs. neue Prozentwert-Berechnung (Non-Video)
+#
+# Aufruf aus dem Projektverzeichnis:
+#   python benchmarks/bench_nonvideo_percentages.py [Zeilen]
+#
+# Erzeugt eine synthetische non_video-Tabelle (Standard: 1.000.000 Zeilen) und misst
+# die frühere Berechnung (apply je Zeile, fünf groupby-Aufrufe, vier Merges) gegen
+# percentages.nonvideo_percentages – einmal mit distinct counts aus dem gruppierten
+# Durchlauf, einmal aus dem (beim Import gebauten) Bitmap-Index. Die Ergebnisse
+# werden zusätzlich verglichen.
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bitmap_index import BidBitmapIndex
+from percentages import nonvideo_percentages
+
+
+def make_nonvideo(n_rows, seed=0):
+    """Synthetische non_video-Daten: mehrere Zeilen je bid, EA-Werte variieren innerhalb der bid."""
+    rng = np.random.default_rng(seed)
+    n_bids = max(n_rows // 5, 1)
+    bid = rng.integers(0, n_bids, n_rows)
+    countries = np.array([f"Country {i}" for i in range(40)])
+    channels = np.array([f"Channel {i}" for i in range(400)])
+    sponsors = np.array([f"Sponsor {i}" for i in range(25)])
+    tools = np.array([f"Tool {i}" for i in range(12)])
+    ave_100 = rng.gamma(2.0, 500.0, n_rows).round(2)
+    ave_100[rng.random(n_rows) < 0.02] = 0
+    return pd.DataFrame({
+        "bid": bid.astype(str),
+        "hr_basis": np.where(bid % 4 == 0, "HR", "Basis"),
+        "country": countries[bid % len(countries)],
+        "channel": channels[(bid // len(countries)) % len(channels)],
+        "sponsor": sponsors[rng.integers(0, len(sponsors), n_rows)],
+        "tool": tools[rng.integers(0, len(tools), n_rows)],
+        "mentions": rng.integers(1, 5, n_rows),
+        "ave_100": ave_100,
+        "ave_weighted": (ave_100 * rng.uniform(0.1, 0.6, n_rows)).round(2),
+    })
+
+
+def legacy_percentages(df_nonvideo, mm_dims, ea_dims):
+    """Frühere Berechnung aus calculate_nonvideo_percentages (ohne Formatierung)."""
+    group_by_all = mm_dims + ea_dims
+    df_basis = df_nonvideo[df_nonvideo['hr_basis'] == 'Basis'].copy()
+    overall_bid_count = df_basis['bid'].nunique()
+
+    df_basis['weight_ratio'] = df_basis.apply(
+        lambda r: (r['ave_weighted'] / r['ave_100']) if r['ave_100'] > 0 else 0,
+        axis=1
+    )
+    overall_avg_weighting = df_basis['weight_ratio'].mean() * 100
+
+    if ea_dims:
+        avg_weighting_df = (
+            df_basis.groupby(ea_dims, as_index=False)['weight_ratio']
+                    .mean()
+                    .rename(columns={'weight_ratio': 'avg_weighting_factor'})
+        )
+        avg_weighting_df['avg_weighting_factor'] *= 100
+    else:
+        avg_weighting_df = None
+
+    bid_mm_df = (
+        df_basis.groupby(mm_dims, as_index=False)['bid']
+                .nunique()
+                .rename(columns={'bid': 'bid_mm_kombo'})
+    )
+    ea_hits_df = (
+        df_basis.groupby(group_by_all, as_index=False)['bid']
+                .nunique()
+                .rename(columns={'bid': 'ea_hits'})
+    )
+    df_hr = df_nonvideo[df_nonvideo['hr_basis'] == 'HR']
+    bid_mm_hr_df = (
+        df_hr.groupby(mm_dims, as_index=False)['bid']
+             .nunique()
+             .rename(columns={'bid': 'bid_mm_kombo_hr'})
+    )
+
+    df_groups = df_basis[group_by_all].drop_duplicates().reset_index(drop=True)
+    df_result = df_groups.copy()
+    df_result = pd.merge(df_result, bid_mm_df, on=mm_dims, how='left')
+    df_result = pd.merge(df_result, ea_hits_df, on=group_by_all, how='left')
+    df_result = pd.merge(df_result, bid_mm_hr_df, on=mm_dims, how='left')
+    df_result['overall_bid_count'] = overall_bid_count
+    if ea_dims and avg_weighting_df is not None:
+        df_result = pd.merge(df_result, avg_weighting_df, on=ea_dims, how='left')
+    else:
+        df_result['avg_weighting_factor'] = overall_avg_weighting
+
+    df_result['hit_percentage'] = df_result.apply(
+        lambda row: (row['ea_hits'] / row['bid_mm_kombo'] * 100)
+                    if row.get('bid_mm_kombo', 0) > 0 else 0,
+        axis=1
+    )
+    df_result['ids_for_HR'] = (
+        df_result['bid_mm_kombo_hr'] * df_result['hit_percentage'] / 100
+    ).round(0)
+
+    mentions_df = (
+        df_basis.groupby(group_by_all, as_index=False)['mentions']
+        .sum()
+        .rename(columns={'mentions': 'sum_mentions'})
+    )
+    df_result = pd.merge(df_result, mentions_df, on=group_by_all, how='left')
+    df_result['avg_mentions'] = df_result.apply(
+        lambda row: max(round(row['sum_mentions'] / row['ea_hits']), 1)
+                    if row['ea_hits'] > 0 else 1,
+        axis=1
+    )
+    return df_result[df_result['ea_hits'] > 0], overall_bid_count
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"Erzeuge {n_rows:,} Zeilen ...")
+    df = make_nonvideo(n_rows)
+    index, t_index = _timed(BidBitmapIndex, df)
+    print(f"Bitmap-Index gebaut (einmalig beim Import): {t_index:.2f}s")
+
+    def indexed_counts(keys, hr_basis, df_groups):
+        return index.distinct_counts(df_groups[keys], {"hr_basis": hr_basis})
+
+    for mm_dims, ea_dims in ((["country"], ["sponsor"]),
+                             (["country", "channel"], ["sponsor", "tool"])):
+        (old, _), t_old = _timed(legacy_percentages, df, mm_dims, ea_dims)
+        (new, _), t_new = _timed(nonvideo_percentages, df, mm_dims, ea_dims)
+        (idx, _), t_idx = _timed(nonvideo_percentages, df, mm_dims, ea_dims, indexed_counts)
+
+        cols = list(old.columns)
+        values = cols[len(mm_dims + ea_dims):]
+        same = all(
+            list(res.columns) == cols
+            and np.allclose(old[values].fillna(0).to_numpy(dtype=float),
+                            res[values].fillna(0).to_numpy(dtype=float))
+            for res in (new, idx)
+        )
+        print(f"MM={mm_dims} EA={ea_dims}: {len(new):,} Gruppen | "
+              f"alt {t_old:.2f}s | neu {t_new:.2f}s | Bitmap-Index {t_idx:.2f}s | "
+              f"Faktor {t_old / t_new:.1f}x / {t_old / t_idx:.1f}x | identisch: {same}")
+
+
+if __name__ == "__main__":
+    main()
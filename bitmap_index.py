@@ -0,0 +1,311 @@
+# bitmap_index.py – Bitmap-Index der bids je Dimensionswert
+#
+# Jede bid erhält eine Surrogat-ID (0..n_bids-1). Für jeden Wert einer indizierten
+# Spalte wird die Menge der bids mit diesem Wert gespeichert – dünn besetzt als
+# sortiertes uint32-Array, dicht besetzt als gepacktes Bitset. COUNT(DISTINCT bid)
+# für eine UND-Kombination von Dimensionswerten ist dann eine Schnittmenge plus
+# Popcount, ohne die Rohdaten erneut zu gruppieren.
+#
+# Für viele Gruppen auf einmal (Prozentwerte, Basecheck) wäre eine Schnittmenge
+# je Gruppe zu langsam. Der Index hält deshalb zusätzlich die Wertcodes: je bid für
+# Spalten mit genau einem Wert je bid, je Zeile für die übrigen. distinct_counts
+# zählt damit alle Gruppen in einem vektorisierten Durchlauf über ganzzahlige
+# Codes statt über die Textwerte der Rohdaten.
+
+import os
+import pickle
+import shutil
+import sqlite3
+import numpy as np
+import pandas as pd
+
+from helpers import get_generation
+from normalize import DIMENSION_COLUMNS
+
+BITMAP_DIR = "cache/bitmaps"
+
+# Indizierte Spalten: hr_basis sowie alle MM- und EA-Dimensionen
+INDEX_COLUMNS = DIMENSION_COLUMNS
+
+# Ab diesem Anteil an allen bids wird ein Wert als Bitset statt als Array gespeichert
+# (ein uint32 je bid gegenüber einem Bit je möglicher bid)
+_DENSE_RATIO = 1 / 32
+
+# Bis zu so vielen Gruppen zählt distinct_counts per Schnittmenge je Gruppe,
+# darüber in einem gruppierten Durchlauf über die Codes
+_INTERSECT_MAX_GROUPS = 64
+
+_LOADED = {}
+
+
+def _compact(codes, n_values):
+    """Kleinster vorzeichenbehafteter Ganzzahltyp für Codes von -1 bis n_values - 1."""
+    return codes.astype(np.int16 if n_values < np.iinfo(np.int16).max else np.int32)
+
+
+def _make_container(ids, n_bids):
+    """Wählt die kompaktere Darstellung für eine sortierte Menge von bid-IDs."""
+    if len(ids) > n_bids * _DENSE_RATIO:
+        mask = np.zeros(n_bids, dtype=bool)
+        mask[ids] = True
+        return ("b", np.packbits(mask, bitorder="little"))
+    return ("a", ids.astype(np.uint32))
+
+
+def _intersect_count(containers):
+    """Popcount der Schnittmenge mehrerer Container."""
+    sparse = sorted((c[1] for c in containers if c[0] == "a"), key=len)
+    dense = [c[1] for c in containers if c[0] == "b"]
+    if sparse:
+        ids = sparse[0]
+        for other in sparse[1:]:
+            if not len(ids):
+                return 0
+            ids = np.intersect1d(ids, other, assume_unique=True)
+        for bits in dense:
+            if not len(ids):
+                return 0
+            ids = ids[((bits[ids >> 3] >> (ids & 7).astype(np.uint8)) & 1).astype(bool)]
+        return len(ids)
+    acc = dense[0]
+    for bits in dense[1:]:
+        acc = acc & bits
+    return int(np.bitwise_count(acc).sum())
+
+
+class BidBitmapIndex:
+    """
+    Bitmap-Index über eine Tabelle. Spalten, deren Wert innerhalb einer bid variiert
+    (typischerweise EA-Dimensionen wie sponsor oder tool), werden als "nicht funktional"
+    markiert: Schneidet eine Abfrage mehrere davon, wird für genau diese Kombination
+    ein zusammengesetzter Index gebildet, damit die Zählung exakt bleibt.
+    """
+
+    def __init__(self, df, columns=INDEX_COLUMNS):
+        bid_codes, _ = pd.factorize(df["bid"])
+        self.n_bids = int(bid_codes.max()) + 1 if len(bid_codes) else 0
+        valid = bid_codes >= 0
+        self._bid_codes = bid_codes[valid].astype(np.int32)
+
+        self.values = {}          # Spalte -> {Wert: Container}
+        self.functional = set()   # Spalten mit genau einem Wert je bid
+        self._uniques = {}        # Spalte -> Werte der Codes
+        self._bid_values = {}     # funktionale Spalte -> Code je bid
+        self._row_codes = {}      # nicht funktionale Spalte -> Code je Zeile
+        self._composite = {}      # Spaltenkombination -> {Wertetupel: Container}
+
+        for col in columns:
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[col])
+            codes = _compact(codes[valid], len(uniques))
+            self._uniques[col] = pd.Index(uniques)
+
+            # (bid, Wert)-Paare inkl. fehlender Werte (-1) als ein int64-Schlüssel
+            width = len(uniques) + 1
+            keys = np.unique(self._bid_codes.astype(np.int64) * width + codes + 1)
+            pair_bids, pair_codes = keys // width, keys % width - 1
+            if len(pair_bids) == len(np.unique(pair_bids)):
+                self.functional.add(col)
+                per_bid = np.full(self.n_bids, -1, dtype=codes.dtype)
+                per_bid[pair_bids] = pair_codes
+                self._bid_values[col] = per_bid
+            else:
+                self._row_codes[col] = codes
+
+            found = pair_codes >= 0
+            self.values[col] = self._containers(pair_codes[found], pair_bids[found], uniques)
+
+    def covers(self, columns):
+        """True, wenn alle `columns` indiziert sind."""
+        return all(col in self.values for col in columns)
+
+    def _containers(self, value_codes, bid_ids, uniques):
+        """Teilt (Wert, bid)-Paare – sortiert nach Wert – in Container je Wert auf."""
+        order = np.lexsort((bid_ids, value_codes))
+        value_codes, bid_ids = value_codes[order], bid_ids[order]
+        bounds = np.flatnonzero(np.diff(value_codes)) + 1
+        out = {}
+        for chunk_codes, chunk_ids in zip(np.split(value_codes, bounds), np.split(bid_ids, bounds)):
+            if len(chunk_codes):
+                out[uniques[chunk_codes[0]]] = _make_container(chunk_ids, self.n_bids)
+        return out
+
+    def _codes(self, col):
+        """Codes von `col` je Zeile."""
+        if col in self.functional:
+            return self._bid_values[col][self._bid_codes]
+        return self._row_codes[col]
+
+    def _composite_containers(self, cols):
+        key = tuple(cols)
+        if key not in self._composite:
+            frame = pd.DataFrame({c: self._row_codes[c] for c in cols})
+            frame["_bid"] = self._bid_codes
+            frame = frame[(frame[list(cols)] >= 0).all(axis=1)].drop_duplicates()
+            combo_codes, combos = pd.factorize(pd.MultiIndex.from_frame(frame[list(cols)]))
+            labels = [
+                tuple(self._uniques[c][code] for c, code in zip(cols, combo))
+                for combo in combos
+            ]
+            self._composite[key] = self._containers(
+                combo_codes.astype(np.int64), frame["_bid"].to_numpy(dtype=np.int64), labels
+            )
+        return self._composite[key]
+
+    def distinct_count(self, conditions):
+        """
+        COUNT(DISTINCT bid) über alle Zeilen, die sämtliche `conditions` (Spalte -> Wert)
+        erfüllen. Fehlende Werte (NaN) zählen wie beim groupby nicht als Treffer.
+        """
+        containers = []
+        varying = []
+        for col, val in conditions.items():
+            if pd.isna(val):
+                return 0
+            if col in self.functional:
+                container = self.values[col].get(val)
+                if container is None:
+                    return 0
+                containers.append(container)
+            else:
+                varying.append((col, val))
+
+        if len(varying) == 1:
+            col, val = varying[0]
+            container = self.values[col].get(val)
+            if container is None:
+                return 0
+            containers.append(container)
+        elif varying:
+            cols = [c for c, _ in varying]
+            container = self._composite_containers(cols).get(tuple(v for _, v in varying))
+            if container is None:
+                return 0
+            containers.append(container)
+
+        if not containers:
+            return self.n_bids
+        return _intersect_count(containers)
+
+    def _count_pass(self, cols, fixed, extra=None):
+        """
+        Gemeinsamer Durchlauf von group_counts und distinct_counts: Alle Zeilen (bzw.
+        bids), die `fixed` erfüllen und in allen `cols` einen Wert haben, erhalten einen
+        ganzzahligen Schlüssel ihrer Wertekombination; `extra` (Codes je Spalte, z. B.
+        der abgefragten Gruppen, -1 = unbekannt) wird im selben Schlüsselraum kodiert.
+        Liefert (Codes der Zeilen, Schlüssel der Zeilen, distinct bids je Schlüssel,
+        Schlüssel von `extra`).
+        """
+        fixed = {c: v for c, v in fixed.items() if c not in cols}
+        # Nur Spalten mit einem Wert je bid: direkt über die bids, jede bid zählt einmal
+        per_bid = all(c in self.functional for c in list(cols) + list(fixed))
+        code_of = self._bid_values.__getitem__ if per_bid else self._codes
+        codes = [code_of(c) for c in cols]
+        keep = np.logical_and.reduce([c >= 0 for c in codes])
+        for col, val in fixed.items():
+            code = self._uniques[col].get_indexer([val])[0]
+            keep &= code_of(col) == (code if code >= 0 else -2)
+        codes = [c[keep] for c in codes]
+        n_rows = len(codes[0])
+
+        key = np.zeros(n_rows + (len(extra[0]) if extra is not None else 0), dtype=np.int64)
+        for i, col in enumerate(cols):
+            code = codes[i].astype(np.int64)
+            if extra is not None:
+                code = np.concatenate([code, extra[i]])
+            key = key * (len(self._uniques[col]) + 1) + code + 1
+            if i + 1 < len(cols) and key.max(initial=0) > np.iinfo(np.int32).max:
+                key = pd.factorize(key)[0].astype(np.int64)  # Schlüsselraum verdichten
+        key = pd.factorize(key)[0].astype(np.int64)
+        row_key, extra_key = key[:n_rows], key[n_rows:]
+
+        distinct = row_key
+        if not per_bid and n_rows:
+            # Je (Kombination, bid) nur einmal zählen
+            distinct = np.unique(row_key * self.n_bids + self._bid_codes[keep]) // self.n_bids
+        counts = np.bincount(distinct, minlength=len(key) and int(key.max()) + 1)
+        return codes, row_key, counts, extra_key
+
+    def group_counts(self, cols, fixed=None):
+        """
+        COUNT(DISTINCT bid) für alle vorkommenden Wertekombinationen von `cols` (ohne
+        fehlende Werte), eingeschränkt auf `fixed` (Spalte -> Wert). Liefert ein
+        DataFrame mit `cols` und distinct_bid aus einem Durchlauf über die Codes.
+        """
+        cols = list(cols)
+        codes, row_key, counts, _ = self._count_pass(cols, fixed or {})
+        keys, first = np.unique(row_key, return_index=True)
+        result = pd.DataFrame({col: self._uniques[col].take(code[first]) for col, code in zip(cols, codes)})
+        result["distinct_bid"] = counts[keys]
+        return result
+
+    def distinct_counts(self, groups, fixed=None):
+        """
+        Zählt distinct bids für jede Zeile von `groups` (DataFrame mit Dimensionswerten),
+        jeweils zusätzlich eingeschränkt auf `fixed`. Wenige Gruppen per Schnittmenge,
+        viele in einem gemeinsamen Durchlauf über die Codes.
+        """
+        fixed = fixed or {}
+        cols = list(groups.columns)
+        if len(groups) <= _INTERSECT_MAX_GROUPS:
+            return np.array([
+                self.distinct_count({**fixed, **dict(zip(cols, row))})
+                for row in groups.itertuples(index=False, name=None)
+            ], dtype=np.int64)
+        extra = [self._uniques[col].get_indexer(groups[col]).astype(np.int64) for col in cols]
+        _, _, counts, group_key = self._count_pass(cols, fixed, extra)
+        # Gruppen mit unbekanntem oder fehlendem Wert zählen 0
+        known = np.logical_and.reduce([e >= 0 for e in extra])
+        return np.where(known, counts[group_key], 0).astype(np.int64)
+
+
+def _index_path(table):
+    return os.path.join(BITMAP_DIR, f"{table}.pkl")
+
+
+def build_index(table, df=None, db_path="data.db"):
+    """Baut den Bitmap-Index für `table` und legt ihn mit der Tabellengeneration ab."""
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        generation = get_generation(conn, table)
+        if df is None:
+            df = pd.read_sql(f"SELECT * FROM {table}", conn)
+
+    index = BidBitmapIndex(df)
+    os.makedirs(BITMAP_DIR, exist_ok=True)
+    payload = {"generation": generation, "index": index}
+    # Atomar ersetzen: andere Prozesse (Jobs) lesen nie eine halb geschriebene Datei
+    part = f"{_index_path(table)}.{os.getpid()}.part"
+    with open(part, "wb") as fh:
+        pickle.dump(payload, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(part, _index_path(table))
+    _LOADED[table] = payload
+    return index
+
+
+def get_index(table, df=None, db_path="data.db"):
+    """
+    Liefert den aktuellen Bitmap-Index für `table`. Fehlt er oder ist er veraltet,
+    wird er (aus `df`, falls übergeben) neu gebaut.
+    """
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        generation = get_generation(conn, table)
+
+    payload = _LOADED.get(table)
+    if payload is None or payload.get("generation") != generation:
+        # Evtl. hat ein anderer Prozess (Import-Job) den Index bereits neu gebaut
+        try:
+            with open(_index_path(table), "rb") as fh:
+                payload = pickle.load(fh)
+            _LOADED[table] = payload
+        except Exception:
+            payload = None
+    if payload is not None and payload.get("generation") == generation:
+        return payload["index"]
+    return build_index(table, df, db_path)
+
+
+def clear_indexes():
+    """Verwirft alle Bitmap-Indizes (z. B. beim Leeren der Datenbank)."""
+    _LOADED.clear()
+    shutil.rmtree(BITMAP_DIR, ignore_errors=True)
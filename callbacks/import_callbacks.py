@@ -1,24 +1,67 @@
-from dash import html, Output, Input, State, exceptions
+from dash import html, Output, Input, State, exceptions, ctx
 import pandas as pd
 import sqlite3
 import os
-from helpers import parse_contents, update_database, get_aggregated_data, get_aggregated_data_opposite, PARQUET_CACHE
+from helpers import (parse_contents, update_database, get_aggregated_data, get_aggregated_data_opposite,
+                     get_aggregated_summary, PARQUET_CACHE, bump_generation, build_media_tables)
+from cube import materialize_cubes, clear_cubes, query_cube, sketch_error
+from bitmap_index import build_index, clear_indexes
+from export_jobs import clear_spool
+from result_store import clear_cache as clear_result_cache
+from jobs import register_job
+from memo import clear_memo, memoized, memo_stats
+
+def _overview_tables(approx=False):
+    """
+    Aggregierte Übersichtstabellen (Bewegtbild / Nicht-Bewegtbild) aus den
+    Summentabellen (summary.py). Im approximativen Modus wird distinct_bid aus den HLL-Sketches der Basis-Cubes
+    geschätzt statt per COUNT(DISTINCT bid) über die Rohdaten gezählt.
+    """
+    tables = []
+    for loader, source in ((get_aggregated_data, "video"), (get_aggregated_data_opposite, "non_video")):
+        try:
+            estimates = query_cube(source, ["hr_basis"], approx=True, dropna=False) if approx else None
+            # Aus den beim Import gepflegten Summentabellen; ohne diese (ältere Datenbank)
+            # je Datenstand einmal über data abfragen (Memo-Cache)
+            with_distinct = estimates is None
+            df_agg = get_aggregated_summary(source, with_distinct)
+            if df_agg is None:
+                df_agg = memoized(loader.__name__, ["data"], [with_distinct],
+                                  lambda: loader(with_distinct=with_distinct))
+            if estimates is None:
+                label = "distinct_bid"
+            else:
+                # Sketch-Schätzung je hr_basis ergänzen
+                df_agg = df_agg.merge(estimates, on="hr_basis", how="left")
+                df_agg.insert(1, "distinct_bid", df_agg.pop("distinct_bid").fillna(0).astype(int))
+                label = f"distinct_bid (≈ ±{sketch_error() * 100:.1f}%)"
+            data = df_agg.to_dict("records")
+            cols = [{"name": label if c == "distinct_bid" else c, "id": c} for c in df_agg.columns]
+        except:
+            data, cols = [], []
+        tables.extend([data, cols])
+    return tables
+
 
 def register_import_callbacks(app):
-    @app.callback(
-        [
+    # Import als Hintergrund-Job (jobs.py) mit Fortschritt je Datei und Stufe
+    @register_job(
+        app, "import",
+        outputs=[
             Output("status", "children"),
             Output("aggregated-table-1", "data"),
             Output("aggregated-table-1", "columns"),
             Output("aggregated-table-2", "data"),
             Output("aggregated-table-2", "columns")
         ],
-        Input("upload-data", "contents"),
-        State("upload-data", "filename"),
-        State("mode-radio", "value"),
-        prevent_initial_call=True
+        inputs=[Input("upload-data", "contents")],
+        states=[
+            State("upload-data", "filename"),
+            State("mode-radio", "value"),
+            State("distinct-mode", "value"),
+        ],
     )
-    def update_on_upload(list_of_contents, list_of_names, mode):
+    def update_on_upload(job, list_of_contents, list_of_names, mode, distinct_mode):
         if not list_of_contents:
             return "", [], [], [], []
 
@@ -26,7 +69,8 @@ def register_import_callbacks(app):
         first_file = True
 
         # 1) Importiere und schreibe alle Dateien (replace/append)
-        for contents, filename in zip(list_of_contents, list_of_names):
+        for i, (contents, filename) in enumerate(zip(list_of_contents, list_of_names)):
+            job.progress(f"Datei {i + 1}/{len(list_of_names)} lesen ({filename})")
             if not filename.lower().startswith("report"):
                 status_messages.append(f"Datei {filename} übersprungen (Name beginnt nicht mit 'report').")
                 continue
@@ -38,6 +82,7 @@ def register_import_callbacks(app):
                 status_messages.append(f"❌ Fehler beim Lesen von {filename}: {e}")
                 continue
 
+            job.progress(f"Datei {i + 1}/{len(list_of_names)} schreiben – Zeilen gelesen", len(df))
             try:
                 update_database(df, mode, first_file)  # Bulk-Insert mit PRAGMA+chunksize :contentReference[oaicite:1]{index=1}
                 status_messages.append(f"✅ {filename} importiert ({len(df)} Zeilen).")
@@ -47,62 +92,48 @@ def register_import_callbacks(app):
                 continue
 
         db_path = "data.db"
+        job.progress("Tabellen video/non_video erstellen")
         # 2) Alle weiteren SQL-Schritte mit EINER Connection im WAL-Mode
         with sqlite3.connect(db_path, timeout=30) as conn:
             # wir setzen read_uncommitted einmalig hier (falls nötig)
             # conn.execute("PRAGMA read_uncommitted = 1;")
 
-            # 1) Video-Tabelle erstellen (C-optimiert)
-            conn.execute("DROP TABLE IF EXISTS video;")
-            conn.execute("""
-                CREATE TABLE video AS
-                SELECT *
-                FROM data
-                WHERE media = 'TV/OTT'
-                    OR (media = 'Social Media' AND LOWER(post_type) = 'video');
-            """)
-            # direkt die Anzahl holen, ohne Pandas
-            video_count = conn.execute("SELECT COUNT(*) FROM video;").fetchone()[0]
-            status_messages.append(f"Tabelle 'video': {video_count} Zeilen.")
-
-            # 2) Non-Video-Tabelle erstellen
-            conn.execute("DROP TABLE IF EXISTS non_video;")
-            conn.execute("""
-                CREATE TABLE non_video AS
-                SELECT *
-                FROM data
-                WHERE media IN ('Print','Online','Social Media')
-                AND (post_type IS NULL OR post_type = '' OR LOWER(post_type) <> 'video');
-            """)
-            nonvideo_count = conn.execute("SELECT COUNT(*) FROM non_video;").fetchone()[0]
-            status_messages.append(f"Tabelle 'non_video': {nonvideo_count} Zeilen.")
+            # 1) Video- und Non-Video-Tabelle erstellen (C-optimiert, ohne Pandas)
+            counts = build_media_tables(conn)
+            status_messages.append(f"Tabelle 'video': {counts['video']} Zeilen.")
+            status_messages.append(f"Tabelle 'non_video': {counts['non_video']} Zeilen.")
 
-            # 3) Fehlende broadcasting_time zählen
+            # 2) Fehlende broadcasting_time zählen
             missing_bt = conn.execute("""
                 SELECT COUNT(*)
                 FROM data
                 WHERE (media = 'TV/OTT'
-                        OR (media = 'Social Media' AND LOWER(post_type) = 'video'))
+                        OR (media = 'Social Media' AND post_type = 'Video'))
                 AND broadcasting_time IS NULL;
             """).fetchone()[0]
             if missing_bt:
                 status_messages.append(f"⚠️ {missing_bt} Zeilen ohne broadcasting_time.")
 
+            bump_generation(conn, "data", "video", "non_video")
 
-        # 3) Aggregierte Daten für die beiden Tables
-        try:
-            df_agg1 = get_aggregated_data()
-            data1 = df_agg1.to_dict("records")
-            cols1 = [{"name": c, "id": c} for c in df_agg1.columns]
-        except:
-            data1, cols1 = [], []
+        # Aggregat-Cubes für die häufig genutzten Dimensionskombinationen vorberechnen
+        for tbl in ("video", "non_video"):
+            job.progress(f"Cube für {tbl} erstellen")
+            try:
+                materialize_cubes(tbl, db_path)
+            except Exception as e:
+                status_messages.append(f"⚠️ Cube für {tbl} nicht erstellt: {e}")
 
+        # Bitmap-Index der bids für exakte distinct counts (Non-Video-Prozentwerte, Basecheck)
+        job.progress("Bitmap-Index für non_video erstellen")
         try:
-            df_agg2 = get_aggregated_data_opposite()
-            data2 = df_agg2.to_dict("records")
-            cols2 = [{"name": c, "id": c} for c in df_agg2.columns]
-        except:
-            data2, cols2 = [], []
+            build_index("non_video", db_path=db_path)
+        except Exception as e:
+            status_messages.append(f"⚠️ Bitmap-Index für non_video nicht erstellt: {e}")
+
+        # 3) Aggregierte Daten für die beiden Tables
+        job.progress("Übersicht berechnen")
+        data1, cols1, data2, cols2 = _overview_tables(distinct_mode == "approx")
 
         # 4) Ergebnis-Status in der UI
         return (
@@ -114,6 +145,20 @@ def register_import_callbacks(app):
 
 
 
+    # Umschalten exakt/approximativ berechnet die Importübersicht neu
+    @app.callback(
+        [
+            Output("aggregated-table-1", "data", allow_duplicate=True),
+            Output("aggregated-table-1", "columns", allow_duplicate=True),
+            Output("aggregated-table-2", "data", allow_duplicate=True),
+            Output("aggregated-table-2", "columns", allow_duplicate=True)
+        ],
+        Input("distinct-mode", "value"),
+        prevent_initial_call=True
+    )
+    def refresh_import_overview(distinct_mode):
+        return _overview_tables(distinct_mode == "approx")
+
     @app.callback(
         Output("clear-db-status", "children"),
         Input("clear-db-button", "n_clicks"),
@@ -135,11 +180,31 @@ def register_import_callbacks(app):
            # 2) VACUUM, um das File zu schrumpfen
             conn.execute("VACUUM;")
 
-        # 2) Parquet-Cache löschen
+        # 2) Parquet-Cache, Cubes, Bitmap-Indizes und Exporte löschen
         try:
             os.remove(PARQUET_CACHE)
         except FileNotFoundError:
             pass
+        clear_cubes()
+        clear_indexes()
+        # Generationszähler beginnen nach dem Leeren neu – gecachte Exporte verwerfen
+        clear_spool()
+        clear_result_cache()
+        clear_memo()
 
         return "✅ Alle Tabellen wurden geleert."
 
+    @app.callback(
+        Output("memo-stats-table", "data"),
+        Output("memo-status", "children"),
+        Input("memo-stats-refresh", "n_clicks"),
+        Input("memo-clear-button", "n_clicks"),
+        prevent_initial_call=True
+    )
+    def show_memo_stats(n_refresh, n_clear):
+        status = ""
+        if ctx.triggered_id == "memo-clear-button":
+            clear_memo()
+            status = "✅ Ergebnis-Cache geleert."
+        return memo_stats().to_dict("records"), status
+
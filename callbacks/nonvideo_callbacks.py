@@ -1,5 +1,5 @@
 # nonvideo_callbacks.py
-from dash import Input, Output, State, exceptions, dcc
+from dash import Input, Output, State, exceptions, dcc, no_update
 import pandas as pd
 import sqlite3
 import uuid
@@ -10,23 +10,65 @@ import openpyxl
 from openpyxl.utils import get_column_letter
 import plotly.express as px
 from math import ceil
+from contextlib import closing
+from helpers import bump_generation, get_generation, with_duration_dtypes
+from cube import cube_state, materialize_cubes, query_cube, note_usage, sketch_error
+from bitmap_index import get_index
+from export import (EXPORT_WORKERS, excel_bytes, split_zip, write_excel, write_parquet,
+                    write_feather, write_dataset_tar)
+from export_jobs import cached_export_job, download_link, table_generations
+from percentages import nonvideo_percentages, format_nonvideo_percentages
+from extrapolation import SOURCE_KEY, iter_extrapolation
+from jobs import JobCancelled, register_job
+from memo import memoized
+from sampling import DEFAULT_SEED, DEFAULT_STRATEGY
+from percent_store import (ROW_KEY, delete_hr_rows, forget_extrapolation, format_save_status,
+                           pending_percent_rows, record_extrapolation, save_percent_view, write_percent)
+from table_backend import register_row_operations, register_table_paging, store_view, view_handle, view_token
+
+
+def _load_nonvideo_export():
+    """Basis- und HR-Zeilen für die Non-Video-Exporte."""
+    conn = sqlite3.connect("data.db")
+    df_nv = pd.read_sql("SELECT * FROM non_video", conn)
+    df_hr = pd.read_sql("SELECT * FROM hr_non_bewegt", conn)
+    conn.close()
+    # Herkunft der HR-Zeilen ist nur für die inkrementelle Extrapolation relevant
+    df_hr = df_hr.drop(columns=[SOURCE_KEY], errors="ignore")
+    # Dauern als ganze Sekunden (int32 im Parquet-/Feather-Export)
+    return with_duration_dtypes(pd.concat([df_nv, df_hr], ignore_index=True))
 
 
 def register_nonvideo_callbacks(app):
     print("🔧 register_nonvideo_callbacks() wurde aufgerufen")
+    # Serverseitiges Paging/Sortieren/Filtern – die Callbacks liefern nur View-Tokens
+    register_table_paging(app, "nonvideo-percentages-table", editable=True)
+    # Zeilenoperationen clientseitig (assets/table_ops.js), Änderungen landen im Diff-Store
+    register_row_operations(
+        app, "nonvideo-percentages-table",
+        select_all="select-all-nonvideo-rows",
+        deselect_all="deselect-all-nonvideo-rows",
+        duplicate="duplicate-nonvideo-percentages-rows",
+        delete="delete-nonvideo-percentages-rows",
+        apply_value=("apply-field-value-nonvideo", "field-selector-nonvideo", "field-value-nonvideo"),
+    )
+    register_table_paging(app, "nonvideo-results-table")
+    register_table_paging(app, "basecheck-table-nbv")
+
     # 1) Calculate percent values (Hochrechnung Non-Video)
     @app.callback(
         [
             Output("nonvideo-percentages-status", "children"),
-            Output("nonvideo-percentages-table", "data"),
+            Output("nonvideo-percentages-table-view", "data"),
             Output("nonvideo-percentages-table", "columns")
         ],
         Input("calculate-percentages2_nbv", "n_clicks"),
         State("mm-dimensions2", "value"),
         State("ea-dimensions2", "value"),
+        State("distinct-mode", "value"),
         prevent_initial_call=True
     )
-    def calculate_nonvideo_percentages(n_clicks, mm_dims, ea_dims):
+    def calculate_nonvideo_percentages(n_clicks, mm_dims, ea_dims, distinct_mode):
         if not n_clicks:
             return "", [], []
 
@@ -42,135 +84,85 @@ def register_nonvideo_callbacks(app):
         if df_nonvideo.empty:
             return "Die Tabelle non_video ist leer.", [], []
 
-        # Basis-Daten
-        df_basis = df_nonvideo[df_nonvideo['hr_basis'] == 'Basis']
-        overall_bid_count = df_basis['bid'].nunique()
-
-        # Gewichtungs-Factor
-        df_basis['weight_ratio'] = df_basis.apply(
-            lambda r: (r['ave_weighted'] / r['ave_100']) if r['ave_100'] > 0 else 0,
-            axis=1
-        )
-        overall_avg_weighting = df_basis['weight_ratio'].mean() * 100
-
-        # EA-Dimension Mittelwerte
-        if ea_dims:
-            avg_weighting_df = (
-                df_basis.groupby(ea_dims, as_index=False)['weight_ratio']
-                        .mean()
-                        .rename(columns={'weight_ratio': 'avg_weighting_factor'})
-            )
-            avg_weighting_df['avg_weighting_factor'] *= 100
+        # Approximativer Modus: distinct counts aus den HLL-Sketches der Cubes
+        approx = distinct_mode == "approx"
+        approx_missing = False
+        distinct_counts = None
+        if approx:
+            sketch_all = query_cube('non_video', group_by_all + ['hr_basis'], approx=True)
+            sketch_mm = query_cube('non_video', mm_dims + ['hr_basis'], approx=True) if mm_dims else None
+            approx = sketch_all is not None and (sketch_mm is not None or not mm_dims)
+            approx_missing = not approx
+
+        if approx:
+            def distinct_counts(keys, hr_basis, df_groups):
+                sketch = sketch_all if keys == group_by_all else sketch_mm
+                sel = sketch.loc[sketch['hr_basis'] == hr_basis, keys + ['distinct_bid']]
+                merged = df_groups[keys].merge(sel, on=keys, how='left')
+                return merged['distinct_bid'].fillna(0).astype(int).to_numpy()
         else:
-            avg_weighting_df = None
-
-        # MM-Dimension Bid Counts
-        if mm_dims:
-            bid_mm_df = (
-                df_basis.groupby(mm_dims, as_index=False)['bid']
-                        .nunique()
-                        .rename(columns={'bid': 'bid_mm_kombo'})
-            )
-        else:
-            bid_mm_df = pd.DataFrame()
-
-        # EA Hits
-        ea_hits_df = (
-            df_basis.groupby(group_by_all, as_index=False)['bid']
-                    .nunique()
-                    .rename(columns={'bid': 'ea_hits'})
+            if not approx_missing:
+                # Nutzung für die Cube-Auswahl vermerken
+                note_usage('non_video', group_by_all + ['hr_basis'], db_path)
+                if mm_dims:
+                    note_usage('non_video', mm_dims + ['hr_basis'], db_path)
+            # Exakte distinct counts aus dem Bitmap-Index (beim Import gebaut);
+            # nicht indizierte Spalten zählt nonvideo_percentages im gruppierten Durchlauf
+            index = get_index('non_video', df_nonvideo, db_path)
+            if index.covers(group_by_all + ['hr_basis']):
+                def distinct_counts(keys, hr_basis, df_groups):
+                    return index.distinct_counts(df_groups[keys], {'hr_basis': hr_basis})
+
+        # Alle Kennzahlen aus je einer Gruppierung pro Ebene
+        df_result, overall_bid_count = nonvideo_percentages(
+            df_nonvideo, mm_dims, ea_dims, distinct_counts
         )
-
-        # MM HR-Basis
-        if mm_dims:
-            df_hr = df_nonvideo[df_nonvideo['hr_basis'] == 'HR']
-            bid_mm_hr_df = (
-                df_hr.groupby(mm_dims, as_index=False)['bid']
-                     .nunique()
-                     .rename(columns={'bid': 'bid_mm_kombo_hr'})
-            )
-        else:
-            bid_mm_hr_df = pd.DataFrame()
-
-        # Grund-Kombinationen
-        df_groups = df_basis[group_by_all].drop_duplicates().reset_index(drop=True)
-
-        # Merge Schritt-für-Schritt
-        df_result = df_groups.copy()
-        if mm_dims:
-            df_result = pd.merge(df_result, bid_mm_df, on=mm_dims, how='left')
-        df_result = pd.merge(df_result, ea_hits_df, on=group_by_all, how='left')
-        if mm_dims:
-            df_result = pd.merge(df_result, bid_mm_hr_df, on=mm_dims, how='left')
-        df_result['overall_bid_count'] = overall_bid_count
-        if ea_dims and avg_weighting_df is not None:
-            df_result = pd.merge(df_result, avg_weighting_df, on=ea_dims, how='left')
-        else:
-            df_result['avg_weighting_factor'] = overall_avg_weighting
-
-        # Berechnungen
-        df_result['hit_percentage'] = df_result.apply(
-            lambda row: (row['ea_hits'] / row['bid_mm_kombo'] * 100)
-                        if row.get('bid_mm_kombo', 0) > 0 else 0,
-            axis=1
-        )
-        df_result['ids_for_HR'] = (
-            df_result['bid_mm_kombo_hr'] * df_result['hit_percentage'] / 100
-        ).round(0)
-
-        # avg_mentions
-        mentions_df = (
-            df_basis.groupby(group_by_all, as_index=False)['mentions']
-            .sum()
-            .rename(columns={'mentions':'sum_mentions'})
-        )
-        df_result = pd.merge(df_result, mentions_df, on=group_by_all, how='left')
-        df_result['avg_mentions'] = df_result.apply(
-            lambda row: max(round(row['sum_mentions'] / row['ea_hits']), 1)
-                        if row['ea_hits']>0 else 1,
-            axis=1
-        )
-        df_result = df_result[df_result['ea_hits'] > 0]
-
-        # Formatierung
-        for col in ['bid_mm_kombo','bid_mm_kombo_hr','ea_hits','ids_for_HR','sum_mentions']:
-            if col in df_result.columns:
-                df_result[col] = df_result[col].fillna(0).astype(int).map('{:,}'.format)
-        df_result['hit_percentage'] = df_result['hit_percentage'].map('{:.2f}'.format)
-        df_result['avg_weighting_factor'] = df_result['avg_weighting_factor'].map('{:.2f}'.format)
+        df_result = format_nonvideo_percentages(df_result)
 
         # Columns & data
         columns = [{'name': c, 'id': c} for c in df_result.columns]
-        data = df_result.to_dict('records')
-
-        # Save percent_non_video
-        conn = sqlite3.connect(db_path)
-        df_result.to_sql('percent_non_video', conn, if_exists='replace', index=False)
-        conn.close()
+        # Save percent_non_video (mit row_id/row_version) und als Ergebnis für die Tabelle ablegen
+        data = store_view('nonvideo-percentages-table', write_percent(df_result, 'percent_non_video', db_path))
 
         status_msg = (
             f"Basecheck Non-Video: {len(df_result)} Gruppen gefunden. "
             f"(Distinct bid gesamt: {overall_bid_count:,})"
         )
+        if approx:
+            status_msg += (
+                f" ≈ bid_mm_kombo, ea_hits und bid_mm_kombo_hr approximativ "
+                f"(HyperLogLog, Standardfehler ±{sketch_error()*100:.1f}%)."
+            )
+        elif approx_missing:
+            status_msg += " Approximativ nicht verfügbar (kein passender Cube) – exakt berechnet."
         return status_msg, data, columns
 
 
-    @app.callback(
-        Output("extrapolate-nonvideo-status", "children"),
-        Input("extrapolate-nonvideo", "n_clicks"),
-        State("mm-dimensions2", "value"),
-        State("ea-dimensions2", "value"),
-        prevent_initial_call=True
+    # Läuft als Hintergrund-Job (jobs.py) mit Fortschritt je Batch
+    @register_job(
+        app, "extrapolate-nonvideo",
+        outputs=[Output("extrapolate-nonvideo-status", "children")],
+        inputs=[Input("extrapolate-nonvideo", "n_clicks")],
+        states=[
+            State("mm-dimensions2", "value"),
+            State("ea-dimensions2", "value"),
+            State("extrapolate-nonvideo-seed", "value"),
+            State("extrapolate-nonvideo-workers", "value"),
+            State("extrapolate-nonvideo-strategy", "value"),
+            State("extrapolate-nonvideo-mode", "value"),
+        ],
     )
-    def extrapolate_nonvideo(n_clicks, mm_dims2, ea_dims2):
+    def extrapolate_nonvideo(job, n_clicks, mm_dims2, ea_dims2, seed, workers, strategy, mode):
         if not n_clicks:
             raise exceptions.PreventUpdate
 
         db_path = "data.db"
         # 1) Laden der Prozent- und Non-Video-Tabellen
+        job.progress("Tabellen laden")
         with sqlite3.connect(db_path, timeout=30) as conn:
             df_percent  = pd.read_sql("SELECT * FROM percent_non_video", conn)
             df_nonvideo = pd.read_sql("SELECT * FROM non_video", conn)
+            source_generation = get_generation(conn, "non_video")
 
         if df_percent.empty:
             return "❌ Tabelle percent_non_video ist leer."
@@ -179,172 +171,147 @@ def register_nonvideo_callbacks(app):
         if not mm_dims2:
             return "⚠️ Keine MM-Dimensionen ausgewählt."
 
-        # 2) Debug-Zähler
-        total_requested = 0
-        total_produced  = 0
-        skipped_zero_id = 0
-        skipped_no_cand = 0
-
-        # 3) Sampling-Loop
-        result_rows = []
-        alpha = 0.7
-        scale = 1.5  # Skalierungsfaktor
-
-        for _, pr in df_percent.iterrows():
-            # a) ids_for_hr sauber parsen (Tausender entfernen)
-            ids_str    = str(pr.get("ids_for_HR", 0))
-            ids_digits = "".join(ch for ch in ids_str if ch.isdigit())
-            try:
-                base_ids = int(ids_digits) if ids_digits else 0
-            except:
-                base_ids = 0
-
-            # b) Skalieren & Aufrunden
-            ids_for_hr = ceil(base_ids * scale)
-
-            # c) Zero-Check
-            if ids_for_hr <= 0:
-                skipped_zero_id += 1
-                continue
-            total_requested += ids_for_hr
-
-            # d) Kandidaten filtern
-            df_cand = df_nonvideo[df_nonvideo['hr_basis'].str.upper() == 'HR'].copy()
-            for dim in mm_dims2:
-                val = str(pr.get(dim, '')).strip()
-                df_cand = df_cand[df_cand[dim].astype(str).str.strip() == val]
-            if df_cand.empty:
-                skipped_no_cand += 1
-                continue
-
-            # e) Gewichte
-            pr_vals    = df_cand['pr_value'].fillna(0)
-            max_pr     = pr_vals.max()
-            normalized = pr_vals / max_pr if max_pr>0 else pr_vals
-            weights    = alpha * normalized + (1 - alpha)
-
-            # f) Channel-Guarantee-Sampling
-            mandatory = []
-            remaining = ids_for_hr
-            channels  = df_cand['channel'].dropna().unique()
-            for ch in channels:
-                if remaining <= 0:
-                    break
-                sub = df_cand[df_cand['channel'] == ch]
-                if sub.empty:
-                    continue
-                sel = sub.sample(
-                    n=1,
-                    weights=weights.loc[sub.index],
-                    replace=True
-                )
-                mandatory.append(sel)
-                remaining -= 1
-
-            # g) Restliches Sampling
-            rest = pd.DataFrame()
-            if remaining > 0:
-                rest = df_cand.sample(
-                    n=remaining,
-                    weights=weights,
-                    replace=len(df_cand) < remaining
-                )
-
-            # h) Final zusammenführen
-            sampled = pd.concat(mandatory + [rest], ignore_index=True)
-            total_produced += len(sampled)
-
-            # i) Baue result_rows
-            for row in sampled.to_dict('records'):
-                new = row.copy()
-                # EA-Dimensionen übernehmen
-                for ea in ea_dims2 or []:
-                    if ea in pr:
-                        new[ea] = pr[ea]
-                # mentions
-                try:
-                    new['mentions'] = int(float(str(pr['avg_mentions']).replace(',', '.')))
-                except:
-                    new['mentions'] = 1
-                # ave_100, ave_weighting_factor, ave_weighted
-                new['ave_100']              = new.get('pr_value', 0)
-                try:
-                    aw = float(str(pr.get('avg_weighting_factor', 0)).replace(',', '.'))
-                except:
-                    aw = 0.0
-                new['ave_weighting_factor'] = aw
-                new['ave_weighted']         = float(new.get('pr_value', 0)) * (aw/100)
-                # HR-Kennung und neue BID
-                new['hr_basis'] = 'HR'
-                if "bid" in row:
-                    new["bid"] = row["bid"]
-                if "id" in row:
-                    new["id"] = row["id"]
-                result_rows.append(new)
+        seed = DEFAULT_SEED if seed is None else int(seed)
+        workers = max(1, int(workers or 1))
+        strategy = strategy or DEFAULT_STRATEGY
+
+        # 2) Inkrementell: nur Prozentzeilen ziehen, die seit dem letzten Lauf mit
+        #    denselben Parametern neu oder geändert sind; deren alte HR-Zeilen und die
+        #    entfernter Zeilen werden gelöscht, alle übrigen bleiben stehen
+        params = {"mm": mm_dims2, "ea": ea_dims2 or [], "seed": seed, "strategy": strategy,
+                  "source": source_generation}
+        pending = pending_percent_rows("hr_non_bewegt", df_percent, params, db_path) \
+            if mode != "full" else None
+        if pending is not None:
+            changed, removed = pending
+            if not changed and not removed:
+                return "✅ Keine Änderungen seit der letzten Extrapolation – hr_non_bewegt unverändert."
+            df_todo = df_percent[df_percent[ROW_KEY].isin(changed)]
+        else:
+            df_todo = df_percent
+
+        # 3) Sampling – reproduzierbar über den Seed, optional parallel in Shards;
+        #    jeder Batch wird direkt an hr_non_bewegt angehängt
+        totals = {"rows": 0, "requested": 0, "produced": 0, "zero_id": 0, "no_cand": 0}
+        written = 0
+        # Bis zum erfolgreichen Ende gilt der alte Stand nicht mehr (Abbruch/Fehler)
+        forget_extrapolation("hr_non_bewegt", db_path)
+        try:
+            with sqlite3.connect(db_path, timeout=30) as conn, closing(iter_extrapolation(
+                df_todo, df_nonvideo, mm_dims2, ea_dims2, seed, workers, strategy
+            )) as batches:
+                if pending is not None:
+                    delete_hr_rows(conn, "hr_non_bewegt", changed + removed)
+                for df_batch, stats in batches:
+                    for key, value in stats.items():
+                        totals[key] += value
+                    job.progress("Prozentzeilen gezogen", totals["rows"], len(df_todo))
+                    if df_batch.empty:
+                        continue
+                    with_duration_dtypes(df_batch).to_sql('hr_non_bewegt', conn,
+                                    if_exists='replace' if not written and pending is None else 'append',
+                                    index=False)
+                    written += len(df_batch)
+                if written or pending is not None:
+                    bump_generation(conn, 'hr_non_bewegt')
+        except JobCancelled:
+            raise
+        except Exception as e:
+            return f"❌ Extrapolation/Speichern fehlgeschlagen: {e}"
+        total_requested = totals["requested"]
+        total_produced  = totals["produced"]
+        skipped_zero_id = totals["zero_id"]
+        skipped_no_cand = totals["no_cand"]
 
         # 4) Debug-Report bei 0 Zeilen
-        if not result_rows:
+        if not written and pending is None:
             return (f"⚠️ Keine HR-Zeilen. Angefordert={total_requested}, "
                     f"zero_id={skipped_zero_id}, no_cand={skipped_no_cand}")
-
-        # 5) Schreiben in DB
-        df_hr = pd.DataFrame(result_rows)
+        record_extrapolation("hr_non_bewegt", df_percent, params, db_path)
+        job.progress("Cubes erstellen")
+        # hr_non_bewegt ist geschrieben – ein fehlender Cube kostet nur Tempo
+        cube_status = ""
         try:
-            with sqlite3.connect(db_path, timeout=30) as conn:
-                df_hr.to_sql('hr_non_bewegt', conn, if_exists='replace', index=False)
+            materialize_cubes('hr_non_bewegt', db_path)
         except Exception as e:
-            return f"❌ Speichern fehlgeschlagen: {e}"
+            cube_status = f" ⚠️ Cube für hr_non_bewegt nicht erstellt: {e}"
+
+        # 5) Finaler Debug-Report
+        scope = (f"Inkrementell: {len(changed)} Zeilen neu gezogen, {len(removed)} entfernt. "
+                 if pending is not None else "")
+        return (f"✅ Fertig. {scope}Angefordert={total_requested}, Generiert={total_produced}, "
+                f"zero_id={skipped_zero_id}, no_cand={skipped_no_cand}, seed={seed}, Prozesse={workers}, Strategie={strategy}"
+                f"{cube_status}")
 
-        # 6) Finaler Debug-Report
-        return (f"✅ Fertig. Angefordert={total_requested}, Generiert={total_produced}, "
-                f"zero_id={skipped_zero_id}, no_cand={skipped_no_cand}")
-        
 
     # 3) Calculate results
-    @app.callback(
-        [
+    @register_job(
+        app, "nonvideo-results",
+        outputs=[
             Output('nonvideo-results-status','children'),
-            Output('nonvideo-results-table','data'),
+            Output('nonvideo-results-table-view','data'),
             Output('nonvideo-results-table','columns'),
             Output('nonvideo-pie','figure')
         ],
-        Input('calculate-results-nonvideo','n_clicks'),
-        State('mm-dimensions-results','value'),
-        State('ea-dimensions-results','value'),
-        State('hr-basis-filter','value'),
-        prevent_initial_call=True
+        inputs=[Input('calculate-results-nonvideo','n_clicks')],
+        states=[
+            State('mm-dimensions-results','value'),
+            State('ea-dimensions-results','value'),
+            State('hr-basis-filter','value'),
+        ],
     )
-    def calculate_nonvideo_results(n_clicks, mm_dims_res, ea_dims_res, hr_basis_filter):
+    def calculate_nonvideo_results(job, n_clicks, mm_dims_res, ea_dims_res, hr_basis_filter):
         if not n_clicks:
             raise exceptions.PreventUpdate
-        conn = sqlite3.connect('data.db')
-        df_nv = pd.read_sql('SELECT * FROM non_video', conn)
-        df_hr_nv = pd.read_sql('SELECT * FROM hr_non_bewegt', conn)
-        conn.close()
-        df_all = pd.concat([df_nv, df_hr_nv], ignore_index=True)
-        if hr_basis_filter!='all':
-            df_all = df_all[df_all['hr_basis']==hr_basis_filter]
         group_by_cols = (mm_dims_res or []) + (ea_dims_res or [])
         if not group_by_cols:
             return 'Bitte wählen Sie ...', [], [], {}
-        agg = df_all.groupby(group_by_cols, as_index=False).agg({
-            'mentions':'sum','ave_100':'sum','ave_weighted':'sum'
-        })
-        agg['Summe mentions'] = agg['mentions'].round(0)
-        agg['Summe ave_100'] = agg['ave_100'].round(0)
-        agg['Summe ave_weighted'] = agg['ave_weighted'].round(0)
-        agg = agg.drop(columns=['mentions','ave_100','ave_weighted'])
-        cols = (
-            [{'name':c,'id':c,'type':'text'} for c in group_by_cols]
-            +[{'name':'Summe mentions','id':'Summe mentions','type':'numeric'},
-             {'name':'Summe ave_100','id':'Summe ave_100','type':'numeric'},
-             {'name':'Summe ave_weighted','id':'Summe ave_weighted','type':'numeric'}]
-        )
-        fig = px.pie(
-            df_all.groupby('hr_basis',as_index=False).agg({'ave_weighted':'sum'}),
-            names='hr_basis',values='ave_weighted',title='Verteilung Summe ave_weighted'
+        def compute():
+            measures = ['mentions', 'ave_100', 'ave_weighted']
+
+            # Summen sind additiv: beide Tabellen per Cube-Roll-up beantworten, wenn möglich
+            cube_dims = group_by_cols + (['hr_basis'] if hr_basis_filter != 'all' else [])
+            parts = [query_cube(tbl, cube_dims, measures)
+                     for tbl in ('non_video', 'hr_non_bewegt')]
+            if all(p is not None for p in parts):
+                df_all = pd.concat(parts, ignore_index=True)
+                df_pie = pd.concat([query_cube(tbl, ['hr_basis'], ['ave_weighted'])
+                                    for tbl in ('non_video', 'hr_non_bewegt')], ignore_index=True)
+            else:
+                conn = sqlite3.connect('data.db')
+                df_nv = pd.read_sql('SELECT * FROM non_video', conn)
+                df_hr_nv = pd.read_sql('SELECT * FROM hr_non_bewegt', conn)
+                conn.close()
+                df_all = pd.concat([df_nv, df_hr_nv], ignore_index=True)
+                df_pie = df_all
+            if hr_basis_filter!='all':
+                df_all = df_all[df_all['hr_basis']==hr_basis_filter]
+                df_pie = df_pie[df_pie['hr_basis']==hr_basis_filter]
+            agg = df_all.groupby(group_by_cols, as_index=False).agg({
+                'mentions':'sum','ave_100':'sum','ave_weighted':'sum'
+            })
+            agg['Summe mentions'] = agg['mentions'].round(0)
+            agg['Summe ave_100'] = agg['ave_100'].round(0)
+            agg['Summe ave_weighted'] = agg['ave_weighted'].round(0)
+            agg = agg.drop(columns=['mentions','ave_100','ave_weighted'])
+            cols = (
+                [{'name':c,'id':c,'type':'text'} for c in group_by_cols]
+                +[{'name':'Summe mentions','id':'Summe mentions','type':'numeric'},
+                 {'name':'Summe ave_100','id':'Summe ave_100','type':'numeric'},
+                 {'name':'Summe ave_weighted','id':'Summe ave_weighted','type':'numeric'}]
+            )
+            fig = px.pie(
+                df_pie.groupby('hr_basis',as_index=False).agg({'ave_weighted':'sum'}),
+                names='hr_basis',values='ave_weighted',title='Verteilung Summe ave_weighted'
+            )
+            return agg, cols, fig
+
+        job.progress("Aggregieren")
+        agg, cols, fig = memoized(
+            'calculate_nonvideo_results', ['non_video', 'hr_non_bewegt'],
+            [mm_dims_res or [], ea_dims_res or [], hr_basis_filter], compute,
         )
-        return f"Ergebnisse berechnet: {len(agg)} Gruppen.", agg.to_dict('records'), cols, fig
+        return f"Ergebnisse berechnet: {len(agg)} Gruppen.", store_view('nonvideo-results-table', agg), cols, fig
 
 
 
@@ -367,149 +334,100 @@ def register_nonvideo_callbacks(app):
 
 
     # 4b) Export mit optionalem Split per MM-Dimension
-    @app.callback(
-        Output("download1", "data"),
-        Input("export-nonvideo-button", "n_clicks"),
-        State("export-mm-dims-nbv", "value"),
-        prevent_initial_call=True
+    @register_job(
+        app, "export-nonvideo",
+        outputs=[Output("nonvideo-export-link", "children")],
+        inputs=[Input("export-nonvideo-button", "n_clicks")],
+        states=[State("export-mm-dims-nbv", "value")],
     )
-    def export_nonvideo_to_excel(n_clicks, split_dims):
+    def export_nonvideo_to_excel(job, n_clicks, split_dims):
         if not n_clicks:
             raise exceptions.PreventUpdate
 
-        # Daten laden
-        conn = sqlite3.connect("data.db")
-        df_nv = pd.read_sql("SELECT * FROM non_video", conn)
-        df_hr = pd.read_sql("SELECT * FROM hr_non_bewegt", conn)
-        conn.close()
-        df = pd.concat([df_nv, df_hr], ignore_index=True)
-
-        # Kein Split: einfache Excel
-        if not split_dims:
-            buf = BytesIO()
-            with pd.ExcelWriter(buf, engine="openpyxl") as w:
-                df.to_excel(w, index=False, sheet_name="data")
-            buf.seek(0)
-            return dcc.send_bytes(buf.getvalue(), "nonvideo_report.xlsx")
-
-        # Split: ZIP mit je einer Excel pro Kombination
-        zip_buf = BytesIO()
-        with zipfile.ZipFile(zip_buf, mode="w") as zf:
-            # Alle einzigartigen Dim-Kombos
-            combos = df[split_dims].drop_duplicates()
-            for _, key_row in combos.iterrows():
-                # Filter für diese Kombination
-                mask = True
-                parts = []
-                for dim in split_dims:
-                    val = key_row[dim]
-                    mask &= (df[dim] == val)
-                    parts.append(f"{dim}-{val}")
-                sub = df[mask]
-
-                # Excel-Buffer bauen
-                excel_buf = BytesIO()
-                with pd.ExcelWriter(excel_buf, engine="openpyxl") as w:
-                    sub.to_excel(w, index=False, sheet_name="data")
-                excel_buf.seek(0)
-
-                # Dateiname aus den Dim-Werten
-                fname = "_".join(parts) + ".xlsx"
-                zf.writestr(fname, excel_buf.read())
-
-        zip_buf.seek(0)
-        return dcc.send_bytes(zip_buf.getvalue(), "nonvideo_exports.zip")
+        # Gerendert wird nur, wenn für diese Datengeneration + Split noch keine Datei existiert
+        split_dims = list(split_dims or [])
+        filename = "nonvideo_exports.zip" if split_dims else "nonvideo_report.xlsx"
+
+        def write(path):
+            job.progress("Daten laden")
+            df = _load_nonvideo_export()
+            if not split_dims:
+                # Kein Split: einfache Excel
+                job.progress("Excel schreiben", 0, 1)
+                return write_excel(df, path)
+            # Split: ZIP mit je einer Excel pro Kombination
+            return split_zip(df, split_dims, excel_bytes, "xlsx", workers=EXPORT_WORKERS, target=path,
+                             progress=lambda n: job.progress("Dateien geschrieben", n))
+
+        key = ("nonvideo_excel", table_generations("data.db", "non_video", "hr_non_bewegt"), split_dims)
+        job_id, cached = cached_export_job(key, filename, write)
+        return download_link(job_id, filename, cached)
 
 
     # 5) Basecheck Non-Video
     @app.callback(
         [
             Output('basecheck-status-nbv','children'),
-            Output('basecheck-table-nbv','data'),
+            Output('basecheck-table-nbv-view','data'),
             Output('basecheck-table-nbv','columns')
         ],
         Input('calculate-basecheck-nbv','n_clicks'),
+        Input('distinct-mode','value'),
         State('mm-dimensions-basecheck-nbv','value'),
         prevent_initial_call=True
     )
-    def calculate_nonvideo_basecheck(n_clicks, dimensions):
+    def calculate_nonvideo_basecheck(n_clicks, distinct_mode, dimensions):
+        if not n_clicks:
+            raise exceptions.PreventUpdate
         if not dimensions:
             return 'Bitte wählen Sie mindestens eine Dimension aus.', [], []
-        conn = sqlite3.connect('data.db')
-        df = pd.read_sql('SELECT * FROM non_video', conn)
-        conn.close()
-        if df.empty or 'hr_basis' not in df.columns:
-            return 'Keine gültigen Daten in non_video gefunden.', [], []
-        grouped = df.groupby(dimensions+['hr_basis'], as_index=False).agg({'bid':'nunique'})
-        pivot = grouped.pivot_table(index=dimensions, columns='hr_basis', values='bid', fill_value=0)
-        pivot = pivot.add_prefix('distinct_bid_').reset_index()
-        cols = []
-        for col in pivot.columns:
-            if col.startswith('distinct_bid_'):
-                base = col.replace('distinct_bid_','')
-                cols.append({'name':['distinct_bid', base], 'id':col})
+        def compute():
+            approx = distinct_mode == 'approx'
+            grouped = query_cube('non_video', dimensions+['hr_basis'], approx=approx)
+            approx_missing = approx and grouped is None
+            if grouped is None:
+                approx = False
+            if grouped is not None:
+                grouped = grouped.rename(columns={'distinct_bid':'bid'})[dimensions+['hr_basis','bid']]
+                if grouped.empty:
+                    return 'Keine gültigen Daten in non_video gefunden.', None, []
             else:
-                cols.append({'name':[col,''], 'id':col})
-        return f"{len(pivot)} Gruppen gefunden.", pivot.to_dict('records'), cols
-
-    # 6) Table row operations
-    @app.callback(
-        Output('nonvideo-percentages-table','selected_rows', allow_duplicate=True),
-        Input('select-all-nonvideo-rows','n_clicks'),
-        State('nonvideo-percentages-table','data'),
-        prevent_initial_call=True
-    )
-    def select_all_nonvideo_rows(n_clicks, data):
-        return list(range(len(data))) if data else []
-
-    @app.callback(
-        Output('nonvideo-percentages-table','selected_rows', allow_duplicate=True),
-        Input('deselect-all-nonvideo-rows','n_clicks'),
-        prevent_initial_call=True
-    )
-    def deselect_all_nonvideo_rows(n_clicks):
-        return []
-
-    @app.callback(
-        Output('nonvideo-percentages-table','data', allow_duplicate=True),
-        Input('delete-nonvideo-percentages-rows','n_clicks'),
-        State('nonvideo-percentages-table','data'),
-        State('nonvideo-percentages-table','selected_rows'),
-        prevent_initial_call=True
-    )
-    def delete_nonvideo_rows(n_clicks, data, selected_rows):
-        if not data or not selected_rows:
-            return data
-        return [r for i,r in enumerate(data) if i not in selected_rows]
-
-    @app.callback(
-        Output('nonvideo-percentages-table','data', allow_duplicate=True),
-        Input('duplicate-nonvideo-percentages-rows','n_clicks'),
-        State('nonvideo-percentages-table','data'),
-        State('nonvideo-percentages-table','selected_rows'),
-        prevent_initial_call=True
-    )
-    def duplicate_nonvideo_rows(n_clicks, data, selected_rows):
-        if not data or not selected_rows:
-            return data
-        valid = [i for i in selected_rows if 0<=i<len(data)]
-        return data + [data[i].copy() for i in valid]
-
-    @app.callback(
-        Output('nonvideo-percentages-table','data', allow_duplicate=True),
-        Input('apply-field-value-nonvideo','n_clicks'),
-        State('nonvideo-percentages-table','data'),
-        State('nonvideo-percentages-table','selected_rows'),
-        State('field-selector-nonvideo','value'),
-        State('field-value-nonvideo','value'),
-        prevent_initial_call=True
-    )
-    def apply_field_value_nonvideo(n_clicks, data, selected_rows, field, value):
-        if not data or not selected_rows or not field:
-            return data
-        for i in [i for i in selected_rows if 0<=i<len(data)]:
-            data[i][field] = value
-        return data
+                # Exakt aus dem Bitmap-Index; nur für nicht indizierte Spalten über die Rohdaten
+                index = get_index('non_video')
+                if index.covers(dimensions + ['hr_basis']):
+                    grouped = index.group_counts(dimensions + ['hr_basis']).rename(columns={'distinct_bid': 'bid'})
+                else:
+                    conn = sqlite3.connect('data.db')
+                    df = pd.read_sql('SELECT * FROM non_video', conn)
+                    conn.close()
+                    if df.empty or 'hr_basis' not in df.columns:
+                        return 'Keine gültigen Daten in non_video gefunden.', None, []
+                    grouped = df.groupby(dimensions+['hr_basis'], as_index=False).agg({'bid':'nunique'})
+                if grouped.empty:
+                    return 'Keine gültigen Daten in non_video gefunden.', None, []
+            pivot = grouped.pivot_table(index=dimensions, columns='hr_basis', values='bid', fill_value=0)
+            pivot = pivot.add_prefix('distinct_bid_').reset_index()
+            bid_label = 'distinct_bid ≈' if approx else 'distinct_bid'
+            cols = []
+            for col in pivot.columns:
+                if col.startswith('distinct_bid_'):
+                    base = col.replace('distinct_bid_','')
+                    cols.append({'name':[bid_label, base], 'id':col})
+                else:
+                    cols.append({'name':[col,''], 'id':col})
+            status = f"{len(pivot)} Gruppen gefunden."
+            if approx:
+                status += f" distinct_bid approximativ (HyperLogLog, Standardfehler ±{sketch_error()*100:.1f}%)."
+            elif approx_missing:
+                status += " Approximativ nicht verfügbar (kein passender Cube) – exakt berechnet."
+            return status, pivot, cols
+
+        # Im approximativen Modus hängt das Ergebnis davon ab, ob ein Cube vorliegt
+        cubes = cube_state('non_video') if distinct_mode == 'approx' else None
+        status, pivot, cols = memoized('calculate_nonvideo_basecheck', ['non_video'], [dimensions, distinct_mode, cubes], compute)
+        return status, store_view('basecheck-table-nbv', pivot) if pivot is not None else [], cols
+
+    # 6) Table row operations – clientseitig, siehe register_row_operations oben
 
     @app.callback(
         Output('field-selector-nonvideo','options', allow_duplicate=True),
@@ -521,66 +439,54 @@ def register_nonvideo_callbacks(app):
 
     @app.callback(
         Output('update-nonvideo-percentages-status','children'),
+        Output('nonvideo-percentages-table-view','data', allow_duplicate=True),
+        Output('nonvideo-percentages-table-diff','data', allow_duplicate=True),
         Input('update-percentages-nbv','n_clicks'),
-        State('nonvideo-percentages-table','data'),
+        State('nonvideo-percentages-table-view','data'),
+        State('nonvideo-percentages-table-diff','data'),
         prevent_initial_call=True
     )
-    def update_percentages_nonvideo(n_clicks, data):
-        if not data:
-            return "❌ Keine Daten zum Speichern."
+    def update_percentages_nonvideo(n_clicks, view, diff):
+        # Nur der Diff kommt vom Browser; gespeichert wird als Upsert über row_id
+        handle = view_handle(view)
         try:
-            db_path = 'data.db'
-            df = pd.DataFrame(data)
-            conn = sqlite3.connect(db_path)
-            df.to_sql('percent_non_video', conn, if_exists='replace', index=False)
-            conn.close()
-            return f"✅ Prozentwertetabelle erfolgreich gespeichert ({len(df)} Zeilen)."
+            counts, n_rows = save_percent_view(handle, diff, 'percent_non_video')
+            if not n_rows:
+                return "❌ Keine Daten zum Speichern.", no_update, None
+            return format_save_status(counts, n_rows), view_token(handle), None
         except Exception as e:
-            return f"❌ Fehler beim Speichern: {e}"
+            return f"❌ Fehler beim Speichern: {e}", view_token(handle), None
         
 
-    # 4c) Parquet-Export anstelle von Excel
-    @app.callback(
-        Output("download-parquet", "data"),
-        Input("export-nonvideo-parquet-button", "n_clicks"),
-        State("export-mm-dims-nbv", "value"),
-        prevent_initial_call=True
+    # 4c) Parquet-/Feather-Export anstelle von Excel
+    @register_job(
+        app, "export-nonvideo-parquet",
+        outputs=[Output("nonvideo-parquet-link", "children")],
+        inputs=[Input("export-nonvideo-parquet-button", "n_clicks")],
+        states=[State("export-mm-dims-nbv", "value"), State("export-nonvideo-format", "value")],
     )
-    def export_nonvideo_to_parquet(n_clicks, split_dims):
+    def export_nonvideo_to_parquet(job, n_clicks, split_dims, fmt):
         if not n_clicks:
             raise exceptions.PreventUpdate
 
-        # Daten laden
-        conn = sqlite3.connect("data.db")
-        df_nv = pd.read_sql("SELECT * FROM non_video", conn)
-        df_hr = pd.read_sql("SELECT * FROM hr_non_bewegt", conn)
-        conn.close()
-        df = pd.concat([df_nv, df_hr], ignore_index=True)
-
-        # Single Parquet
-        if not split_dims:
-            buf = BytesIO()
-            df.to_parquet(buf, index=False, engine="pyarrow")
-            buf.seek(0)
-            return dcc.send_bytes(buf.getvalue(), "nonvideo.parquet")
-
-        # Optional: split per MM-Dimension und ZIP mehrere Parquets
-        import zipfile
-        zip_buf = BytesIO()
-        with zipfile.ZipFile(zip_buf, mode="w") as zf:
-            combos = df[split_dims].drop_duplicates()
-            for _, key_row in combos.iterrows():
-                mask = True
-                parts = []
-                for dim in split_dims:
-                    val = key_row[dim]
-                    mask &= (df[dim] == val)
-                    parts.append(f"{dim}-{val}")
-                sub = df[mask]
-                parquet_buf = BytesIO()
-                sub.to_parquet(parquet_buf, index=False, engine="pyarrow")
-                parquet_buf.seek(0)
-                fname = "_".join(parts) + ".parquet"
-                zf.writestr(fname, parquet_buf.read())
-        zip_buf.seek(0)
-        return dcc.send_bytes(zip_buf.getvalue(), "nonvideo_parquets.zip")
+        split_dims = list(split_dims or [])
+        fmt = fmt if fmt == "feather" else "parquet"
+        if split_dims:
+            # Hive-partitioniertes Dataset (dim=wert/...) als tar
+            filename = f"nonvideo_dataset_{fmt}.tar"
+        else:
+            filename = f"nonvideo.{fmt}"
+
+        def write(path):
+            job.progress("Daten laden")
+            df = _load_nonvideo_export()
+            job.progress("Dateien schreiben")
+            if split_dims:
+                return write_dataset_tar(df, split_dims, path, fmt, name="nonvideo")
+            if fmt == "feather":
+                return write_feather(df, path)
+            return write_parquet(df, path)
+
+        key = ("nonvideo_dataset", fmt, table_generations("data.db", "non_video", "hr_non_bewegt"), split_dims)
+        job_id, cached = cached_export_job(key, filename, write)
+        return download_link(job_id, filename, cached)
@@ -3,17 +3,42 @@ import dash
 import pandas as pd
 import sqlite3
 import re
-from helpers import decimal_to_hms
-from helpers import convert_timedelta_to_decimal
+from helpers import seconds_to_hms
+from helpers import with_duration_dtypes
+from helpers import bump_generation, get_generation
+from cube import cube_state, materialize_cubes, query_cube, sketch_error
+from export import VIDEO_FINAL_FORMATS, export_table_to_excel
+from export_jobs import cached_export_job, download_link, table_generations
+from extrapolation import SOURCE_KEY
+from jobs import register_job
+from memo import memoized
+from percent_store import (KEY_COLUMNS, ROW_KEY, ROW_VERSION, delete_hr_rows, forget_extrapolation,
+                           format_save_status, pending_percent_rows, record_extrapolation, save_percent_view, write_percent)
+from table_backend import (apply_diff, read_view, register_row_operations, register_table_paging,
+                           store_view, view_handle, view_token)
 
 
 
 def register_video_callbacks(app):
 
+    # Serverseitiges Paging/Sortieren/Filtern – die Callbacks liefern nur View-Tokens
+    register_table_paging(app, "percentages-table", editable=True)
+    # Zeilenoperationen clientseitig (assets/table_ops.js), Änderungen landen im Diff-Store
+    register_row_operations(
+        app, "percentages-table",
+        select_all="select-all-visible-rows",
+        deselect_all="deselect-all-rows",
+        duplicate="duplicate-percentages-rows",
+        delete="delete-percentages-rows",
+        apply_value=("apply-field-value", "field-selector", "field-value"),
+    )
+    register_table_paging(app, "results-table")
+    register_table_paging(app, "basecheck-table")
+
     @app.callback(
         [
             Output("percentages-status", "children"),
-            Output("percentages-table", "data"),
+            Output("percentages-table-view", "data"),
             Output("percentages-table", "columns"),
             Output("field-selector", "options")
         ],
@@ -26,62 +51,66 @@ def register_video_callbacks(app):
             return "", [], [], []
         group_by_cols = (mm_dims or []) + (ea_dims or [])
         if not group_by_cols:
-            return "Bitte wählen Sie mindestens eine Dimension aus.", [], []
+            return "Bitte wählen Sie mindestens eine Dimension aus.", [], [], []
+
+        def compute():
+            group_by_clause = ", ".join(group_by_cols)
+            join_condition = " AND ".join([f"v2.{dim} = v.{dim}" for dim in mm_dims]) if mm_dims else "1=1"
+
+            query = f"""
+            SELECT 
+                 {group_by_clause},
+                 COUNT(DISTINCT bid) AS count_bid,
+                 SUM(mentions) AS sum_mentions,
+                 SUM(visibility) AS sum_visibility,
+                 (
+                   SELECT SUM(CASE WHEN tool IS NULL OR tool = '' THEN broadcasting_time ELSE 0 END)
+                   FROM video AS v2
+                   WHERE v2.hr_basis = 'Basis' AND {join_condition}
+                 ) AS sum_broadcasting_time
+            FROM video AS v
+            WHERE hr_basis = 'Basis'
+            GROUP BY {group_by_clause}
+            """
+            if ea_dims:
+                having_conditions = " AND ".join([f"({dim} IS NULL OR {dim} = '')" for dim in ea_dims])
+                query += f"\nHAVING NOT ({having_conditions})"
 
-        group_by_clause = ", ".join(group_by_cols)
-        join_condition = " AND ".join([f"v2.{dim} = v.{dim}" for dim in mm_dims]) if mm_dims else "1=1"
-
-        query = f"""
-        SELECT 
-             {group_by_clause},
-             COUNT(DISTINCT bid) AS count_bid,
-             SUM(mentions) AS sum_mentions,
-             SUM(visibility) AS sum_visibility,
-             (
-               SELECT SUM(CASE WHEN tool IS NULL OR tool = '' THEN broadcasting_time ELSE 0 END)
-               FROM video AS v2
-               WHERE v2.hr_basis = 'Basis' AND {join_condition}
-             ) AS sum_broadcasting_time
-        FROM video AS v
-        WHERE hr_basis = 'Basis'
-        GROUP BY {group_by_clause}
-        """
-        if ea_dims:
-            having_conditions = " AND ".join([f"({dim} IS NULL OR {dim} = '')" for dim in ea_dims])
-            query += f"\nHAVING NOT ({having_conditions})"
-
-        conn = sqlite3.connect("data.db")
-        df_raw = pd.read_sql(query, conn)
-        conn.close()
-        if df_raw.empty:
-            return "Keine Daten gefunden.", [], [], []
+            conn = sqlite3.connect("data.db")
+            df_raw = pd.read_sql(query, conn)
+            conn.close()
+            if df_raw.empty:
+                return df_raw
+
+
+            df = df_raw.copy()
+            df['sum_mentions'] = df['sum_mentions'].fillna(0).astype(int)
+            df['sum_visibility_raw'] = df['sum_visibility']
+            df['sum_broadcasting_time_raw'] = df['sum_broadcasting_time']
+            df['sum_visibility'] = df['sum_visibility_raw'].apply(seconds_to_hms)
+            df['sum_broadcasting_time'] = df['sum_broadcasting_time_raw'].apply(seconds_to_hms)
+            df['visibility_share'] = df.apply(
+                lambda row: f"{(row['sum_visibility_raw'] / row['sum_broadcasting_time_raw'] * 100):.2f}%"
+                if row['sum_broadcasting_time_raw'] else "N/A", axis=1
+            )
+            df['avg_mention'] = df.apply(
+                lambda row: row['sum_visibility_raw'] / row['sum_mentions'] if row['sum_mentions'] != 0 else 0, axis=1
+            )
+            df['avg_mention'] = df['avg_mention'].apply(seconds_to_hms)
 
+            final_cols = group_by_cols + [
+                "sum_mentions", "avg_mention", "sum_visibility", "sum_broadcasting_time", "visibility_share"
+            ]
+            return df[final_cols]
 
-        df = df_raw.copy()
-        df['sum_mentions'] = df['sum_mentions'].fillna(0).astype(int)
-        df['sum_visibility_raw'] = df['sum_visibility']
-        df['sum_broadcasting_time_raw'] = df['sum_broadcasting_time']
-        df['sum_visibility'] = df['sum_visibility_raw'].apply(decimal_to_hms)
-        df['sum_broadcasting_time'] = df['sum_broadcasting_time_raw'].apply(decimal_to_hms)
-        df['visibility_share'] = df.apply(
-            lambda row: f"{(row['sum_visibility_raw'] / row['sum_broadcasting_time_raw'] * 100):.2f}%"
-            if row['sum_broadcasting_time_raw'] else "N/A", axis=1
-        )
-        df['avg_mention'] = df.apply(
-            lambda row: row['sum_visibility_raw'] / row['sum_mentions'] if row['sum_mentions'] != 0 else 0, axis=1
-        )
-        df['avg_mention'] = df['avg_mention'].apply(decimal_to_hms)
+        # Gleiche Dimensionen auf unveränderter video-Tabelle: Ergebnis aus dem Memo-Cache
+        final_df = memoized("calculate_percentages", ["video"], [mm_dims or [], ea_dims or []], compute)
+        if final_df.empty:
+            return "Keine Daten gefunden.", [], [], []
 
-        final_cols = group_by_cols + [
-            "sum_mentions", "avg_mention", "sum_visibility", "sum_broadcasting_time", "visibility_share"
-        ]
-        final_df = df[final_cols]
         columns = [{"name": col, "id": col, "editable": col in ["visibility_share", "avg_mention"]} for col in final_df.columns]
-        data = final_df.to_dict("records")
-
-        conn = sqlite3.connect("data.db")
-        final_df.to_sql("percent", conn, if_exists="replace", index=False)
-        conn.close()
+        # percent mit row_id/row_version neu schreiben; die Schlüssel reisen im Ergebnis mit
+        data = store_view("percentages-table", write_percent(final_df, "percent"))
 
         field_options = [{"label": col["name"], "value": col["id"]} for col in columns]
         return "Berechnung erfolgreich.", data, columns, field_options
@@ -89,14 +118,18 @@ def register_video_callbacks(app):
 
 
 
-    @app.callback(
-        Output("extrapolate-status", "children"),
-        Input("extrapolate", "n_clicks"),
-        State("mm-dimensions", "value"),
-        State("ea-dimensions", "value"),
-        prevent_initial_call=True
+    # Läuft als Hintergrund-Job (jobs.py)
+    @register_job(
+        app, "extrapolate",
+        outputs=[Output("extrapolate-status", "children")],
+        inputs=[Input("extrapolate", "n_clicks")],
+        states=[
+            State("mm-dimensions", "value"),
+            State("ea-dimensions", "value"),
+            State("extrapolate-mode", "value"),
+        ],
     )
-    def extrapolate_hr(n_clicks, mm_dims, ea_dims):
+    def extrapolate_hr(job, n_clicks, mm_dims, ea_dims, mode):
         if not n_clicks:
             return dash.no_update
 
@@ -106,27 +139,43 @@ def register_video_callbacks(app):
         group_by_cols = mm_dims + ea_dims
 
         # Daten aus Datenbank laden
+        job.progress("Tabellen laden")
         conn = sqlite3.connect("data.db")
         df_video = pd.read_sql("SELECT * FROM video WHERE hr_basis = 'HR'", conn)
         df_percent = pd.read_sql("SELECT * FROM percent", conn)
+        source_generation = get_generation(conn, "video")
         conn.close()
 
-        # Whitespace-Bereinigung für alle group_by_cols
+        # Inkrementell: nur Prozentzeilen rechnen, die seit dem letzten Lauf mit
+        # denselben Dimensionen neu oder geändert sind
+        params = {"mm": mm_dims, "ea": ea_dims, "source": source_generation, "durations": "seconds"}
+        df_state = df_percent
+        pending = pending_percent_rows("hr_bewegt", df_percent, params) if mode != "full" else None
+        if pending is not None:
+            changed, removed = pending
+            if not changed and not removed:
+                return "✅ Keine Änderungen seit der letzten Extrapolation – hr_bewegt unverändert."
+            df_percent = df_percent[df_percent[ROW_KEY].isin(changed)]
+        # Herkunft jeder HR-Zeile mitführen
+        df_percent = df_percent.drop(columns=[ROW_VERSION], errors="ignore") \
+            .rename(columns={ROW_KEY: SOURCE_KEY})
+
+        # Gleicher Typ für die Merge-Schlüssel (Whitespace ist seit dem Import bereinigt)
         for col in group_by_cols:
             if col in df_video.columns:
-                df_video[col] = df_video[col].astype(str).str.strip()
+                df_video[col] = df_video[col].astype(str)
             if col in df_percent.columns:
-                df_percent[col] = df_percent[col].astype(str).str.strip()
+                df_percent[col] = df_percent[col].astype(str)
 
         # 1) Filter auf MM-Dimensionen: nur diejenigen Prozent-Zeilen behalten, die in df_video vorkommen
         if mm_dims:
             valid_mm = df_video[mm_dims].drop_duplicates()
             df_percent = df_percent.merge(valid_mm, on=mm_dims, how="inner")
 
-        # 2) avg_mention konvertieren
+        # 2) avg_mention konvertieren (Sekunden wie die gespeicherten Dauern)
         if "avg_mention" in df_percent.columns:
             df_percent["avg_mention"] = pd.to_timedelta(df_percent["avg_mention"], errors="coerce")
-            df_percent["avg_mention_numeric"] = df_percent["avg_mention"].apply(convert_timedelta_to_decimal)
+            df_percent["avg_mention_numeric"] = df_percent["avg_mention"].dt.total_seconds()
 
         # 3) Sichtbarkeit im Percent-DF neu berechnen
         if "visibility" in df_percent.columns:
@@ -136,16 +185,17 @@ def register_video_callbacks(app):
             df_percent["visibility_share_float"] = (
                 df_percent["visibility_share"].str.replace("%", "").str.replace(",", ".").astype(float) / 100
             )
-            # sum_broadcasting_time (HH:MM:SS) in Tage umwandeln
-            df_percent["sum_broadcasting_time_days"] = (
-                pd.to_timedelta(df_percent["sum_broadcasting_time"], errors="coerce").dt.total_seconds() / 86400
+            # sum_broadcasting_time (HH:MM:SS) in Sekunden umwandeln
+            df_percent["sum_broadcasting_time_seconds"] = (
+                pd.to_timedelta(df_percent["sum_broadcasting_time"], errors="coerce").dt.total_seconds()
             )
-            # Absolute Visibility pro Kombination (in Tagen)
+            # Absolute Visibility pro Kombination (in Sekunden)
             df_percent["visibility"] = (
-                df_percent["visibility_share_float"] * df_percent["sum_broadcasting_time_days"]
+                df_percent["visibility_share_float"] * df_percent["sum_broadcasting_time_seconds"]
             )
 
         # 4) Merge auf MM-Dimensionen (EA-Zeilen werden dupliziert)) Merge auf MM-Dimensionen (EA-Zeilen werden dupliziert)) Merge auf MM-Dimensionen (EA-Zeilen werden dupliziert)
+        job.progress("Prozentzeilen zuordnen", 0, len(df_percent))
         try:
             df_merged = pd.merge(
                 df_video,
@@ -157,7 +207,7 @@ def register_video_callbacks(app):
         except Exception as e:
             return f"❌ Merge-Fehler: {e}"
 
-        if df_merged.empty:
+        if df_merged.empty and pending is None:
             return "⚠️ Keine passenden Kombinationen zwischen HR-Zeilen und Prozentwerten gefunden."
         
         # Sichtbarkeit float-Wert in die Prozentwert-Spalte übernehmen
@@ -180,53 +230,95 @@ def register_video_callbacks(app):
             )
         except Exception:
             df_merged["broadcasting_time_num"] = (
-                pd.to_timedelta(df_merged["broadcasting_time"], errors="coerce").dt.total_seconds() / 86400
+                pd.to_timedelta(df_merged["broadcasting_time"], errors="coerce").dt.total_seconds()
             )
             df_merged["visibility"] = (
                 df_merged["broadcasting_time_num"] * df_merged["visibility_share_float"]
             )
 
+        # Dauern als ganze Sekunden speichern; visibility kumulativ je Prozentzeile
+        # runden, damit sich die Rundungsfehler in deren Summe nicht aufaddieren.
+        # Gerundet wird vor dem Filter, damit keine Zeilen mit visibility 0 bleiben.
+        if SOURCE_KEY in df_merged.columns and not df_merged.empty:
+            cumulative = df_merged["visibility"].fillna(0).groupby(df_merged[SOURCE_KEY]).cumsum().round()
+            df_merged["visibility"] = cumulative - cumulative.groupby(df_merged[SOURCE_KEY]).shift(fill_value=0)
+        df_merged = with_duration_dtypes(df_merged)
+
         # Neue Zeilen mit visibility == 0 entfernen
-        df_merged = df_merged[df_merged["visibility"] > 0]
+        df_merged = df_merged[(df_merged["visibility"] > 0).fillna(False).astype(bool)].copy()
 
         # 7) Mentions berechnen basierend auf neuer visibility und avg_mention_numeric
         df_merged["mentions"] = df_merged.apply(
             lambda row: int(row["visibility"] / row["avg_mention_numeric"]) if pd.notnull(row["visibility"]) and row["avg_mention_numeric"] > 0 else 0,
-            axis=1
+            axis=1, result_type="reduce"
         )
         # Falls visibility > 0 aber mentions == 0, setze mentions auf 1
         df_merged.loc[(df_merged["visibility"] > 0) & (df_merged["mentions"] == 0), "mentions"] = 1
 
     # 8) In Datenbank speichern
+        job.progress("HR-Zeilen schreiben", 0, len(df_merged))
+        # Bis zum erfolgreichen Ende gilt der alte Stand nicht mehr (Abbruch/Fehler)
+        forget_extrapolation("hr_bewegt")
         conn = sqlite3.connect("data.db")
-        df_merged.to_sql("video_final", conn, if_exists="replace", index=False)
-        df_merged.to_sql("hr_bewegt", conn, if_exists="replace", index=False)
+        if pending is None:
+            df_merged.to_sql("video_final", conn, if_exists="replace", index=False)
+            df_merged.to_sql("hr_bewegt", conn, if_exists="replace", index=False)
+        else:
+            # Nur die HR-Zeilen der geänderten/entfernten Prozentzeilen ersetzen
+            delete_hr_rows(conn, "hr_bewegt", changed + removed)
+            if not df_merged.empty:
+                df_merged.to_sql("hr_bewegt", conn, if_exists="append", index=False)
+            # video_final entspricht nach der Extrapolation hr_bewegt; wurde es seither
+            # von den Ergebnissen überschrieben, aus hr_bewegt neu anlegen
+            final_cols = [row[1] for row in conn.execute('PRAGMA table_info("video_final");')]
+            hr_cols = [row[1] for row in conn.execute('PRAGMA table_info("hr_bewegt");')]
+            if final_cols == hr_cols:
+                delete_hr_rows(conn, "video_final", changed + removed)
+                if not df_merged.empty:
+                    df_merged.to_sql("video_final", conn, if_exists="append", index=False)
+            else:
+                conn.execute("DROP TABLE IF EXISTS video_final;")
+                conn.execute("CREATE TABLE video_final AS SELECT * FROM hr_bewegt;")
+        bump_generation(conn, "video_final", "hr_bewegt")
+        conn.commit()
         conn.close()
+        record_extrapolation("hr_bewegt", df_state, params)
+        job.progress("Cubes erstellen")
+        # hr_bewegt und video_final sind geschrieben – ein fehlender Cube kostet nur Tempo
+        cube_status = ""
+        try:
+            materialize_cubes("video_final")
+        except Exception as e:
+            cube_status = f" ⚠️ Cube für video_final nicht erstellt: {e}"
 
-        return f"✅ Extrapolation erfolgreich: {len(df_merged)} Zeilen gespeichert (hr_bewegt)."
+        if pending is not None:
+            return (f"✅ Inkrementelle Extrapolation: {len(changed)} Prozentzeilen neu berechnet, "
+                    f"{len(removed)} entfernt, {len(df_merged)} HR-Zeilen geschrieben (hr_bewegt).{cube_status}")
+        return f"✅ Extrapolation erfolgreich: {len(df_merged)} Zeilen gespeichert (hr_bewegt).{cube_status}"
 
 
 
 
 
-    @app.callback(
-        [Output("results-status", "children"),
-         Output("results-table", "data"),
-         Output("results-table", "columns")],
-        [Input("calculate-results", "n_clicks"),
-         Input("calculate-results2", "n_clicks")],
-        [State("mm-dimensions-results-video", "value"),
-         State("ea-dimensions-results-video", "value")]
+    @register_job(
+        app, "results",
+        outputs=[Output("results-status", "children"),
+                 Output("results-table-view", "data"),
+                 Output("results-table", "columns")],
+        inputs=[Input("calculate-results", "n_clicks"),
+                Input("calculate-results2", "n_clicks")],
+        states=[State("mm-dimensions-results-video", "value"),
+                State("ea-dimensions-results-video", "value")],
     )
-    def combined_results(n_clicks1, n_clicks2, mm_dims, ea_dims):
-        ctx = dash.callback_context
-        if not ctx.triggered:
+    def combined_results(job, n_clicks1, n_clicks2, mm_dims, ea_dims):
+        # Im Job-Thread gibt es keinen callback_context – der Auslöser kommt vom Job
+        triggered_id = job.triggered_id
+        if not triggered_id:
             return "", [], []
-
-        triggered_id = ctx.triggered[0]['prop_id'].split('.')[0]
         db_path = "data.db"
 
         if triggered_id == "calculate-results":
+            job.progress("video_final erstellen")
             conn = sqlite3.connect(db_path)
             df_video = pd.read_sql("SELECT * FROM video", conn)
             df_hr = pd.read_sql("SELECT * FROM hr_bewegt", conn)
@@ -241,43 +333,63 @@ def register_video_callbacks(app):
 
             df_final = pd.concat([df_video, df_hr], ignore_index=True)
 
+            # visibility liegt in Sekunden vor
             try:
-                df_final["sponsoring_value_cpt"] = (df_final["visibility"] * df_final["reach"] * 86400 / 1000 * 10 * 1000000) / 30
-                df_final["sponsorship_contacts"] = (df_final["visibility"] * df_final["reach"] * 86400 / 30)
-                df_final["ave_100"] = (df_final["visibility"] * 86400) * (df_final["advertising_price_TV"] / 30)
+                df_final["sponsoring_value_cpt"] = (df_final["visibility"] * df_final["reach"] / 1000 * 10 * 1000000) / 30
+                df_final["sponsorship_contacts"] = (df_final["visibility"] * df_final["reach"] / 30)
+                df_final["ave_100"] = df_final["visibility"] * (df_final["advertising_price_TV"] / 30)
                 df_final["sponsoring_value_cpt"] = df_final["sponsoring_value_cpt"].fillna(0).apply(lambda x: int(x))
                 df_final["ave_100"] = df_final["ave_100"].fillna(0).apply(lambda x: int(x))
             except Exception as e:
                 return f"Fehler bei der Berechnung von sponsoring_value_cpt: {e}", [], []
 
             conn = sqlite3.connect(db_path)
-            df_final.to_sql("video_final", conn, if_exists="replace", index=False)
+            with_duration_dtypes(df_final).to_sql("video_final", conn, if_exists="replace", index=False)
+            bump_generation(conn, "video_final")
+            conn.commit()
             conn.close()
+            cube_status = ""
+            try:
+                materialize_cubes("video_final", db_path)
+            except Exception as e:
+                cube_status = f" ⚠️ Cube für video_final nicht erstellt: {e}"
 
-            return f"Neue Tabelle 'video_final' erstellt: {len(df_final)} Zeilen, Sponsoring_Value_CPT aktualisiert.", [], []
+            return (f"Neue Tabelle 'video_final' erstellt: {len(df_final)} Zeilen, "
+                    f"Sponsoring_Value_CPT aktualisiert.{cube_status}", [], [])
 
         elif triggered_id == "calculate-results2":
             group_by_cols = (mm_dims or []) + (ea_dims or [])
             if not group_by_cols:
                 return "Bitte wählen Sie mindestens eine Dimension aus.", [], []
 
-            conn = sqlite3.connect(db_path)
-            df = pd.read_sql("SELECT * FROM video_final", conn)
-            conn.close()
+            job.progress("Aggregieren")
+            # Erst aus dem Aggregat-Cube beantworten, sonst Rohdaten scannen
+            grouped_extra = query_cube("video_final", group_by_cols + ['hr_basis'], ['visibility', 'ave_100'], db_path)
+            if grouped_extra is not None:
+                grouped_extra = grouped_extra.rename(columns={'distinct_bid': 'bid'})
+                grouped_extra = grouped_extra[grouped_extra['hr_basis'].isin(['Basis', 'HR'])]
+                if grouped_extra.empty:
+                    return "Die Tabelle video_final ist leer.", [], []
+                grouped_vis = grouped_extra[group_by_cols + ['hr_basis', 'visibility']]
+            else:
+                conn = sqlite3.connect(db_path)
+                df = pd.read_sql("SELECT * FROM video_final", conn)
+                conn.close()
+
+                if df.empty:
+                    return "Die Tabelle video_final ist leer.", [], []
 
-            if df.empty:
-                return "Die Tabelle video_final ist leer.", [], []
+                df = df[df['hr_basis'].isin(['Basis', 'HR'])]
 
-            df = df[df['hr_basis'].isin(['Basis', 'HR'])]
+                grouped_vis = df.groupby(group_by_cols + ['hr_basis'], as_index=False)['visibility'].sum()
+                grouped_extra = df.groupby(group_by_cols + ['hr_basis'], as_index=False).agg({
+                    'bid': pd.Series.nunique,
+                    'ave_100': 'sum'
+                })
 
-            grouped_vis = df.groupby(group_by_cols + ['hr_basis'], as_index=False)['visibility'].sum()
             pivot_vis = grouped_vis.pivot_table(index=group_by_cols, columns='hr_basis', values='visibility', fill_value=0).reset_index()
             pivot_vis.rename(columns={'Basis': 'sum_visibility_basis', 'HR': 'sum_visibility_hr'}, inplace=True)
 
-            grouped_extra = df.groupby(group_by_cols + ['hr_basis'], as_index=False).agg({
-                'bid': pd.Series.nunique,
-                'ave_100': 'sum'
-            })
             pivot_bid = grouped_extra.pivot_table(index=group_by_cols, columns='hr_basis', values='bid', fill_value=0).reset_index()
             pivot_bid.rename(columns={'Basis': 'bid_count_basis', 'HR': 'bid_count_hr'}, inplace=True)
             pivot_ave = grouped_extra.pivot_table(index=group_by_cols, columns='hr_basis', values='ave_100', fill_value=0).reset_index()
@@ -286,15 +398,15 @@ def register_video_callbacks(app):
             final_df = pivot_vis.merge(pivot_bid, on=group_by_cols, how='outer') \
                                 .merge(pivot_ave, on=group_by_cols, how='outer')
 
-            final_df["sum_visibility_basis"] = final_df["sum_visibility_basis"].apply(decimal_to_hms)
-            final_df["sum_visibility_hr"] = final_df["sum_visibility_hr"].apply(decimal_to_hms)
+            final_df["sum_visibility_basis"] = final_df["sum_visibility_basis"].apply(seconds_to_hms)
+            final_df["sum_visibility_hr"] = final_df["sum_visibility_hr"].apply(seconds_to_hms)
             final_df["bid_count_basis"] = final_df["bid_count_basis"].apply(lambda x: format(int(x), ",d"))
             final_df["bid_count_hr"] = final_df["bid_count_hr"].apply(lambda x: format(int(x), ",d"))
             final_df["sum_ave_100_basis"] = final_df["sum_ave_100_basis"].apply(lambda x: format(int(x), ",d"))
             final_df["sum_ave_100_hr"] = final_df["sum_ave_100_hr"].apply(lambda x: format(int(x), ",d"))
 
             columns = [{"name": col, "id": col} for col in final_df.columns]
-            data = final_df.to_dict("records")
+            data = store_view("results-table", final_df)
             return f"Ergebnisse berechnet: {len(final_df)} Gruppen gefunden.", data, columns
 
         return "", [], []
@@ -305,154 +417,112 @@ def register_video_callbacks(app):
     import openpyxl
     from openpyxl.utils import get_column_letter
 
-    @app.callback(
-        Output("download", "data"),
-        Input("export-button", "n_clicks"),
-        prevent_initial_call=True
+    @register_job(
+        app, "export-video",
+        outputs=[Output("video-export-link", "children")],
+        inputs=[Input("export-button", "n_clicks")],
     )
-    def export_video_to_excel(n_clicks):
+    def export_video_to_excel(job, n_clicks):
         if not n_clicks:
             return None
 
-        conn = sqlite3.connect("data.db")
-        df = pd.read_sql("SELECT * FROM video_final", conn)
-        conn.close()
-
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name="data")
-            worksheet = writer.sheets["data"]
-            for i, col in enumerate(df.columns):
-                col_letter = get_column_letter(i + 1)
-                if col.lower() in ["pr_value", "ave_100", "ave_weighted", "sponsoring_value_cpt"]:
-                    for cell in worksheet[col_letter][1:]:
-                        cell.number_format = '#,##0'
-                elif col.lower() in ["broadcasting_time", "visibility", "apt", "start_time_program", "end_time_program", "start_time_item"]:
-                    for cell in worksheet[col_letter][1:]:
-                        cell.number_format = 'h:mm:ss'
-        output.seek(0)
-        return dcc.send_bytes(output.getvalue(), "video_final.xlsx")
-
-
-
-    @app.callback(
-        Output("percentages-table", "data", allow_duplicate=True),
-        Input("duplicate-percentages-rows", "n_clicks"),
-        State("percentages-table", "data"),
-        State("percentages-table", "columns"),
-        State("percentages-table", "selected_rows"),
-        prevent_initial_call=True
-    )
-    def modify_percentages_table(n_duplicate, data, columns, selected_rows):
-        if not selected_rows or data is None:
-            return data
-        duplicated = [data[i].copy() for i in selected_rows]
-        return data + duplicated
-
-
-        if triggered == "add-percentages-row":
-            new_row = {col["id"]: "" for col in columns}
-            data.append(new_row)
-        elif triggered == "duplicate-percentages-rows" and selected_rows:
-            duplicated = [data[i].copy() for i in selected_rows]
-            data += duplicated
-
-        return data
-
-
-    @app.callback(
-        Output("percentages-table", "data", allow_duplicate=True),
-        Input("apply-field-value", "n_clicks"),
-        State("percentages-table", "data"),
-        State("percentages-table", "selected_rows"),
-        State("field-selector", "value"),
-        State("field-value", "value"),
-        prevent_initial_call=True
-    )
-    def apply_field_value(n_clicks, data, selected_rows, field, value):
-        if not selected_rows or not field:
-            return data
+        # Write-only Workbook direkt aus dem SQLite-Cursor in den Spool, Formate je Spalte
+        filename = "video_final.xlsx"
+        with sqlite3.connect("data.db", timeout=30) as conn:
+            total = conn.execute("SELECT COUNT(*) FROM video_final;").fetchone()[0]
+        job.progress("Zeilen geschrieben", 0, total)
+        job_id, cached = cached_export_job(
+            ("video_final_excel", table_generations("data.db", "video_final")),
+            filename,
+            lambda path: export_table_to_excel(
+                "data.db", "video_final", "data", VIDEO_FINAL_FORMATS, target=path,
+                progress=lambda n: job.progress("Zeilen geschrieben", n, total)),
+        )
+        return download_link(job_id, filename, cached)
 
-        for i in selected_rows:
-            data[i][field] = value
-        return data
 
 
     @app.callback(
         [
             Output("basecheck-status", "children"),
-            Output("basecheck-table", "data"),
+            Output("basecheck-table-view", "data"),
             Output("basecheck-table", "columns")
         ],
         Input("calculate-basecheck", "n_clicks"),
+        Input("distinct-mode", "value"),
         State("mm-dimensions-basecheck", "value"),
         prevent_initial_call=True
     )
-    def calculate_basecheck(n_clicks, dimensions):
+    def calculate_basecheck(n_clicks, distinct_mode, dimensions):
+        if not n_clicks:
+            raise dash.exceptions.PreventUpdate
         if not dimensions:
             return "Bitte wählen Sie mindestens eine Dimension aus.", [], []
 
-        conn = sqlite3.connect("data.db")
-        df = pd.read_sql("SELECT * FROM video", conn)
-        conn.close()
-
-        if df.empty or "hr_basis" not in df.columns:
-            return "Keine gültigen Daten in 'video' gefunden.", [], []
-
-        # Gruppierung nach Dimensionen + hr_basis
-        grouped = df.groupby(dimensions + ["hr_basis"], as_index=False).agg({
-            "bid": pd.Series.nunique,
-            "visibility": "sum",
-            "broadcasting_time": "sum"
-        })
-
-        # Pivotieren
-        pivot_bid = grouped.pivot_table(index=dimensions, columns="hr_basis", values="bid", fill_value=0).add_prefix("distinct_bid_").reset_index()
-        pivot_vis = grouped.pivot_table(index=dimensions, columns="hr_basis", values="visibility", fill_value=0).add_prefix("visibility_").reset_index()
-        pivot_bt  = grouped.pivot_table(index=dimensions, columns="hr_basis", values="broadcasting_time", fill_value=0).add_prefix("broadcasting_time_").reset_index()
-
-        # Zusammenführen
-        df_final = pivot_bid.merge(pivot_vis, on=dimensions).merge(pivot_bt, on=dimensions)
-
-        # Zeitfelder umwandeln
-        for col in df_final.columns:
-            if col.startswith("visibility_") or col.startswith("broadcasting_time_"):
-                df_final[col] = df_final[col].apply(decimal_to_hms)
-
-        columns = []
-        for col in df_final.columns:
-            if col.startswith("distinct_bid_"):
-                basis = col.replace("distinct_bid_", "")
-                columns.append({"name": ["distinct_bid", basis], "id": col})
-            elif col.startswith("visibility_"):
-                basis = col.replace("visibility_", "")
-                columns.append({"name": ["visibility", basis], "id": col})
-            elif col.startswith("broadcasting_time_"):
-                basis = col.replace("broadcasting_time_", "")
-                columns.append({"name": ["broadcasting_time", basis], "id": col})
+        def compute():
+            # Gruppierung nach Dimensionen + hr_basis – bevorzugt per Roll-up aus dem Cube
+            approx = distinct_mode == "approx"
+            grouped = query_cube("video", dimensions + ["hr_basis"], ["visibility", "broadcasting_time"], approx=approx)
+            approx_missing = approx and grouped is None
+            if grouped is None:
+                approx = False
+            if grouped is not None:
+                grouped = grouped.rename(columns={"distinct_bid": "bid"})
+                if grouped.empty:
+                    return "Keine gültigen Daten in 'video' gefunden.", None, []
             else:
-                columns.append({"name": [col, ""], "id": col})
-
-        data = df_final.to_dict("records")
-
-        return f"{len(df_final)} Gruppen gefunden.", data, columns
-
-    @app.callback(
-        Output("percentages-table", "selected_rows", allow_duplicate=True),
-        Input("select-all-visible-rows", "n_clicks"),
-        State("percentages-table", "data"),
-        prevent_initial_call=True
-    )
-    def select_all_rows(n_clicks, data):
-        return list(range(len(data)))
-
-    @app.callback(
-        Output("percentages-table", "selected_rows", allow_duplicate=True),
-        Input("deselect-all-rows", "n_clicks"),
-        prevent_initial_call=True
-    )
-    def deselect_all_rows(n_clicks):
-        return []
+                conn = sqlite3.connect("data.db")
+                df = pd.read_sql("SELECT * FROM video", conn)
+                conn.close()
+
+                if df.empty or "hr_basis" not in df.columns:
+                    return "Keine gültigen Daten in 'video' gefunden.", None, []
+
+                grouped = df.groupby(dimensions + ["hr_basis"], as_index=False).agg({
+                    "bid": pd.Series.nunique,
+                    "visibility": "sum",
+                    "broadcasting_time": "sum"
+                })
+
+            # Pivotieren
+            pivot_bid = grouped.pivot_table(index=dimensions, columns="hr_basis", values="bid", fill_value=0).add_prefix("distinct_bid_").reset_index()
+            pivot_vis = grouped.pivot_table(index=dimensions, columns="hr_basis", values="visibility", fill_value=0).add_prefix("visibility_").reset_index()
+            pivot_bt  = grouped.pivot_table(index=dimensions, columns="hr_basis", values="broadcasting_time", fill_value=0).add_prefix("broadcasting_time_").reset_index()
+
+            # Zusammenführen
+            df_final = pivot_bid.merge(pivot_vis, on=dimensions).merge(pivot_bt, on=dimensions)
+
+            # Zeitfelder umwandeln
+            for col in df_final.columns:
+                if col.startswith("visibility_") or col.startswith("broadcasting_time_"):
+                    df_final[col] = df_final[col].apply(seconds_to_hms)
+
+            bid_label = "distinct_bid ≈" if approx else "distinct_bid"
+            columns = []
+            for col in df_final.columns:
+                if col.startswith("distinct_bid_"):
+                    basis = col.replace("distinct_bid_", "")
+                    columns.append({"name": [bid_label, basis], "id": col})
+                elif col.startswith("visibility_"):
+                    basis = col.replace("visibility_", "")
+                    columns.append({"name": ["visibility", basis], "id": col})
+                elif col.startswith("broadcasting_time_"):
+                    basis = col.replace("broadcasting_time_", "")
+                    columns.append({"name": ["broadcasting_time", basis], "id": col})
+                else:
+                    columns.append({"name": [col, ""], "id": col})
+
+            status = f"{len(df_final)} Gruppen gefunden."
+            if approx:
+                status += f" distinct_bid approximativ (HyperLogLog, Standardfehler ±{sketch_error() * 100:.1f}%)."
+            elif approx_missing:
+                status += " Approximativ nicht verfügbar (kein passender Cube) – exakt berechnet."
+            return status, df_final, columns
+
+        # Im approximativen Modus hängt das Ergebnis davon ab, ob ein Cube vorliegt
+        cubes = cube_state("video") if distinct_mode == "approx" else None
+        status, df_final, columns = memoized("calculate_basecheck", ["video"], [dimensions, distinct_mode, cubes], compute)
+        return status, store_view("basecheck-table", df_final) if df_final is not None else [], columns
 
     def safe_decimal_to_hms(val):
         import pandas as pd
@@ -474,19 +544,23 @@ def register_video_callbacks(app):
 
     @app.callback(
         Output("download-percentages", "data"),
+        Output("percentages-table-diff", "data", allow_duplicate=True),
         Input("export-percentages-button", "n_clicks"),
-        State("percentages-table", "data"),
+        State("percentages-table-view", "data"),
+        State("percentages-table-diff", "data"),
         prevent_initial_call=True
     )
-    def export_percentages(n_clicks, data):
-        if not data:
-            return None
+    def export_percentages(n_clicks, view, diff):
         import pandas as pd
         from io import BytesIO
         from openpyxl.utils import get_column_letter
         import openpyxl
 
-        df = pd.DataFrame(data)
+        # Offene Änderungen aus dem Browser mit exportieren
+        apply_diff(view_handle(view), diff)
+        df = read_view(view).drop(columns=KEY_COLUMNS, errors="ignore")
+        if df.empty:
+            return None, None
 
         # avg_mention als Zeitstring (Excel-Zeitformat)
         if "avg_mention" in df.columns:
@@ -519,7 +593,7 @@ def register_video_callbacks(app):
                         cell.number_format = "0.00%"
 
         output.seek(0)
-        return dcc.send_bytes(output.getvalue(), "percent.xlsx")
+        return dcc.send_bytes(output.getvalue(), "percent.xlsx"), None
 
 
 
@@ -558,15 +632,16 @@ def register_video_callbacks(app):
 
     @app.callback(
         [
-            Output("percentages-table", "data", allow_duplicate=True),
+            Output("percentages-table-view", "data", allow_duplicate=True),
             Output("percentages-table", "columns", allow_duplicate=True),
             Output("field-selector", "options", allow_duplicate=True)
         ],
         Input("import-percentages-upload", "contents"),
-        State("percentages-table", "data"),
+        State("percentages-table-view", "data"),
+        State("percentages-table-diff", "data"),
         prevent_initial_call=True
     )
-    def import_percentages(contents, existing_data):
+    def import_percentages(contents, view, diff):
         import base64
         import io
         import pandas as pd
@@ -615,7 +690,8 @@ def register_video_callbacks(app):
 
 
         # Alte Daten (falls vorhanden)
-        df_existing = pd.DataFrame(existing_data) if existing_data else pd.DataFrame()
+        apply_diff(view_handle(view), diff)
+        df_existing = read_view(view)
 
         # Gemeinsame Spalten bestimmen und zusammenführen
         if not df_existing.empty:
@@ -626,9 +702,10 @@ def register_video_callbacks(app):
             df_combined = df_new
 
         # Outputs
-        data = df_combined.to_dict("records")
-        columns = [{"name": col, "id": col, "editable": True} for col in df_combined.columns]
-        dropdown_options = [{"label": col, "value": col} for col in df_combined.columns]
+        data = store_view("percentages-table", df_combined)
+        visible = [col for col in df_combined.columns if col not in KEY_COLUMNS]
+        columns = [{"name": col, "id": col, "editable": True} for col in visible]
+        dropdown_options = [{"label": col, "value": col} for col in visible]
 
         return data, columns, dropdown_options
 
@@ -638,38 +715,20 @@ def register_video_callbacks(app):
 
     @app.callback(
         Output("percentages-status", "children", allow_duplicate=True),
+        Output("percentages-table-view", "data", allow_duplicate=True),
+        Output("percentages-table-diff", "data", allow_duplicate=True),
         Input("update-percentages", "n_clicks"),
-        State("percentages-table", "data"),
+        State("percentages-table-view", "data"),
+        State("percentages-table-diff", "data"),
         prevent_initial_call=True
     )
-    def update_percentages_db(n_clicks, data):
-        if not data:
-            return "❌ Keine Daten zum Speichern."
-
+    def update_percentages_db(n_clicks, view, diff):
+        # Nur der Diff kommt vom Browser; gespeichert wird als Upsert über row_id
+        handle = view_handle(view)
         try:
-            df = pd.DataFrame(data)
-            conn = sqlite3.connect("data.db")
-            df.to_sql("percent", conn, if_exists="replace", index=False)
-            conn.close()
-            return f"✅ Prozentwertetabelle erfolgreich gespeichert ({len(df)} Zeilen)."
+            counts, n_rows = save_percent_view(handle, diff, "percent")
+            if not n_rows:
+                return "❌ Keine Daten zum Speichern.", dash.no_update, None
+            return format_save_status(counts, n_rows), view_token(handle), None
         except Exception as e:
-            return f"❌ Fehler beim Speichern: {e}"
-
-
-    @app.callback(
-        [
-            Output("percentages-table", "data", allow_duplicate=True),
-            Output("percentages-table", "selected_rows", allow_duplicate=True),
-        ],
-        Input("delete-percentages-rows", "n_clicks"),
-        State("percentages-table", "data"),
-        State("percentages-table", "selected_rows"),
-        prevent_initial_call=True
-    )
-    def delete_percentages_rows(n_clicks, data, selected_rows):
-        if not n_clicks or not data or not selected_rows:
-            raise dash.exceptions.PreventUpdate
-
-        data_new = [row for i, row in enumerate(data) if i not in selected_rows]
-
-        return data_new, []
+            return f"❌ Fehler beim Speichern: {e}", view_token(handle), None
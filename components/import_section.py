@@ -1,5 +1,7 @@
 from dash import dcc, html, dash_table
 
+from jobs import job_panel
+
 def import_tab():
     return dcc.Tab(label="Import", children=[
         html.H1("Excel Daten Import Tool"),
@@ -33,6 +35,7 @@ def import_tab():
                 'margin-bottom': '20px'
             }
         ),
+        job_panel("import"),
         html.Div(id="status", style={'margin-bottom': '20px'}),
         html.Button(
         "Datenbank leeren",
@@ -73,5 +76,21 @@ def import_tab():
                     }
                 )
             ], style={'width': '48%', 'display': 'inline-block', 'vertical-align': 'top'})
-        ])
+        ]),
+        # Admin: Trefferquoten des Memo-Caches (memo.py)
+        html.H2("Ergebnis-Cache"),
+        html.Button("Statistik aktualisieren", id="memo-stats-refresh"),
+        html.Button("Cache leeren", id="memo-clear-button", style={'margin-left': '10px'}),
+        html.Div(id="memo-status", style={'margin-top': '5px', 'fontStyle': 'italic'}),
+        dash_table.DataTable(
+            id="memo-stats-table",
+            columns=[{"name": c, "id": c} for c in ["name", "hits", "misses", "hit_rate", "entries", "size_mb"]],
+            data=[],
+            style_table={'overflowX': 'auto', 'width': '60%'},
+            style_cell={'textAlign': 'left'},
+            style_header={
+                'backgroundColor': '#73b8e6',
+                'color': 'white'
+            }
+        )
     ])
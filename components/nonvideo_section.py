@@ -1,5 +1,9 @@
+import os
 from dash import dcc, html, dash_table
 
+from jobs import job_panel
+from table_backend import PAGE_SIZE, diff_store, view_store
+
 def nonvideo_tab():
     return dcc.Tab(label="Nicht-Bewegtbild", children=[
         dcc.Tabs([
@@ -25,6 +29,37 @@ def nonvideo_tab():
                 html.Br(),
                 html.Button("Berechne Prozentwerte Non-Video", id="calculate-percentages2_nbv"),
                 html.Button("Extrapolate Non-Video", id="extrapolate-nonvideo", style={'margin-left': '10px'}),
+                dcc.Dropdown(
+                    id="extrapolate-nonvideo-strategy",
+                    options=[
+                        {'label': 'Kanal-Garantie', 'value': 'channel'},
+                        {'label': 'Proportional nach country', 'value': 'country'},
+                        {'label': 'Gewichtet (pr_value)', 'value': 'weighted'},
+                    ],
+                    value='channel',
+                    clearable=False,
+                    style={'width': '220px', 'display': 'inline-block', 'margin-left': '10px',
+                           'vertical-align': 'middle'}
+                ),
+                html.Label("Seed:", style={'margin-left': '10px'}),
+                dcc.Input(id="extrapolate-nonvideo-seed", type="number", value=42, step=1,
+                          style={'width': '80px', 'margin-left': '5px'}),
+                html.Label("Prozesse:", style={'margin-left': '10px'}),
+                dcc.Input(id="extrapolate-nonvideo-workers", type="number", value=1, min=1,
+                          max=os.cpu_count() or 1, step=1,
+                          style={'width': '60px', 'margin-left': '5px'}),
+                # Inkrementell: nur neue/geänderte Prozentzeilen neu extrapolieren
+                dcc.RadioItems(
+                    id="extrapolate-nonvideo-mode",
+                    options=[
+                        {'label': 'Nur Änderungen', 'value': 'incremental'},
+                        {'label': 'Komplett', 'value': 'full'},
+                    ],
+                    value='incremental',
+                    inline=True,
+                    style={'display': 'inline-block', 'margin-left': '10px'}
+                ),
+                job_panel("extrapolate-nonvideo"),
                 html.Div(  id="extrapolate-nonvideo-status",
                         style={'display':'inline-block','margin-left':'10px'}),
                 html.Button("Update Percentages", id="update-percentages-nbv", style={'margin-left': '10px'}),
@@ -52,15 +87,21 @@ def nonvideo_tab():
                 ], style={'margin-top': '10px', 'display': 'flex', 'flex-wrap': 'wrap', 'gap': '10px'}),
 
                 # DataTable mit Mehrfachauswahl, Filter und Sort
+                view_store("nonvideo-percentages-table"),
+                diff_store("nonvideo-percentages-table"),
                 dash_table.DataTable(
                     id="nonvideo-percentages-table",
+                    page_action="custom",
+                    page_current=0,
+                    page_size=PAGE_SIZE,
+                    sort_action="custom",
+                    sort_mode="multi",
+                    filter_action="custom",
                     columns=[],  # wird per Callback befüllt
                     data=[],
                     editable=True,
                     row_selectable="multi",
                     selected_rows=[],
-                    filter_action="native",
-                    sort_action="native",
                     style_table={'overflowX': 'auto'}
                 )
 
@@ -106,9 +147,17 @@ def nonvideo_tab():
                     )
                 ], style={'width': '30%', 'margin-top': '10px'}),
                 html.Button("Berechne Ergebnisse Non-Video", id="calculate-results-nonvideo", style={'margin-top': '10px'}),
+                job_panel("nonvideo-results"),
                 html.Div(id="nonvideo-results-status", style={'margin-top': '10px'}),
+                view_store("nonvideo-results-table"),
                 dash_table.DataTable(
                     id="nonvideo-results-table",
+                    page_action="custom",
+                    page_current=0,
+                    page_size=PAGE_SIZE,
+                    sort_action="custom",
+                    sort_mode="multi",
+                    filter_action="custom",
                     columns=[],
                     data=[],
                     style_table={'overflowX': 'auto'},
@@ -128,9 +177,21 @@ def nonvideo_tab():
                 ),
                 # Anzeige der Zeilenanzahl (non_video + hr_non_bewegt)
                 html.Button("Export Nicht-Bewegtbild", id="export-nonvideo-button", style={'margin-top': '10px'}),
-                dcc.Download(id="download1"),
-                html.Button("Export Nicht-Bewegtbild (Parquet)", id="export-nonvideo-parquet-button", style={'margin-top': '10px', 'margin-left': '10px'}),
-                dcc.Download(id="download-parquet"),
+                job_panel("export-nonvideo"),
+                html.Div(id="nonvideo-export-link", style={'display': 'inline-block', 'margin-left': '10px'}),
+                html.Button("Export Nicht-Bewegtbild (Parquet/Feather)", id="export-nonvideo-parquet-button", style={'margin-top': '10px', 'margin-left': '10px'}),
+                dcc.RadioItems(
+                    id="export-nonvideo-format",
+                    options=[
+                        {'label': 'Parquet', 'value': 'parquet'},
+                        {'label': 'Feather (Arrow IPC)', 'value': 'feather'},
+                    ],
+                    value='parquet',
+                    inline=True,
+                    style={'display': 'inline-block', 'margin-left': '10px'}
+                ),
+                job_panel("export-nonvideo-parquet"),
+                html.Div(id="nonvideo-parquet-link", style={'display': 'inline-block', 'margin-left': '10px'}),
                 html.Div(id="nonvideo-export-info", style={'margin-top':'8px','fontStyle':'italic'})
             ]),
             dcc.Tab(label="Basecheck", value="basecheck_nbv", children=[
@@ -152,8 +213,15 @@ def nonvideo_tab():
                     html.Button("Berechne Basecheck", id="calculate-basecheck-nbv", style={'margin-top': '10px'})
                 ]),
                 html.Div(id="basecheck-status-nbv", style={'margin-top': '10px'}),
+                view_store("basecheck-table-nbv"),
                 dash_table.DataTable(
                     id="basecheck-table-nbv",
+                    page_action="custom",
+                    page_current=0,
+                    page_size=PAGE_SIZE,
+                    sort_action="custom",
+                    sort_mode="multi",
+                    filter_action="custom",
                     columns=[],
                     data=[],
                     merge_duplicate_headers=True,
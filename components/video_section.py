@@ -1,5 +1,8 @@
 from dash import dcc, html, dash_table
 
+from jobs import job_panel
+from table_backend import PAGE_SIZE, diff_store, view_store
+
 def video_tab():
     return dcc.Tab(label="Bewegtbild", children=[
                 dcc.Tabs([
@@ -40,6 +43,18 @@ def video_tab():
             ], style={'margin-top': '10px', 'display': 'flex', 'flex-wrap': 'wrap', 'gap': '10px'}),
             html.Button("Prozentwerte", id="calculate-percentages", style={'margin-top': '10px'}),
             html.Button("Extrapolate", id="extrapolate", style={'margin-left': '10px'}),
+            # Inkrementell: nur neue/geänderte Prozentzeilen neu extrapolieren
+            dcc.RadioItems(
+                id="extrapolate-mode",
+                options=[
+                    {'label': 'Nur Änderungen', 'value': 'incremental'},
+                    {'label': 'Komplett', 'value': 'full'},
+                ],
+                value='incremental',
+                inline=True,
+                style={'display': 'inline-block', 'margin-left': '10px'}
+            ),
+            job_panel("extrapolate"),
             html.Button("Update Percentages", id="update-percentages", style={'margin-left': '10px'}),
             html.Div(id="percentages-status"),
             html.Div(id="update-percentages-status"),
@@ -57,15 +72,21 @@ def video_tab():
 
             html.Div(id="import-percentages-status", style={"font-size": "12px", "margin-top": "4px", "margin-left": "6px"}),
 
+            view_store("percentages-table"),
+            diff_store("percentages-table"),
             dash_table.DataTable(
                 id="percentages-table",
+                page_action="custom",
+                page_current=0,
+                page_size=PAGE_SIZE,
+                sort_action="custom",
+                sort_mode="multi",
+                filter_action="custom",
                 columns=[],
                 data=[],
                 editable=True,
                 row_selectable="multi",
                 selected_rows=[],
-                 filter_action="native",         # ✅ Filter aktivieren
-                sort_action="native",           # ✅ Sortieren aktivieren      
                 style_table={'overflowX': 'auto'}
             )
         ])
@@ -99,10 +120,19 @@ def video_tab():
                 html.Button("Berechne Ergebnisse", id="calculate-results", style={'margin-top': '10px'}),
                 html.Button("Tabelle", id="calculate-results2", style={'margin-left': '10px'}),
                 html.Button("Export", id="export-button", style={'margin-left': '10px'}),
+                job_panel("results"),
+                job_panel("export-video"),
                 html.Div(id="results-status", style={'margin-top': '10px'}),
-                dcc.Download(id="download"),
+                html.Div(id="video-export-link", style={'margin-top': '10px'}),
+                view_store("results-table"),
                 dash_table.DataTable(
                     id="results-table",
+                    page_action="custom",
+                    page_current=0,
+                    page_size=PAGE_SIZE,
+                    sort_action="custom",
+                    sort_mode="multi",
+                    filter_action="custom",
                     columns=[],
                     data=[],
                     style_table={'overflowX': 'auto'},
@@ -126,8 +156,15 @@ def video_tab():
                 ]),
                 html.Button("Berechne Basecheck", id="calculate-basecheck", style={'margin-top': '10px'}),
                 html.Div(id="basecheck-status", style={'margin-top': '10px'}),
+                view_store("basecheck-table"),
                 dash_table.DataTable(
                     id="basecheck-table",
+                    page_action="custom",
+                    page_current=0,
+                    page_size=PAGE_SIZE,
+                    sort_action="custom",
+                    sort_mode="multi",
+                    filter_action="custom",
                     columns=[],
                     data=[],
                     merge_duplicate_headers=True,
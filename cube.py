@@ -0,0 +1,341 @@
+# cube.py – vorberechnete Aggregat-Cubes über MM/EA-Dimensionskombinationen
+#
+# Nach Import bzw. Extrapolation werden für die am häufigsten genutzten
+# Dimensionskombinationen (laut Nutzungsprotokoll) Teilaggregate materialisiert:
+# Zeilenanzahl, Summen der Kennzahlen, die Menge der distinct bids je Zelle sowie
+# ein HyperLogLog-Sketch der bids für den approximativen Modus. Die Sketches
+# werden dünn besetzt gespeichert (nur belegte Register), da die meisten Zellen
+# nur wenige bids enthalten; ein dichter Sketch je Zelle kostete 2^p Bytes.
+# Gröbere Group-Bys werden anschließend durch Roll-up des feinsten passenden
+# Cubes beantwortet, statt die Rohdaten erneut zu scannen.
+#
+# Das Nutzungsprotokoll wird nicht je Abfrage geschrieben: Treffer sammeln sich
+# im Prozess und werden gebündelt in EINER Transaktion übernommen – nach
+# USAGE_FLUSH_SECONDS, ab USAGE_FLUSH_ENTRIES offenen Einträgen, vor der
+# Cube-Auswahl und beim Beenden des Prozesses.
+
+import atexit
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+from helpers import get_generation
+from sketches import build_sparse_sketches, merge_sparse_sketches, estimate, relative_error
+
+CUBE_DIR = "cache/cubes"
+
+# Kennzahlen, die (sofern vorhanden) in jeder Cube-Zelle summiert werden
+CUBE_MEASURES = ["mentions", "visibility", "broadcasting_time", "ave_100", "ave_weighted", "pr_value"]
+
+# Wie viele Dimensionskombinationen pro Tabelle höchstens materialisiert werden
+MAX_CUBES_PER_TABLE = 4
+
+# Präzision der HLL-Sketches je Cube-Zelle: 2^10 Register, Fehler ca. 3,3 %
+CUBE_SKETCH_PRECISION = 10
+
+# Format der gespeicherten Cubes; ältere Dateien (dichte Sketches) werden ignoriert
+CUBE_FORMAT = 2
+
+# Gepuffertes Nutzungsprotokoll: spätestens nach so vielen Sekunden bzw. offenen
+# Einträgen wird geschrieben
+USAGE_FLUSH_SECONDS = 30
+USAGE_FLUSH_ENTRIES = 200
+
+# (db_path, table, dims) -> [Treffer, zuletzt genutzt]
+_USAGE = {}
+_USAGE_LOCK = threading.Lock()
+_last_flush = time.monotonic()
+# In abgespaltenen Prozessen (Jobs, siehe jobs.py) wird sofort geschrieben, da
+# deren Ende kein atexit auslöst
+_flush_always = False
+
+# Prozess-Cache der geladenen Cubes: table -> (cube_state, {"generation": int, "cubes": [...]});
+# Cubes, die ein anderer Prozess (z. B. ein Job) neu geschrieben hat, werden nachgeladen
+_LOADED = {}
+
+
+def _dims_key(dims):
+    return ",".join(sorted(dims))
+
+
+def log_usage(conn, table, dims, hits=1, last_used=None):
+    """Vermerkt `hits` Auswertungen auf `table`, gruppiert nach `dims`, im Nutzungsprotokoll."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS _cube_usage (
+            table_name TEXT NOT NULL,
+            dims TEXT NOT NULL,
+            hits INTEGER NOT NULL,
+            last_used TEXT NOT NULL,
+            PRIMARY KEY (table_name, dims)
+        );
+    """)
+    conn.execute("""
+        INSERT INTO _cube_usage (table_name, dims, hits, last_used)
+        VALUES (?, ?, ?, COALESCE(?, datetime('now')))
+        ON CONFLICT(table_name, dims) DO UPDATE
+            SET hits = hits + excluded.hits, last_used = excluded.last_used;
+    """, (table, _dims_key(dims), hits, last_used))
+
+
+def record_usage(table, dims, db_path="data.db"):
+    """Merkt eine Gruppierung für das Nutzungsprotokoll vor (gepuffert, siehe flush_usage)."""
+    now = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    with _USAGE_LOCK:
+        entry = _USAGE.setdefault((db_path, table, _dims_key(dims)), [0, now])
+        entry[0] += 1
+        entry[1] = now
+        due = (_flush_always or len(_USAGE) >= USAGE_FLUSH_ENTRIES
+               or time.monotonic() - _last_flush >= USAGE_FLUSH_SECONDS)
+    if due:
+        flush_usage()
+
+
+def flush_usage(db_path=None):
+    """Schreibt die gepufferten Treffer (für `db_path` oder alle Datenbanken) gebündelt."""
+    global _last_flush
+    with _USAGE_LOCK:
+        keys = [k for k in _USAGE if db_path is None or k[0] == db_path]
+        pending = {k: _USAGE.pop(k) for k in keys}
+        if db_path is None:
+            _last_flush = time.monotonic()
+    by_db = {}
+    for (path, table, dims), (hits, last_used) in pending.items():
+        by_db.setdefault(path, []).append((table, dims, hits, last_used))
+    for path, rows in by_db.items():
+        try:
+            with sqlite3.connect(path, timeout=30) as conn:
+                for table, dims, hits, last_used in rows:
+                    log_usage(conn, table, dims.split(",") if dims else [], hits, last_used)
+        except sqlite3.Error:
+            pass  # Nutzungsprotokoll ist nur eine Heuristik für die Cube-Auswahl
+
+
+def _after_fork():
+    """Im Kindprozess: vom Elternprozess geerbte Treffer verwerfen (die schreibt dieser)."""
+    global _USAGE_LOCK, _flush_always
+    _USAGE_LOCK = threading.Lock()
+    _USAGE.clear()
+    _flush_always = True
+
+
+atexit.register(flush_usage)
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def choose_cube_dims(conn, table, max_cubes=MAX_CUBES_PER_TABLE):
+    """
+    Wählt aus dem Nutzungsprotokoll die zu materialisierenden Dimensionskombinationen.
+    Kombinationen, die Teilmenge einer bereits gewählten sind, werden übersprungen,
+    weil sie per Roll-up aus dem größeren Cube beantwortet werden können.
+    """
+    try:
+        rows = conn.execute("""
+            SELECT dims FROM _cube_usage
+            WHERE table_name = ?
+            ORDER BY hits DESC, last_used DESC;
+        """, (table,)).fetchall()
+    except sqlite3.OperationalError:
+        return []
+
+    chosen = []
+    for (dims_str,) in rows:
+        dims = set(d for d in dims_str.split(",") if d and d != "hr_basis")
+        if any(dims <= c for c in chosen):
+            continue
+        chosen.append(dims)
+        if len(chosen) >= max_cubes:
+            break
+    return [sorted(c) for c in chosen]
+
+
+def _build_cube(df, dims, bid_codes):
+    """Gruppiert `df` nach dims + hr_basis und speichert Summen, Anzahl und bid-Paare je Zelle."""
+    keys = list(dims) + ["hr_basis"]
+    measures = [
+        m for m in CUBE_MEASURES
+        if m in df.columns and pd.api.types.is_numeric_dtype(df[m])
+    ]
+
+    grouper = df.groupby(keys, sort=False, dropna=False)
+    cell_ids = grouper.ngroup().to_numpy()
+
+    cells = grouper.size().to_frame("row_count")
+    if measures:
+        cells = grouper[measures].sum().join(cells)
+    cells = cells.reset_index()
+
+    # distinct (Zelle, bid)-Paare – Grundlage für exakte distinct counts beim Roll-up
+    valid = bid_codes >= 0
+    pairs = np.unique(
+        np.stack([cell_ids[valid], bid_codes[valid]], axis=1), axis=0
+    ) if valid.any() else np.empty((0, 2), dtype=np.int64)
+
+    # HLL-Sketch je Zelle (dünn besetzt) – per Maximum über beliebige Roll-ups kombinierbar
+    hll = build_sparse_sketches(cell_ids, df["bid"] if "bid" in df.columns else np.full(len(df), None),
+                                CUBE_SKETCH_PRECISION)
+
+    return {
+        "dims": keys,
+        "measures": measures,
+        "cells": cells,
+        "bid_cells": pairs[:, 0],
+        "bid_codes": pairs[:, 1],
+        "hll": hll,
+    }
+
+
+def materialize_cubes(table, db_path="data.db"):
+    """
+    Materialisiert die Cubes für `table` anhand des Nutzungsprotokolls und
+    speichert sie zusammen mit der Tabellengeneration unter CUBE_DIR.
+    Gibt die Anzahl der gebauten Cubes zurück.
+    """
+    flush_usage(db_path)
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        # Ohne Nutzungsdaten wenigstens den Basis-Cube (nur hr_basis) bauen,
+        # damit Übersichten und der approximative Modus ohne Scan auskommen
+        dim_sets = choose_cube_dims(conn, table) or [[]]
+        generation = get_generation(conn, table)
+        df = pd.read_sql(f"SELECT * FROM {table}", conn)
+
+    if df.empty or "hr_basis" not in df.columns:
+        _drop_cubes(table)
+        return 0
+
+    # bid-Surrogat-IDs einmal pro Tabelle vergeben
+    bid_codes, _ = pd.factorize(df["bid"]) if "bid" in df.columns else (np.full(len(df), -1), None)
+
+    cubes = []
+    for dims in dim_sets:
+        if all(d in df.columns for d in dims):
+            cubes.append(_build_cube(df, dims, bid_codes))
+
+    os.makedirs(CUBE_DIR, exist_ok=True)
+    payload = {"generation": generation, "format": CUBE_FORMAT, "cubes": cubes}
+    path = os.path.join(CUBE_DIR, f"{table}.pkl")
+    # Atomar ersetzen: andere Prozesse lesen nie eine halb geschriebene Datei
+    part = f"{path}.{os.getpid()}.part"
+    with open(part, "wb") as fh:
+        pickle.dump(payload, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(part, path)
+    _LOADED[table] = (cube_state(table), payload)
+    return len(cubes)
+
+
+def _drop_cubes(table):
+    _LOADED.pop(table, None)
+    try:
+        os.remove(os.path.join(CUBE_DIR, f"{table}.pkl"))
+    except FileNotFoundError:
+        pass
+
+
+def clear_cubes():
+    """Verwirft alle materialisierten Cubes und gepufferte Nutzung (z. B. beim Leeren der Datenbank)."""
+    with _USAGE_LOCK:
+        _USAGE.clear()
+    _LOADED.clear()
+    shutil.rmtree(CUBE_DIR, ignore_errors=True)
+
+
+def _load_cubes(table, generation):
+    state = cube_state(table)
+    if state is None:
+        _LOADED.pop(table, None)
+        return []
+    loaded = _LOADED.get(table)
+    if loaded is not None and loaded[0] == state:
+        payload = loaded[1]
+    else:
+        try:
+            with open(os.path.join(CUBE_DIR, f"{table}.pkl"), "rb") as fh:
+                payload = pickle.load(fh)
+        except Exception:
+            return []
+        _LOADED[table] = (state, payload)
+    # Veraltete Cubes (Tabelle wurde seitdem geändert oder altes Format) nicht verwenden
+    if payload.get("generation") != generation or payload.get("format") != CUBE_FORMAT:
+        return []
+    return payload.get("cubes", [])
+
+
+def cube_state(table):
+    """
+    Kennung des zuletzt materialisierten Cube-Stands von `table` (None ohne Cubes).
+    Für Memo-Schlüssel von Ergebnissen, die davon abhängen, ob ein Cube vorhanden ist.
+    """
+    try:
+        return os.stat(os.path.join(CUBE_DIR, f"{table}.pkl")).st_mtime_ns
+    except OSError:
+        return None
+
+
+def rollup(cube, dims, measures, approx=False, dropna=True):
+    """
+    Rollt einen Cube auf die gröberen `dims` hoch.
+    Summen werden addiert, distinct bids über die (Zelle, bid)-Paare exakt gezählt –
+    bzw. mit approx=True aus den zusammengeführten HLL-Sketches geschätzt.
+    Zeilen mit fehlenden Schlüsselwerten entfallen – wie beim normalen groupby –,
+    sofern nicht dropna=False (wie GROUP BY in SQL) gesetzt ist.
+    """
+    cells = cube["cells"]
+    grouper = cells.groupby(dims, sort=True, dropna=dropna)
+    # Zellen mit fehlendem Schlüssel erhalten NaN und werden als -1 markiert
+    group_of_cell = grouper.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+
+    result = grouper[measures + ["row_count"]].sum().reset_index()
+
+    if approx:
+        merged = merge_sparse_sketches(*cube["hll"], group_of_cell, len(result), CUBE_SKETCH_PRECISION)
+        result["distinct_bid"] = np.round(estimate(merged)).astype(np.int64)
+        return result
+
+    groups = group_of_cell[cube["bid_cells"]]
+    keep = groups >= 0
+    if keep.any():
+        pairs = np.unique(np.stack([groups[keep], cube["bid_codes"][keep]], axis=1), axis=0)
+        result["distinct_bid"] = np.bincount(pairs[:, 0], minlength=len(result))
+    else:
+        result["distinct_bid"] = 0
+    return result
+
+
+def note_usage(table, dims, db_path="data.db"):
+    """Vermerkt eine Gruppierung im Nutzungsprotokoll, die ohne Cube beantwortet wurde."""
+    record_usage(table, dims, db_path)
+
+
+def query_cube(table, dims, measures=(), db_path="data.db", approx=False, dropna=True):
+    """
+    Beantwortet ein Group-By über `dims` (inkl. hr_basis, falls gewünscht) aus einem
+    materialisierten Cube. Liefert ein DataFrame mit dims, den Summen der `measures`,
+    row_count und distinct_bid – oder None, wenn kein aktueller Cube die dims abdeckt.
+    Mit approx=True ist distinct_bid eine HLL-Schätzung (siehe sketch_error()).
+    Jeder Aufruf wird (gepuffert) im Nutzungsprotokoll vermerkt.
+    """
+    dims = list(dims)
+    measures = list(measures)
+    record_usage(table, dims, db_path)
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        generation = get_generation(conn, table)
+
+    candidates = [
+        c for c in _load_cubes(table, generation)
+        if set(dims) <= set(c["dims"]) and set(measures) <= set(c["measures"])
+        and (not approx or "hll" in c)
+    ]
+    if not candidates:
+        return None
+    # Feinster passender Cube mit den wenigsten Zellen
+    best = min(candidates, key=lambda c: len(c["cells"]))
+    return rollup(best, dims, measures, approx, dropna)
+
+
+def sketch_error():
+    """Relativer Standardfehler der approximativen distinct counts aus den Cubes."""
+    return relative_error(CUBE_SKETCH_PRECISION)
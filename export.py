@@ -0,0 +1,265 @@
+# export.py – Split-Export (ZIP mit einer Datei je Dimensionskombination)
+#
+# Der DataFrame wird einmal per groupby(split_dims, sort=False) partitioniert;
+# jede Datei entsteht aus ihrem Gruppen-Slice statt aus einer Maske über den
+# gesamten Frame je Kombination.
+#
+# Mit workers > 1 werden die Dateien in einem Prozess-Pool gerendert. Fertige
+# Dateien werden sofort in das ZIP geschrieben, aber immer in der Reihenfolge der
+# Gruppen – Inhalt und Dateinamen sind damit unabhängig von der Worker-Anzahl.
+#
+# Für Parquet/Feather gibt es statt eines ZIPs einzelner Dateien einen nativen
+# Dataset-Export: ein Hive-partitioniertes Verzeichnis (country=DE/channel=X/...)
+# in einem Durchlauf, komprimiert mit zstd, ausgeliefert als tar-Archiv.
+#
+# Große Tabellen (video_final) werden mit stream_excel direkt aus einem
+# SQLite-Cursor in ein write-only Workbook geschrieben (konstanter Speicher);
+# Zahlenformate werden je Spalte einmal festgelegt statt je Zelle gesetzt.
+#
+# Dauern sind als ganze Sekunden gespeichert; erst beim Schreiben nach Excel werden
+# sie in Excel-Zeitwerte (Bruchteile eines Tages) umgerechnet.
+
+import os
+import re
+import shutil
+import sqlite3
+import tarfile
+import zipfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import openpyxl
+import pandas as pd
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+
+from helpers import DURATION_COLUMNS, SECONDS_PER_DAY
+
+# In Dateinamen unter Windows/macOS/Linux nicht erlaubte Zeichen
+_INVALID_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]+')
+MAX_NAME_LENGTH = 150
+
+# Zahlenformate je Spalte (Spaltenname in Kleinbuchstaben)
+DURATION_FORMAT = 'h:mm:ss'
+MONEY_FORMAT = '#,##0'
+VIDEO_FINAL_FORMATS = {
+    **{col: MONEY_FORMAT for col in ["pr_value", "ave_100", "ave_weighted", "sponsoring_value_cpt"]},
+    **{col: DURATION_FORMAT for col in DURATION_COLUMNS},
+}
+
+# Parquet/Arrow: Kompression und Zeilen je Row Group
+DATASET_COMPRESSION = "zstd"
+ROW_GROUP_ROWS = 128_000
+
+# Zeilen je fetchmany beim Streamen aus SQLite
+STREAM_BATCH_ROWS = 10_000
+
+# Worker für das parallele Rendern von Split-Exporten
+EXPORT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def sanitize_filename(name):
+    """Ersetzt unzulässige Zeichen durch '_' und kürzt auf MAX_NAME_LENGTH Zeichen."""
+    name = _INVALID_CHARS.sub("_", str(name)).strip().strip(".")
+    return name[:MAX_NAME_LENGTH] or "leer"
+
+
+def excel_durations(df):
+    """Kopie von `df` mit den Dauer-Spalten als Excel-Zeitwerte (Tage)."""
+    columns = [col for col in df.columns if col in DURATION_COLUMNS]
+    if not columns:
+        return df
+    df = df.copy()
+    for col in columns:
+        df[col] = df[col].astype("float64") / SECONDS_PER_DAY
+    return df
+
+
+def write_excel(df, target, sheet_name="data"):
+    with pd.ExcelWriter(target, engine="openpyxl") as w:
+        excel_durations(df).to_excel(w, index=False, sheet_name=sheet_name)
+    return target
+
+
+def write_parquet(df, target):
+    df.to_parquet(target, index=False, engine="pyarrow",
+                  compression=DATASET_COMPRESSION, row_group_size=ROW_GROUP_ROWS)
+    return target
+
+
+def write_feather(df, target):
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), target,
+                          compression=DATASET_COMPRESSION)
+    return target
+
+
+def excel_bytes(df, sheet_name="data"):
+    return write_excel(df, BytesIO(), sheet_name).getvalue()
+
+
+def write_dataset_tar(df, partition_cols, target, fmt="parquet", name="dataset"):
+    """
+    Schreibt `df` als Hive-partitioniertes Dataset (Parquet oder Feather/Arrow IPC)
+    in einem Durchlauf und packt das Verzeichnis als unkomprimiertes tar nach `target`.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    partitioning = ds.partitioning(
+        pa.schema([table.schema.field(col) for col in partition_cols]), flavor="hive"
+    )
+    if fmt == "feather":
+        file_format = ds.IpcFileFormat()
+        file_options = file_format.make_write_options(
+            compression=pa.Codec(DATASET_COMPRESSION))
+        extension = "arrow"
+    else:
+        file_format = ds.ParquetFileFormat()
+        file_options = file_format.make_write_options(compression=DATASET_COMPRESSION)
+        extension = "parquet"
+
+    staging = f"{target}.d"
+    try:
+        ds.write_dataset(
+            table, os.path.join(staging, name),
+            format=file_format,
+            file_options=file_options,
+            partitioning=partitioning,
+            basename_template=f"part-{{i}}.{extension}",
+            max_rows_per_group=ROW_GROUP_ROWS,
+            min_rows_per_group=min(ROW_GROUP_ROWS, max(len(df), 1)),
+            max_partitions=max(1024, len(df)),
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        with tarfile.open(target, mode="w") as tar:
+            tar.add(os.path.join(staging, name), arcname=name)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return target
+
+
+def split_groups(df, split_dims):
+    """
+    Liefert (Dateiname ohne Endung, Gruppen-Slice) je Kombination der split_dims,
+    in der Reihenfolge des ersten Auftretens. Fehlende Werte bilden eine eigene Gruppe.
+    Namen sind bereinigt und innerhalb des Exports eindeutig.
+    """
+    used = set()
+    for key, sub in df.groupby(split_dims, sort=False, dropna=False):
+        key = key if isinstance(key, tuple) else (key,)
+        base = sanitize_filename("_".join(f"{dim}-{val}" for dim, val in zip(split_dims, key)))
+        name, n = base, 2
+        while name.lower() in used:
+            name = f"{base}_{n}"
+            n += 1
+        used.add(name.lower())
+        yield name, sub
+
+
+def split_zip(df, split_dims, render, extension, workers=1, target=None, progress=None):
+    """
+    ZIP mit einer Datei je Kombination; `render(sub)` liefert die Bytes einer Datei
+    (muss für workers > 1 eine Modul-Funktion sein, damit sie gepickelt werden kann).
+    Mit `target` (Pfad) wird direkt in die Datei geschrieben, sonst werden Bytes geliefert.
+    `progress(n)` wird nach jeder geschriebenen Datei aufgerufen.
+    """
+    zip_buf = BytesIO() if target is None else target
+    groups = split_groups(df, split_dims)
+    written = 0
+
+    def add(name, data):
+        nonlocal written
+        zf.writestr(f"{name}.{extension}", data)
+        written += 1
+        if progress:
+            progress(written)
+
+    with zipfile.ZipFile(zip_buf, mode="w") as zf:
+        if workers <= 1:
+            for name, sub in groups:
+                add(name, render(sub))
+        else:
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                # Höchstens 2 Aufträge je Worker unterwegs, damit nicht alle Slices
+                # gleichzeitig an die Worker übertragen werden
+                pending = deque()
+                for name, sub in groups:
+                    pending.append((name, pool.submit(render, sub)))
+                    if len(pending) >= workers * 2:
+                        done_name, future = pending.popleft()
+                        add(done_name, future.result())
+                while pending:
+                    done_name, future = pending.popleft()
+                    add(done_name, future.result())
+    return zip_buf.getvalue() if target is None else target
+
+
+def stream_excel(cursor, sheet_name="data", formats=None, target=None, progress=None):
+    """
+    Schreibt das Ergebnis eines ausgeführten SQLite-Cursors zeilenweise in ein
+    write-only Workbook. `formats` ordnet Spaltennamen (Kleinbuchstaben) ein
+    Zahlenformat zu; es wird als Spaltenstil gesetzt und über eine Stilvorlage je
+    Spalte auf die Datenzellen übertragen. Ohne `target` werden die Bytes geliefert.
+    `progress(n)` erhält nach jedem Block die Zahl der geschriebenen Zeilen.
+    """
+    formats = formats or {}
+    columns = [d[0] for d in cursor.description]
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+
+    # Spaltenstile müssen vor der ersten Zeile feststehen
+    templates = {}
+    for i, col in enumerate(columns):
+        fmt = formats.get(col.lower())
+        if fmt:
+            ws.column_dimensions[get_column_letter(i + 1)].number_format = fmt
+            cell = WriteOnlyCell(ws)
+            cell.number_format = fmt
+            templates[i] = cell
+
+    ws.append(columns)
+    written = 0
+    while True:
+        rows = cursor.fetchmany(STREAM_BATCH_ROWS)
+        if not rows:
+            break
+        for row in rows:
+            if templates:
+                row = list(row)
+                for i, cell in templates.items():
+                    if row[i] is not None:
+                        cell.value = row[i]
+                        row[i] = cell
+            ws.append(row)
+        written += len(rows)
+        if progress:
+            progress(written)
+
+    if target is not None:
+        wb.save(target)
+        return target
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def export_table_to_excel(db_path, table, sheet_name="data", formats=None, target=None, progress=None):
+    """
+    Streamt eine komplette SQLite-Tabelle mit stream_excel in eine Excel-Datei;
+    Dauern werden dabei in SQL in Excel-Zeitwerte umgerechnet.
+    """
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}");')]
+        select = ", ".join(
+            f'"{col}" / {SECONDS_PER_DAY}.0 AS "{col}"' if col in DURATION_COLUMNS else f'"{col}"'
+            for col in columns
+        )
+        cursor = conn.execute(f'SELECT {select} FROM "{table}"')
+        return stream_excel(cursor, sheet_name, formats, target, progress)
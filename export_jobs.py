@@ -0,0 +1,223 @@
+# export_jobs.py – Exporte als Dateien im Spool-Verzeichnis + Download-Route
+#
+# Exporte werden nicht mehr als BytesIO über dcc.send_bytes (base64 in der
+# Callback-Antwort) ausgeliefert, sondern als Job in SPOOL_DIR/<job_id>/ auf die
+# Platte geschrieben. Die Flask-Route auf app.server streamt die fertige Datei
+# per send_file (mit Range-Requests); der Dash-Callback liefert nur noch den Link.
+# Alte Jobs werden nach EXPORT_TTL_SECONDS aufgeräumt.
+#
+# cached_export_job verwendet als Job-ID einen Hash aus Tabellengenerationen,
+# Exporttyp und Split-Dimensionen: Ein wiederholter Export derselben Daten liefert
+# die bereits gerenderte Datei aus. Übersteigt der Spool EXPORT_CACHE_MAX_BYTES,
+# werden die am längsten nicht genutzten Jobs gelöscht (LRU über die mtime).
+# Gleichzeitige Anfragen zur selben Job-ID werden im Prozess serialisiert: Die
+# zweite wartet auf die erste und liefert dann deren Datei aus. Jeder Schreiber
+# nutzt eine eigene temporäre Datei, die per os.replace atomar übernommen wird.
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import quote
+
+from dash import html
+from flask import abort, send_file
+
+from helpers import get_generation
+
+SPOOL_DIR = os.path.join("cache", "exports")
+ROUTE_PREFIX = "/exports"
+
+# Wie lange fertige Exporte zum (erneuten) Herunterladen bereitliegen
+EXPORT_TTL_SECONDS = 6 * 3600
+
+# Obergrenze für den gesamten Spool (Cache-Artefakte + einmalige Jobs)
+EXPORT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Laufende Jobs: job_id -> [RLock, Anzahl Nutzer] (reentrant: cached_export_job ruft run_export_job)
+_inflight = {}
+_inflight_guard = threading.Lock()
+
+
+def _after_fork():
+    """Im Kindprozess: Sperren laufender Jobs des Elternprozesses nicht übernehmen."""
+    global _inflight_guard
+    _inflight_guard = threading.Lock()
+    _inflight.clear()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+class _job_lock:
+    """Serialisiert Jobs mit derselben ID innerhalb des Prozesses."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def __enter__(self):
+        with _inflight_guard:
+            entry = _inflight.setdefault(self.job_id, [threading.RLock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+        return self
+
+    def __exit__(self, *exc):
+        with _inflight_guard:
+            entry = _inflight[self.job_id]
+            entry[0].release()
+            entry[1] -= 1
+            if not entry[1]:
+                del _inflight[self.job_id]
+
+
+def job_path(job_id, filename):
+    return os.path.join(SPOOL_DIR, job_id, os.path.basename(filename))
+
+
+def cleanup_spool(max_age=EXPORT_TTL_SECONDS):
+    """Löscht Jobs, deren Verzeichnis älter als `max_age` Sekunden ist."""
+    if not os.path.isdir(SPOOL_DIR):
+        return
+    cutoff = time.time() - max_age
+    for job_id in os.listdir(SPOOL_DIR):
+        path = os.path.join(SPOOL_DIR, job_id)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def evict_spool(max_bytes=EXPORT_CACHE_MAX_BYTES, keep=None):
+    """Löscht die am längsten nicht genutzten Jobs, bis der Spool unter `max_bytes` liegt."""
+    if not os.path.isdir(SPOOL_DIR):
+        return
+    jobs = []
+    for job_id in os.listdir(SPOOL_DIR):
+        path = os.path.join(SPOOL_DIR, job_id)
+        try:
+            jobs.append((os.path.getmtime(path), job_id, _dir_size(path)))
+        except OSError:
+            pass
+    total = sum(size for _, _, size in jobs)
+    for _, job_id, size in sorted(jobs):
+        if total <= max_bytes:
+            break
+        if job_id == keep:
+            continue
+        shutil.rmtree(os.path.join(SPOOL_DIR, job_id), ignore_errors=True)
+        total -= size
+
+
+def clear_spool():
+    """Verwirft alle Exporte (z. B. beim Leeren der Datenbank)."""
+    shutil.rmtree(SPOOL_DIR, ignore_errors=True)
+
+
+def table_generations(db_path, *tables):
+    """Generationszähler der Tabellen – Teil des Cache-Schlüssels."""
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        return [get_generation(conn, tbl) for tbl in tables]
+
+
+def cache_key(*parts):
+    """32-stellige Job-ID aus beliebigen JSON-serialisierbaren Schlüsselteilen."""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def cached_export_job(key_parts, filename, write):
+    """
+    Wie run_export_job, aber mit festem Schlüssel: Existiert die Datei zum Schlüssel
+    bereits, wird sie nur als benutzt markiert. Gibt (job_id, aus_cache) zurück.
+    """
+    job_id = cache_key(filename, *key_parts)
+    path = job_path(job_id, filename)
+    with _job_lock(job_id):
+        if os.path.isfile(path):
+            now = time.time()
+            os.utime(os.path.dirname(path), (now, now))
+            return job_id, True
+        run_export_job(filename, write, job_id)
+    evict_spool(keep=job_id)
+    return job_id, False
+
+
+def run_export_job(filename, write, job_id=None):
+    """
+    Legt einen Export-Job an und ruft `write(pfad)` auf, um die Datei zu erzeugen.
+    Geschrieben wird zunächst in eine eigene temporäre Datei, die erst nach Erfolg
+    per os.replace übernommen wird – die Route liefert also nie halbfertige Dateien
+    aus. Bei einem Fehler wird nur diese temporäre Datei entfernt. Gibt die Job-ID zurück.
+    """
+    cleanup_spool()
+    job_id = job_id or uuid.uuid4().hex
+    path = job_path(job_id, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    root, ext = os.path.splitext(path)
+    part = f"{root}.{uuid.uuid4().hex}.part{ext}"  # Endung bleibt erhalten (pandas prüft sie)
+    with _job_lock(job_id):
+        try:
+            write(part)
+            os.replace(part, path)
+        except BaseException:
+            try:
+                os.remove(part)
+            except OSError:
+                pass
+            raise
+    return job_id
+
+
+def download_url(job_id, filename):
+    return f"{ROUTE_PREFIX}/{job_id}/{quote(os.path.basename(filename))}"
+
+
+def download_link(job_id, filename, cached=False):
+    """Link-Komponente für den Callback-Output."""
+    path = job_path(job_id, filename)
+    size_mb = os.path.getsize(path) / 1024 / 1024 if os.path.exists(path) else 0
+    suffix = ", aus Cache" if cached else ""
+    return html.A(
+        f"📥 {filename} herunterladen ({size_mb:,.1f} MB{suffix})",
+        href=download_url(job_id, filename),
+        target="_blank",
+    )
+
+
+def register_export_routes(server):
+    """Registriert die Download-Route auf dem Flask-Server der Dash-App."""
+
+    @server.route(f"{ROUTE_PREFIX}/<job_id>/<path:filename>")
+    def download_export(job_id, filename):
+        if not _JOB_ID.match(job_id):
+            abort(404)
+        path = job_path(job_id, filename)
+        if not os.path.isfile(path):
+            abort(404)
+        return send_file(
+            os.path.abspath(path),
+            as_attachment=True,
+            download_name=os.path.basename(filename),
+            conditional=True,  # ETag/Last-Modified und Range-Requests
+            max_age=0,
+        )
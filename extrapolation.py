@@ -0,0 +1,280 @@
+# extrapolation.py – Hilfsfunktionen für die HR-Extrapolation
+#
+# Die Kandidatensuche für jede Zeile aus percent_non_video lief bisher als
+# wiederholter Filter über die komplette non_video-Tabelle. Hier wird stattdessen
+# einmal pro Lauf ein Index über die normalisierten MM-Schlüssel aufgebaut, aus
+# dem jede Prozentzeile ihre Kandidatenpositionen direkt abruft.
+#
+# Die Prozentzeilen sind voneinander unabhängig und können daher in Shards auf
+# einen Prozess-Pool verteilt werden. Die Kandidaten liegen dafür einmalig als
+# Arrow-IPC-Datei unter cache/ und werden von jedem Worker per Memory-Map gelesen
+# (extrapolation_worker.py).
+# Jede Zeile zieht mit einem Generator aus (Seed, row_id der Prozentzeile bzw.
+# Zeilenposition ohne row_id) – das Ergebnis ist daher identisch zum seriellen
+# Lauf und eine einzeln neu extrapolierte Zeile zieht dieselben Kandidaten wie im
+# Gesamtlauf. Jede HR-Zeile trägt in src_percent_id die row_id ihrer Prozentzeile.
+
+import os
+import uuid
+import multiprocessing
+from math import ceil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from sampling import DEFAULT_SEED, DEFAULT_STRATEGY, draw_positions, row_rng
+
+EXTRAPOLATION_CACHE_DIR = "cache"
+
+# Skalierungsfaktor auf ids_for_HR
+SCALE = 1.5
+
+# Shards je Worker – mehr Shards gleichen ungleich teure Prozentzeilen aus
+SHARDS_PER_WORKER = 4
+
+# Höchstens so viele Prozentzeilen je Batch, der nach hr_non_bewegt geschrieben wird
+BATCH_PERCENT_ROWS = 200
+
+# Schlüssel der Prozentzeilen (percent_store.ROW_KEY) und Herkunftsspalte der HR-Zeilen
+PERCENT_KEY = "row_id"
+SOURCE_KEY = "src_percent_id"
+
+
+def normalize_keys(df, dims):
+    """Dimensionsspalten als Text (Werte sind seit dem Import normalisiert, normalize.py)."""
+    return pd.DataFrame({dim: df[dim].astype(str) for dim in dims}, index=df.index)
+
+
+def row_key(row, dims):
+    """Schlüssel einer Prozentzeile – gleiche Normalisierung wie normalize_keys."""
+    return tuple(str(row.get(dim, '')) for dim in dims)
+
+
+def hr_candidates(df):
+    """Zeilen mit hr_basis == 'HR' (Schreibweise beim Import vereinheitlicht)."""
+    is_hr = df['hr_basis'] == 'HR'
+    return df[is_hr.fillna(False).astype(bool)]
+
+
+# Spalten, die die Ziehung (sampling.STRATEGIES) je Kandidat liest
+SAMPLING_COLUMNS = ["pr_value", "channel", "country"]
+
+
+class CandidateIndex:
+    """
+    Index der HR-Kandidaten (hr_basis == 'HR') über die MM-Dimensionen.
+    `positions(key)` liefert die Kandidatenpositionen für einen Schlüssel in O(1),
+    `sampling_frame` die Spalten für die Ziehung und `take` die vollständigen
+    Kandidatenzeilen; die Reihenfolge entspricht dem ursprünglichen Filter.
+    """
+
+    def __init__(self, df, mm_dims):
+        self.candidates = hr_candidates(df)
+        self._build(mm_dims, len(self.candidates), self.candidates.columns,
+                    lambda col: self.candidates[col].to_numpy())
+
+    def _build(self, mm_dims, n_rows, names, column):
+        self.mm_dims = list(mm_dims)
+        self._sampling = {col: column(col) for col in SAMPLING_COLUMNS if col in names}
+        if not n_rows:
+            self._positions = {}
+            return
+        keys = normalize_keys(pd.DataFrame({dim: column(dim) for dim in self.mm_dims}), self.mm_dims)
+        grouped = keys.groupby(self.mm_dims, sort=False, dropna=False).indices
+        # groupby liefert bei einer Dimension skalare Schlüssel
+        self._positions = {
+            (k if isinstance(k, tuple) else (k,)): v for k, v in grouped.items()
+        }
+
+    def positions(self, key):
+        return self._positions.get(tuple(key), np.empty(0, dtype=np.int64))
+
+    def sampling_frame(self, positions):
+        """Nur die Spalten aus SAMPLING_COLUMNS für die Kandidaten an `positions`."""
+        return pd.DataFrame({col: values[positions] for col, values in self._sampling.items()})
+
+    def take(self, positions):
+        """Vollständige Kandidatenzeilen an `positions` (neu durchnummeriert)."""
+        return self.candidates.take(positions).reset_index(drop=True)
+
+    def __len__(self):
+        return len(self._positions)
+
+
+class ArrowCandidateIndex(CandidateIndex):
+    """
+    CandidateIndex über eine (per Memory-Map gelesene) Arrow-Tabelle mit bereits
+    gefilterten Kandidaten. Schlüssel- und Ziehungsspalten werden als NumPy-Arrays
+    gelesen (Zahlenspalten ohne Kopie), nach pandas umgewandelt werden nur die
+    gezogenen Zeilen.
+    """
+
+    def __init__(self, table, mm_dims):
+        self.table = table
+        self._build(mm_dims, table.num_rows, table.column_names,
+                    lambda col: table.column(col).to_numpy())
+
+    def take(self, positions):
+        return self.table.take(positions).to_pandas()
+
+
+def parse_ids_for_hr(value, scale=SCALE):
+    """ids_for_HR aus der Prozenttabelle (mit Tausendertrennern) lesen und skalieren."""
+    ids_digits = "".join(ch for ch in str(value) if ch.isdigit())
+    try:
+        base_ids = int(ids_digits) if ids_digits else 0
+    except ValueError:
+        base_ids = 0
+    return ceil(base_ids * scale)
+
+
+def _parse_number(value, default, cast=float):
+    """Zahl aus der Prozenttabelle lesen (Dezimalkomma erlaubt)."""
+    try:
+        return cast(float(str(value).replace(',', '.')))
+    except (TypeError, ValueError, OverflowError):
+        return default
+
+
+def build_hr_rows(cand_index, df_percent, positions, percent_rows, ea_dims):
+    """
+    Baut die HR-Zeilen spaltenweise: die gezogenen Kandidatenpositionen werden per
+    `cand_index.take` eingesammelt, die Konstanten der jeweiligen Prozentzeile
+    (EA-Dimensionen, mentions, Gewichtungsfaktor) per np.repeat auf die gezogenen
+    Zeilen verteilt.
+    """
+    if not positions:
+        return pd.DataFrame()
+    counts = np.fromiter((len(p) for p in positions), dtype=np.int64, count=len(positions))
+    df_hr = cand_index.take(np.concatenate(positions))
+    src = df_percent.iloc[percent_rows]
+
+    def per_row(values):
+        return np.repeat(np.asarray(values, dtype=object), counts)
+
+    # EA-Dimensionen aus der Prozentzeile übernehmen
+    for ea in ea_dims or []:
+        if ea in df_percent.columns:
+            df_hr[ea] = per_row(src[ea].to_numpy())
+
+    if 'avg_mentions' in src.columns:
+        mentions = [_parse_number(v, 1, int) for v in src['avg_mentions']]
+    else:
+        mentions = [1] * len(src)
+    df_hr['mentions'] = np.repeat(np.asarray(mentions, dtype=np.int64), counts)
+
+    weighting = np.array(
+        [_parse_number(v, 0.0) for v in src.get('avg_weighting_factor', pd.Series(0, index=src.index))],
+        dtype=np.float64,
+    )
+    weighting = np.repeat(weighting, counts)
+    pr_value = pd.to_numeric(df_hr['pr_value'], errors='coerce').to_numpy(dtype=np.float64)
+
+    df_hr['ave_100'] = df_hr['pr_value']
+    df_hr['ave_weighting_factor'] = weighting
+    df_hr['ave_weighted'] = pr_value * (weighting / 100)
+    df_hr['hr_basis'] = 'HR'
+    if PERCENT_KEY in src.columns:
+        df_hr[SOURCE_KEY] = np.repeat(src[PERCENT_KEY].to_numpy(dtype=np.int64), counts)
+    return df_hr
+
+
+def extrapolate_rows(df_percent, cand_index, ea_dims, seed, row_offset=0, strategy=DEFAULT_STRATEGY):
+    """
+    Erzeugt die HR-Zeilen für `df_percent`. Die Ziehung bestimmen `seed` und die
+    row_id der Prozentzeile; ohne row_id die Position in der gesamten Prozenttabelle
+    (`row_offset` = Position der ersten Zeile). `strategy` ist ein Schlüssel aus
+    sampling.STRATEGIES.
+    Gibt (DataFrame der HR-Zeilen, Zähler) zurück.
+    """
+    stats = {"rows": len(df_percent), "requested": 0, "produced": 0, "zero_id": 0, "no_cand": 0}
+    positions = []
+    percent_rows = []
+    keys = df_percent[PERCENT_KEY].to_numpy() if PERCENT_KEY in df_percent.columns else None
+
+    for i, (_, pr) in enumerate(df_percent.iterrows()):
+        # a) ids_for_hr parsen, skalieren & aufrunden
+        ids_for_hr = parse_ids_for_hr(pr.get("ids_for_HR", 0))
+        if ids_for_hr <= 0:
+            stats["zero_id"] += 1
+            continue
+        stats["requested"] += ids_for_hr
+
+        # b) Kandidatenpositionen aus dem Index
+        cand_pos = cand_index.positions(row_key(pr, cand_index.mm_dims))
+        if not len(cand_pos):
+            stats["no_cand"] += 1
+            continue
+
+        # c) Ziehung nach gewählter Strategie in einem Zug
+        df_cand = cand_index.sampling_frame(cand_pos)
+        stream = int(keys[i]) if keys is not None else row_offset + i
+        sampled = draw_positions(strategy, row_rng(seed, stream), df_cand, ids_for_hr)
+        positions.append(cand_pos[sampled])
+        percent_rows.append(i)
+        stats["produced"] += len(sampled)
+
+    df_hr = build_hr_rows(cand_index, df_percent, positions, percent_rows, ea_dims)
+    return df_hr, stats
+
+
+# --- Paralleler Modus -------------------------------------------------------
+
+def _write_candidates(candidates):
+    import pyarrow as pa
+    os.makedirs(EXTRAPOLATION_CACHE_DIR, exist_ok=True)
+    path = os.path.join(EXTRAPOLATION_CACHE_DIR, f"candidates_{uuid.uuid4().hex}.arrow")
+    table = pa.Table.from_pandas(candidates.reset_index(drop=True), preserve_index=False)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return path
+
+
+def iter_extrapolation(df_percent, df_nonvideo, mm_dims, ea_dims, seed=DEFAULT_SEED, workers=1,
+                       strategy=DEFAULT_STRATEGY):
+    """
+    Extrapoliert alle Prozentzeilen in Batches und liefert je Batch
+    (DataFrame der HR-Zeilen, Zähler) – in der Reihenfolge der Prozenttabelle.
+    Mit workers > 1 werden die Batches auf einen Prozess-Pool verteilt.
+    """
+    workers = max(1, int(workers or 1))
+    if df_percent.empty:
+        return
+    batch_rows = min(BATCH_PERCENT_ROWS, ceil(len(df_percent) / (workers * SHARDS_PER_WORKER)))
+    bounds = list(range(0, len(df_percent), batch_rows)) + [len(df_percent)]
+    shards = [
+        (df_percent.iloc[start:stop], ea_dims, seed, start, strategy)
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    ]
+
+    if workers == 1 or len(shards) < 2:
+        cand_index = CandidateIndex(df_nonvideo, mm_dims)
+        for df_shard, _, _, start, _ in shards:
+            yield extrapolate_rows(df_shard, cand_index, ea_dims, seed, start, strategy)
+        return
+
+    # Worker laden nur extrapolation_worker, nicht das __main__-Modul (app.py)
+    from extrapolation_worker import init_worker, run_shard, spawn_main
+
+    arrow_path = _write_candidates(hr_candidates(df_nonvideo))
+    try:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=init_worker,
+                                 initargs=(arrow_path, list(mm_dims))) as pool:
+            # map reicht alle Shards sofort ein und startet dabei die Worker
+            with spawn_main():
+                results = pool.map(run_shard, shards)
+            try:
+                yield from results
+            except GeneratorExit:
+                # Abbruch durch den Aufrufer: noch nicht gestartete Shards verwerfen
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+    finally:
+        try:
+            os.remove(arrow_path)
+        except OSError:
+            pass
@@ -0,0 +1,39 @@
+# extrapolation_worker.py – Einstiegspunkt der Worker-Prozesse der parallelen Extrapolation
+#
+# Die Worker werden per "spawn" gestartet. Ein neuer Prozess importiert dabei das
+# __main__-Modul des Elternprozesses nach – beim Start über `python app.py` also
+# die komplette Dash-App samt Startschritten auf data.db. Solange der Pool seine
+# Prozesse startet, steht deshalb dieses Modul als __main__ bereit (spawn_main);
+# die Worker laden nur extrapolation/sampling und die Kandidaten aus der Arrow-Datei.
+
+import sys
+from contextlib import contextmanager
+
+from extrapolation import ArrowCandidateIndex, extrapolate_rows
+
+_INDEX = None
+
+
+@contextmanager
+def spawn_main():
+    """Neu gestartete spawn-Prozesse laden dieses Modul statt des aktuellen __main__."""
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = sys.modules[__name__]
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+def init_worker(arrow_path, mm_dims):
+    """Bildet die Kandidaten einmal je Worker per Memory-Map ab und baut den Index darüber."""
+    global _INDEX
+    import pyarrow as pa
+    # Die Map bleibt offen, solange der Worker lebt – die Tabelle liest direkt daraus
+    table = pa.ipc.open_file(pa.memory_map(arrow_path, "r")).read_all()
+    _INDEX = ArrowCandidateIndex(table, mm_dims)
+
+
+def run_shard(args):
+    df_shard, ea_dims, seed, row_offset, strategy = args
+    return extrapolate_rows(df_shard, _INDEX, ea_dims, seed, row_offset, strategy)
@@ -6,8 +6,20 @@ import pandas as pd
 import datetime
 from openpyxl import load_workbook
 
+from normalize import ensure_normalized, mark_normalized, normalize_frame
+from summary import max_rowid, read_summary, update_summaries
+
 PARQUET_CACHE = "cache/latest_upload.parquet"
 
+# Dauern (visibility, broadcasting_time, apt, …) liegen in SQLite und im Parquet-Cache
+# als ganze Sekunden (int32) statt als Bruchteile eines Tages: Summen sind exakt,
+# Anzeige und Kennzahlen rechnen direkt in Sekunden. In Excel-Zeitwerte (Tage) wird
+# nur beim Import (parse_contents) und beim Excel-Export umgerechnet.
+SECONDS_PER_DAY = 86400
+DURATION_COLUMNS = ["visibility", "broadcasting_time", "apt", "program_duration",
+                    "start_time_program", "end_time_program", "start_time_item"]
+DURATION_DTYPE = "Int32"
+
 def read_time_column_with_openpyxl(path_or_buffer, column_name):
     wb = load_workbook(path_or_buffer, data_only=True)
     ws = wb["data"]
@@ -49,13 +61,34 @@ def convert_timedelta_to_decimal(td):
 def decimal_to_hms(decimal_val):
     if pd.isnull(decimal_val):
         return ""
-    total_seconds = decimal_val * 86400
-    total_seconds = int(round(total_seconds))
+    return seconds_to_hms(decimal_val * SECONDS_PER_DAY)
+
+
+def seconds_to_hms(value):
+    """Sekunden (gespeicherte Dauer) als HH:MM:SS."""
+    if pd.isnull(value):
+        return ""
+    total_seconds = int(round(value))
     hours = total_seconds // 3600
     minutes = (total_seconds % 3600) // 60
     seconds = total_seconds % 60
     return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
 
+
+def days_to_seconds(values):
+    """Excel-Zeitwerte (Bruchteile eines Tages) als ganze Sekunden (Int32, fehlend = NA)."""
+    seconds = pd.to_numeric(pd.Series(values), errors="coerce") * SECONDS_PER_DAY
+    return seconds.round().astype(DURATION_DTYPE)
+
+
+def with_duration_dtypes(df):
+    """Castet vorhandene Dauer-Spalten auf ganze Sekunden (Int32), z. B. nach read_sql."""
+    for col in DURATION_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").round().astype(DURATION_DTYPE)
+    return df
+
+
 def time_to_timedelta(val):
     if pd.isna(val):
         return pd.NaT
@@ -77,13 +110,23 @@ def time_to_timedelta(val):
     return pd.NaT
 
 
+def time_values_to_seconds(values):
+    """Gemischte Zeitwerte (Timedelta, Excel-Tage, Zeitstring, time) als ganze Sekunden (Int32)."""
+    values = pd.Series(values)
+    deltas = pd.to_timedelta([time_to_timedelta(v) for v in values], errors="coerce")
+    seconds = pd.Series(deltas.total_seconds(), index=values.index)
+    return seconds.round().astype(DURATION_DTYPE)
+
+
 
 
 
 def parse_contents(contents, filename):
     """
     1) Nur ein einziger read_excel-Aufruf statt Zeile-für-Zeile mit Openpyxl.
-    2) Anschließend Time-Spalten vectorisiert mit pandas.to_timedelta parsen.
+    2) Anschließend Time-Spalten vectorisiert mit pandas.to_timedelta parsen
+       und als ganze Sekunden ablegen.
+    3) Dimensionsspalten einmalig normalisieren (normalize.py).
     """
     # 1. Payload dekodieren
     content_type, content_string = contents.split(',')
@@ -124,7 +167,7 @@ def parse_contents(contents, filename):
 
     for col in ["visibility", "broadcasting_time"]:
         if col in df.columns:
-            df[col] = df[col].apply(_parse_mixed_time)
+            df[col] = days_to_seconds(df[col].apply(_parse_mixed_time))
 
     
 
@@ -133,17 +176,21 @@ def parse_contents(contents, filename):
         if col in df.columns:
             df[col] = (
                 pd.to_timedelta(df[col], errors="coerce")
-                  .dt.total_seconds() / 86400
+                  .dt.total_seconds()
+                  .round()
+                  .astype(DURATION_DTYPE)
             )
 
-    return df
+    # 5. Dimensionen trimmen und auf kanonische Schreibweisen abbilden
+    return normalize_frame(df)
 
 
 def update_database(df: pd.DataFrame, mode: str, first_file: bool):
     """
     1) SQLite PRAGMAs für Bulk-Inserts.
     2) to_sql im Batch-Modus mit method='multi' und chunksize.
-    3) Parquet-Cache für spätere Leseläufe.
+    3) Summentabellen der Importübersicht nachführen (summary.py).
+    4) Parquet-Cache für spätere Leseläufe.
     """
     db_path = "data.db"
     # ensure cache folder exists
@@ -167,6 +214,8 @@ def update_database(df: pd.DataFrame, mode: str, first_file: bool):
         ncols   = len(df.columns)
         max_vars = 999
         chunk   = max(1, max_vars // ncols)
+        since = max_rowid(conn) if how == "append" else 0
+        mark_duration_storage(conn)
         df.to_sql(
             "data",
             conn,
@@ -175,10 +224,17 @@ def update_database(df: pd.DataFrame, mode: str, first_file: bool):
             method="multi",
             chunksize=chunk
         )
+        if how == "replace":
+            mark_normalized(conn, "data")
+        elif ensure_normalized(conn, "data"):
+            # Altbestand aus früheren Importen wurde nachnormalisiert
+            since = 0
+        # Nur den neuen Batch einrechnen (bei replace: einmal komplett neu aufbauen)
+        update_summaries(conn, since)
     # 2) Parquet-Cache aktualisieren (Connection sauber schließen)
     try:
         with sqlite3.connect(db_path, timeout=30) as cache_conn:
-            df_cache = pd.read_sql("SELECT * FROM data", cache_conn)
+            df_cache = with_duration_dtypes(pd.read_sql("SELECT * FROM data", cache_conn))
         df_cache.to_parquet(PARQUET_CACHE, index=False, engine="pyarrow")
     except Exception:
         pass
@@ -197,7 +253,7 @@ def load_data(refresh_from_db: bool = False) -> pd.DataFrame:
         except Exception:
             pass
 
-    df = pd.read_sql("SELECT * FROM data", sqlite3.connect("data.db", timeout=30))
+    df = with_duration_dtypes(pd.read_sql("SELECT * FROM data", sqlite3.connect("data.db", timeout=30)))
     try:
         df.to_parquet(PARQUET_CACHE, index=False, engine="pyarrow")
     except Exception:
@@ -206,40 +262,179 @@ def load_data(refresh_from_db: bool = False) -> pd.DataFrame:
 
 
 
-def get_aggregated_data():
+def get_aggregated_data(with_distinct=True):
     db_path = 'data.db'
     conn = sqlite3.connect(db_path)
-    query = """
+    # Ohne with_distinct entfällt COUNT(DISTINCT bid) – die Zählung kommt dann aus den Sketches
+    distinct_sql = "COUNT(DISTINCT bid) AS distinct_bid," if with_distinct else ""
+    query = f"""
     SELECT 
-        TRIM(hr_basis) AS hr_basis,
-        COUNT(DISTINCT bid) AS distinct_bid,
+        hr_basis,
+        {distinct_sql}
         SUM(visibility) AS sum_visibility,
         SUM(CASE WHEN tool IS NULL OR tool = '' THEN broadcasting_time ELSE 0 END) AS sum_broadcasting_time
     FROM data
     WHERE (media = 'TV/OTT' OR (media = 'Social Media' AND post_type IN ('Video')))
-    GROUP BY TRIM(hr_basis);
+    GROUP BY hr_basis;
     """
     df = pd.read_sql(query, conn)
     conn.close()
     if not df.empty:
-        df['sum_visibility'] = df['sum_visibility'].apply(decimal_to_hms)
-        df['sum_broadcasting_time'] = df['sum_broadcasting_time'].apply(decimal_to_hms)
+        df['sum_visibility'] = df['sum_visibility'].apply(seconds_to_hms)
+        df['sum_broadcasting_time'] = df['sum_broadcasting_time'].apply(seconds_to_hms)
     return df
 
 
-def get_aggregated_data_opposite():
+def get_aggregated_data_opposite(with_distinct=True):
     db_path = 'data.db'
     conn = sqlite3.connect(db_path)
-    query = """
+    distinct_sql = "COUNT(DISTINCT bid) AS distinct_bid," if with_distinct else ""
+    query = f"""
     SELECT 
-        TRIM(hr_basis) AS hr_basis,
-        COUNT(DISTINCT bid) AS distinct_bid,
+        hr_basis,
+        {distinct_sql}
         SUM(mentions) AS sum_mentions
     FROM data
     WHERE media IN ('Print', 'Online', 'Social Media')
       AND (post_type IS NULL OR post_type = '' OR post_type NOT IN ('Video'))
-    GROUP BY TRIM(hr_basis);
+    GROUP BY hr_basis;
     """
     df = pd.read_sql(query, conn)
     conn.close()
     return df
+
+
+def get_aggregated_summary(source, with_distinct=True):
+    """
+    Importübersicht wie get_aggregated_data (source="video") bzw.
+    get_aggregated_data_opposite (source="non_video"), gelesen aus den beim Import
+    gepflegten Summentabellen. None, wenn diese (noch) nicht existieren.
+    """
+    df = read_summary(source, with_distinct)
+    if df is not None and not df.empty and source == "video":
+        df['sum_visibility'] = df['sum_visibility'].apply(seconds_to_hms)
+        df['sum_broadcasting_time'] = df['sum_broadcasting_time'].apply(seconds_to_hms)
+    return df
+
+
+def bump_generation(conn, *tables):
+    """
+    Erhöht den Generationszähler der angegebenen Tabellen.
+    Abgeleitete Strukturen (Cubes, Caches) vergleichen diesen Zähler,
+    um zu erkennen, ob sie noch zum aktuellen Tabelleninhalt passen.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS _generations (
+            table_name TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL
+        );
+    """)
+    for tbl in tables:
+        conn.execute("""
+            INSERT INTO _generations (table_name, generation) VALUES (?, 1)
+            ON CONFLICT(table_name) DO UPDATE SET generation = generation + 1;
+        """, (tbl,))
+
+
+def get_generation(conn, table):
+    """Liefert den aktuellen Generationszähler einer Tabelle (0, falls unbekannt)."""
+    try:
+        row = conn.execute(
+            "SELECT generation FROM _generations WHERE table_name = ?;", (table,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+
+def mark_duration_storage(conn):
+    """Vermerkt, dass Dauern in dieser Datenbank als ganze Sekunden gespeichert sind."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS _storage (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """)
+    conn.execute("INSERT OR REPLACE INTO _storage (key, value) VALUES ('durations', 'seconds');")
+
+
+def migrate_duration_storage(db_path="data.db"):
+    """
+    Rechnet Dauern einer Datenbank aus früheren Versionen (Bruchteile eines Tages)
+    einmalig in ganze Sekunden um. Betroffene Tabellen erhalten eine neue Generation,
+    die Summentabellen und der Parquet-Cache werden neu aufgebaut.
+    Liefert die umgerechneten Tabellen.
+    """
+    migrated = []
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table';")]
+        if "_storage" in tables and conn.execute(
+                "SELECT 1 FROM _storage WHERE key = 'durations' AND value = 'seconds';").fetchone():
+            return migrated
+        # Ohne data-Tabelle gibt es keinen Altbestand
+        if "data" in tables:
+            for table in tables:
+                columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}");')]
+                durations = [col for col in columns if col in DURATION_COLUMNS]
+                if table.startswith("_") or not durations:
+                    continue
+                assignments = ", ".join(
+                    f'"{col}" = CAST(ROUND("{col}" * {SECONDS_PER_DAY}) AS INTEGER)' for col in durations
+                )
+                conn.execute(f'UPDATE "{table}" SET {assignments};')
+                migrated.append(table)
+            if migrated:
+                bump_generation(conn, *migrated)
+                update_summaries(conn)
+        mark_duration_storage(conn)
+    if migrated and os.path.exists(PARQUET_CACHE):
+        os.remove(PARQUET_CACHE)
+    return migrated
+
+
+# Aus data abgeleitete Tabellen: Name -> Filter (gleiche Bedingungen wie die Importübersicht)
+MEDIA_TABLE_FILTERS = {
+    "video": "media = 'TV/OTT' OR (media = 'Social Media' AND post_type = 'Video')",
+    "non_video": "media IN ('Print','Online','Social Media') "
+                 "AND (post_type IS NULL OR post_type = '' OR post_type <> 'Video')",
+}
+# Aus video/non_video berechnete Tabellen (Prozentwerte, Extrapolation, Ergebnisse)
+RESULT_TABLES = ["percent", "percent_non_video", "hr_bewegt", "hr_non_bewegt", "video_final"]
+
+
+def build_media_tables(conn):
+    """Baut video und non_video aus data neu auf. Liefert {Tabelle: Zeilenanzahl}."""
+    counts = {}
+    for table, condition in MEDIA_TABLE_FILTERS.items():
+        conn.execute(f'DROP TABLE IF EXISTS "{table}";')
+        conn.execute(f'CREATE TABLE "{table}" AS SELECT * FROM data WHERE {condition};')
+        # hr_basis ist normalisiert – Filter wie hr_basis = 'HR' laufen über den Index
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{table}_hr_basis" ON "{table}" (hr_basis);')
+        counts[table] = conn.execute(f'SELECT COUNT(*) FROM "{table}";').fetchone()[0]
+    return counts
+
+
+def normalize_existing_data(db_path="data.db"):
+    """
+    Normalisiert data aus früheren Versionen einmalig nach NORMALIZATION_POLICY
+    (normalize.py). Hat sich dabei etwas geändert, werden video/non_video neu
+    aufgebaut, Prozent-, HR- und Ergebnistabellen nachnormalisiert und alle
+    betroffenen Tabellen erhalten eine neue Generation (Cubes, Bitmap-Index, Caches
+    und der Stand der inkrementellen Extrapolation verfallen damit). Summentabellen
+    und Parquet-Cache werden neu aufgebaut. Liefert die betroffenen Tabellen.
+    """
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table';")}
+        if "data" not in tables or not ensure_normalized(conn, "data"):
+            return []
+        build_media_tables(conn)
+        changed = ["data", *MEDIA_TABLE_FILTERS]
+        for table in RESULT_TABLES:
+            if table in tables:
+                ensure_normalized(conn, table)
+                changed.append(table)
+        bump_generation(conn, *changed)
+        update_summaries(conn)
+    if os.path.exists(PARQUET_CACHE):
+        os.remove(PARQUET_CACHE)
+    return changed
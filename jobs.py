@@ -0,0 +1,296 @@
+# jobs.py – lokaler Job-Runner für lang laufende Callbacks
+#
+# Import, Extrapolation, Ergebnisberechnung und Exporte liefen bisher synchron im
+# Dash-Callback und hielten den Worker bis zum HTTP-Timeout fest. register_job
+# registriert stattdessen je Job-Art drei kurze Callbacks:
+#   - Start: legt den Job in der Job-Datenbank an, übergibt die Funktion der
+#     Job-Queue und schaltet das Polling-Intervall ein,
+#   - Poll: liest Stufe und Fortschritt für Fortschrittsbalken und Text; ist der
+#     Job fertig, liefert er dessen Outputs und schaltet das Intervall ab,
+#   - Abbrechen: setzt das Abbruch-Flag; der Job bricht beim nächsten
+#     job.progress() mit JobCancelled ab.
+#
+# Der Job-Zustand liegt in einer eigenen SQLite-Datei (JOBS_DB): Fortschritts-
+# meldungen warten so nicht auf die Schreibsperre von data.db, die der Job selbst
+# hält, und jeder Gunicorn-Worker kann Status und Abbruch-Flag lesen. Die Outputs
+# eines fertigen Jobs werden dort als JSON abgelegt; Tabellen liefern die Jobs wie
+# bisher als Handles des result_store.
+#
+# Die Jobs sind überwiegend CPU-lastig (pandas, Extrapolation, Excel). Damit sie
+# den Gunicorn-Worker nicht über das GIL blockieren, läuft jeder Job in einem
+# eigenen, per fork abgespaltenen Prozess; die Job-Funktionen sind Closures der
+# Callback-Registrierung und ließen sich für "spawn" nicht picklen. Der Thread-
+# Pool begrenzt nur noch die Zahl gleichzeitiger Job-Prozesse und wartet auf
+# deren Ende. Stirbt ein Job-Prozess (z. B. Speicher), wird der Job als
+# fehlgeschlagen markiert. Ohne fork (Windows) laufen Jobs wie bisher im Thread.
+
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import plotly
+from dash import Input, Output, State, callback_context, dcc, exceptions, html, no_update
+
+JOBS_DB = os.path.join("cache", "jobs.db")
+
+# Gleichzeitig laufende Jobs je Prozess (weitere warten in der Queue)
+JOB_WORKERS = 2
+
+# Polling-Intervall der Oberfläche in Millisekunden
+JOB_POLL_MS = 1000
+
+# Höchstens so oft (Sekunden) schreibt job.progress() in die Job-Datenbank
+PROGRESS_INTERVAL = 0.5
+
+# Jobs ohne Lebenszeichen gelten danach als verloren (z. B. Worker neu gestartet)
+JOB_STALE_SECONDS = 30 * 60
+
+# Abgeschlossene Jobs, die in der Job-Datenbank erhalten bleiben
+JOBS_KEPT = 200
+
+ACTIVE = ("queued", "running")
+
+_POOL = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+
+_CONTEXT = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+
+
+class JobCancelled(Exception):
+    """Der Job wurde über die Oberfläche abgebrochen."""
+
+
+def _connect():
+    os.makedirs(os.path.dirname(JOBS_DB), exist_ok=True)
+    conn = sqlite3.connect(JOBS_DB, timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            stage TEXT,
+            done INTEGER,
+            total INTEGER,
+            cancel INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            created REAL NOT NULL,
+            updated REAL NOT NULL
+        );
+    """)
+    return conn
+
+
+def _update(job_id, **fields):
+    fields["updated"] = time.time()
+    with _connect() as conn:
+        conn.execute(
+            f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE job_id = ?;",
+            (*fields.values(), job_id),
+        )
+
+
+class Job:
+    """Wird der Job-Funktion als erstes Argument übergeben."""
+
+    def __init__(self, job_id, triggered_id=None):
+        self.job_id = job_id
+        # Auslösende Komponente (callback_context ist im Job-Thread nicht verfügbar)
+        self.triggered_id = triggered_id
+        self._stage = None
+        self._last = 0.0
+
+    def progress(self, stage, done=None, total=None):
+        """
+        Meldet die aktuelle Stufe und ihren Fortschritt (z. B. gelesene Zeilen,
+        gezogene Gruppen, geschriebene Dateien) und bricht ab, falls gewünscht.
+        """
+        now = time.time()
+        if stage == self._stage and now - self._last < PROGRESS_INTERVAL:
+            return
+        self._stage, self._last = stage, now
+        with _connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET stage = ?, done = ?, total = ?, updated = ? WHERE job_id = ?;",
+                (stage, done, total, now, self.job_id),
+            )
+            row = conn.execute("SELECT cancel FROM jobs WHERE job_id = ?;", (self.job_id,)).fetchone()
+        if row and row[0]:
+            raise JobCancelled()
+
+
+def _run(job, func, args):
+    _update(job.job_id, status="running")
+    try:
+        job.progress("Gestartet")  # prüft, ob der Job schon in der Queue abgebrochen wurde
+        result = func(job, *args)
+    except JobCancelled:
+        _update(job.job_id, status="cancelled")
+        return
+    except exceptions.PreventUpdate:
+        _update(job.job_id, status="skipped")
+        return
+    except Exception as e:
+        traceback.print_exc()
+        _update(job.job_id, status="failed", error=str(e))
+        return
+    _update(job.job_id, status="done", result=json.dumps(result, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+def _run_process(job, func, args):
+    """Führt den Job in einem eigenen Prozess aus und wartet (im Pool-Thread) auf dessen Ende."""
+    if _CONTEXT is None:
+        _run(job, func, args)
+        return
+    process = _CONTEXT.Process(target=_run, args=(job, func, args), name=f"job-{job.job_id[:8]}")
+    process.start()
+    process.join()
+    if process.exitcode:
+        with _connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET status = 'failed', error = ?, updated = ? "
+                f"WHERE job_id = ? AND status IN {ACTIVE};",
+                (f"Job-Prozess unerwartet beendet (Exit-Code {process.exitcode})", time.time(), job.job_id),
+            )
+
+
+def submit(name, func, args=(), triggered_id=None):
+    """Stellt `func(job, *args)` in die Queue und liefert die Job-ID."""
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO jobs (job_id, name, status, created, updated) VALUES (?, ?, 'queued', ?, ?);",
+            (job_id, name, now, now),
+        )
+        conn.execute("""
+            DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND job_id NOT IN (
+                SELECT job_id FROM jobs ORDER BY created DESC LIMIT ?
+            );
+        """, (JOBS_KEPT,))
+    _POOL.submit(_run_process, Job(job_id, triggered_id), func, args)
+    return job_id
+
+
+def status(job_id):
+    """Zustand eines Jobs als dict (None, wenn unbekannt)."""
+    with _connect() as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?;", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    if job["status"] in ACTIVE and time.time() - job["updated"] > JOB_STALE_SECONDS:
+        job["status"] = "lost"
+    return job
+
+
+def cancel(job_id):
+    """Setzt das Abbruch-Flag; wartende Jobs brechen beim Start, laufende beim nächsten progress() ab."""
+    with _connect() as conn:
+        conn.execute("UPDATE jobs SET cancel = 1 WHERE job_id = ?;", (job_id,))
+
+
+def _stage_text(job):
+    text = f"⏳ {job['stage'] or ('Wartet …' if job['status'] == 'queued' else 'Läuft …')}"
+    if job["done"] is not None and job["total"]:
+        text += f": {job['done']:,} / {job['total']:,}"
+    elif job["done"] is not None:
+        text += f": {job['done']:,}"
+    return text
+
+
+def job_panel(name):
+    """Fortschrittsbalken, Stufe und Abbrechen-Knopf für die Job-Art `name`."""
+    return html.Div([
+        dcc.Store(id=f"{name}-job"),
+        dcc.Interval(id=f"{name}-job-poll", interval=JOB_POLL_MS, disabled=True),
+        html.Progress(id=f"{name}-job-progress", hidden=True,
+                      style={'width': '200px', 'vertical-align': 'middle'}),
+        html.Span(id=f"{name}-job-stage", style={'margin-left': '8px'}),
+        html.Button("Abbrechen", id=f"{name}-job-cancel", disabled=True, style={'margin-left': '8px'}),
+    ], style={'display': 'inline-block', 'margin-left': '10px'})
+
+
+def register_job(app, name, outputs, inputs, states=()):
+    """
+    Registriert `func(job, *inputs, *states)` als Hintergrund-Job. Die Funktion
+    liefert dieselben Werte wie zuvor der Callback für `outputs`; die Komponenten
+    aus job_panel(name) müssen im Layout stehen.
+    """
+    outputs = list(outputs)
+
+    def decorator(func):
+        def run(job, *args):
+            result = func(job, *args)
+            return [result] if len(outputs) == 1 else list(result)
+
+        @app.callback(
+            Output(f"{name}-job", "data"),
+            Output(f"{name}-job-poll", "disabled"),
+            Output(f"{name}-job-cancel", "disabled"),
+            Output(f"{name}-job-stage", "children"),
+            *inputs, *states,
+            State(f"{name}-job", "data"),
+            prevent_initial_call=True
+        )
+        def start_job(*args):
+            *args, current = args
+            # Solange der vorige Job dieser Art läuft, keinen zweiten starten
+            previous = status(current["job_id"]) if current else None
+            if previous and previous["status"] in ACTIVE:
+                raise exceptions.PreventUpdate
+            job_id = submit(name, run, args, callback_context.triggered_id)
+            return {"job_id": job_id}, False, False, "⏳ Gestartet …"
+
+        @app.callback(
+            Output(f"{name}-job-poll", "disabled", allow_duplicate=True),
+            Output(f"{name}-job-progress", "value"),
+            Output(f"{name}-job-progress", "max"),
+            Output(f"{name}-job-progress", "hidden"),
+            Output(f"{name}-job-stage", "children", allow_duplicate=True),
+            Output(f"{name}-job-cancel", "disabled", allow_duplicate=True),
+            *[Output(o.component_id, o.component_property, allow_duplicate=True) for o in outputs],
+            Input(f"{name}-job-poll", "n_intervals"),
+            State(f"{name}-job", "data"),
+            prevent_initial_call=True
+        )
+        def poll_job(n_intervals, current):
+            job = status(current["job_id"]) if current else None
+            unchanged = [no_update] * len(outputs)
+            if job is None:
+                return [True, no_update, no_update, True, "", True] + unchanged
+            if job["status"] in ACTIVE:
+                # Ohne Gesamtzahl zeigt der Balken einen unbestimmten Fortschritt
+                value = job["done"] if job["total"] else None
+                return [False, value, job["total"] or 1, False, _stage_text(job), False] + unchanged
+            if job["status"] == "done":
+                seconds = job["updated"] - job["created"]
+                return [True, 1, 1, True, f"✅ Fertig ({seconds:,.0f} s)", True] + json.loads(job["result"])
+            texts = {
+                "skipped": "",
+                "cancelled": "⏹️ Abgebrochen.",
+                "failed": f"❌ Fehler: {job['error']}",
+                "lost": "❌ Job verloren (Server neu gestartet?).",
+            }
+            return [True, no_update, no_update, True, texts[job["status"]], True] + unchanged
+
+        @app.callback(
+            Output(f"{name}-job-stage", "children", allow_duplicate=True),
+            Input(f"{name}-job-cancel", "n_clicks"),
+            State(f"{name}-job", "data"),
+            prevent_initial_call=True
+        )
+        def cancel_job(n_clicks, current):
+            if not n_clicks or not current:
+                raise exceptions.PreventUpdate
+            cancel(current["job_id"])
+            return "⏹️ Wird abgebrochen …"
+
+        return func
+
+    return decorator
@@ -6,6 +6,18 @@ from components.nonvideo_section import nonvideo_tab
 
 def create_layout():
     return html.Div([
+        html.Div([
+            html.Label("Distinct-Zählung:", style={'margin-right': '10px'}),
+            dcc.RadioItems(
+                id="distinct-mode",
+                options=[
+                    {"label": "Exakt", "value": "exact"},
+                    {"label": "Approximativ (HyperLogLog)", "value": "approx"}
+                ],
+                value="exact",
+                labelStyle={'display': 'inline-block', 'margin-right': '10px'}
+            )
+        ], style={'display': 'flex', 'justify-content': 'flex-end', 'margin-bottom': '5px'}),
         dcc.Tabs([
             import_tab(),
             video_tab(),
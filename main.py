@@ -13,50 +13,25 @@ from dash.dash_table.Format import Format, Group
 import openpyxl
 from openpyxl.utils import get_column_letter
 
-app = Dash(__name__, title="IRIS-Extrapolator")
+from export import excel_durations
+from helpers import (DURATION_COLUMNS, mark_duration_storage, migrate_duration_storage, normalize_existing_data,
+                     seconds_to_hms, time_values_to_seconds, with_duration_dtypes)
 
-# ---------------- Hilfsfunktionen ----------------
+app = Dash(__name__, title="IRIS-Extrapolator")
 
-def convert_timedelta_to_decimal(td):
-    """Konvertiert einen Timedelta in den Anteil eines Tages.
-       Falls td NaT ist, wird None zurückgegeben."""
-    if pd.isnull(td):
-        return None
-    return td.total_seconds() / 86400
+# Dauern werden wie in app.py als ganze Sekunden gespeichert (helpers.py);
+# Datenbanken mit Tagesanteilen werden beim Start einmalig umgestellt
+migrate_duration_storage("data.db")
+# Dimensionswerte aus älteren Importen wie in app.py einmalig normalisieren
+normalize_existing_data("data.db")
 
-def decimal_to_hms(decimal_val):
-    """
-    Konvertiert einen Dezimalwert (Bruchteil eines Tages) in das Format h:mm:ss.
-    Ist der Wert leer oder NaN, wird ein leerer String zurückgegeben.
-    """
-    if pd.isnull(decimal_val):
-        return ""
-    total_seconds = decimal_val * 86400
-    total_seconds = int(round(total_seconds))
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    seconds = total_seconds % 60
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-
-# Umrechnung von h:mm:ss in einen Dezimalwert (Anteil eines Tages)
-def hms_to_decimal(hms_str):
-    try:
-        parts = hms_str.split(':')
-        if len(parts) != 3:
-            return 0.0
-        hours = float(parts[0])
-        minutes = float(parts[1])
-        seconds = float(parts[2])
-        total_seconds = hours * 3600 + minutes * 60 + seconds
-        return total_seconds / 86400
-    except Exception:
-        return 0.0
+# ---------------- Hilfsfunktionen ----------------
 
 def parse_contents(contents, filename):
     """
     Dekodiert den Base64-String und liest mit pandas das Excel-Blatt "data" ein.
-    Dabei werden broadcasting_time und visibility in Dezimalzahlen (Tagesanteil) umgewandelt,
-    falls sie als Timedelta eingelesen wurden.
+    Dabei werden broadcasting_time, visibility und die übrigen Zeitspalten in ganze
+    Sekunden umgewandelt.
     """
     content_type, content_string = contents.split(',')
     decoded = base64.b64decode(content_string)
@@ -70,20 +45,9 @@ def parse_contents(contents, filename):
                         if isinstance(x, pd.Timestamp) else str(int(x)) if isinstance(x, (int, float)) else str(x)
             }
         )
-        if 'broadcasting_time' in df.columns and pd.api.types.is_timedelta64_dtype(df['broadcasting_time']):
-            df['broadcasting_time'] = df['broadcasting_time'].apply(convert_timedelta_to_decimal)
-        if 'visibility' in df.columns and pd.api.types.is_timedelta64_dtype(df['visibility']):
-            df['visibility'] = df['visibility'].apply(convert_timedelta_to_decimal)
-        if 'apt' in df.columns and pd.api.types.is_timedelta64_dtype(df['apt']):
-            df['apt'] = df['apt'].apply(convert_timedelta_to_decimal)            
-        if 'program_duration' in df.columns and pd.api.types.is_timedelta64_dtype(df['program_duration']):
-            df['program_duration'] = df['program_duration'].apply(convert_timedelta_to_decimal)           
-        if 'start_time_program' in df.columns and pd.api.types.is_timedelta64_dtype(df['start_time_program']):
-            df['start_time_program'] = df['start_time_program'].apply(convert_timedelta_to_decimal)  
-        if 'end_time_program' in df.columns and pd.api.types.is_timedelta64_dtype(df['end_time_program']):
-            df['end_time_program'] = df['end_time_program'].apply(convert_timedelta_to_decimal)  
-        if 'start_time_item' in df.columns and pd.api.types.is_timedelta64_dtype(df['start_time_item']):
-            df['start_time_item'] = df['start_time_item'].apply(convert_timedelta_to_decimal)
+        for col in DURATION_COLUMNS:
+            if col in df.columns:
+                df[col] = time_values_to_seconds(df[col])
         if 'season' in df.columns:
             df['season'] = df['season'].apply(lambda x: str(int(x)) if isinstance(x, (float, int)) else str(x))
                            
@@ -104,7 +68,9 @@ def update_database(df, mode, first_file):
         if_exists_option = "replace" if mode == "replace" else "append"
     else:
         if_exists_option = "append"
+    mark_duration_storage(conn)
     df.to_sql("data", conn, if_exists=if_exists_option, index=False)
+    conn.commit()
     conn.close()
 
 def get_aggregated_data():
@@ -133,8 +99,8 @@ def get_aggregated_data():
     df = pd.read_sql(query, conn)
     conn.close()
     if not df.empty:
-        df['sum_visibility'] = df['sum_visibility'].apply(decimal_to_hms)
-        df['sum_broadcasting_time'] = df['sum_broadcasting_time'].apply(decimal_to_hms)
+        df['sum_visibility'] = df['sum_visibility'].apply(seconds_to_hms)
+        df['sum_broadcasting_time'] = df['sum_broadcasting_time'].apply(seconds_to_hms)
     return df
 
 def get_aggregated_data_opposite():
@@ -690,7 +656,7 @@ def update_on_upload(list_of_contents, list_of_names, mode):
         df_video = pd.read_sql(query_video, conn)
         conn.close()
         conn = sqlite3.connect(db_path)
-        df_video.to_sql("video", conn, if_exists="replace", index=False)
+        with_duration_dtypes(df_video).to_sql("video", conn, if_exists="replace", index=False)
         conn.close()
         status_messages.append(f"Tabelle 'video' in data.db erstellt: {len(df_video)} Zeilen wurden gespeichert.")
         
@@ -705,7 +671,7 @@ def update_on_upload(list_of_contents, list_of_names, mode):
         df_non_video = pd.read_sql(query_non_video, conn)
         conn.close()
         conn = sqlite3.connect(db_path)
-        df_non_video.to_sql("non_video", conn, if_exists="replace", index=False)
+        with_duration_dtypes(df_non_video).to_sql("non_video", conn, if_exists="replace", index=False)
         conn.close()
         status_messages.append(f"Tabelle 'non_video' in data.db erstellt: {len(df_non_video)} Zeilen wurden gespeichert.")
         
@@ -795,8 +761,8 @@ def calculate_percentages(n_clicks, mm_dims, ea_dims):
     df['sum_mentions'] = df['sum_mentions'].fillna(0).astype(int)
     df['sum_visibility_raw'] = df['sum_visibility']
     df['sum_broadcasting_time_raw'] = df['sum_broadcasting_time']
-    df['sum_visibility'] = df['sum_visibility_raw'].apply(decimal_to_hms)
-    df['sum_broadcasting_time'] = df['sum_broadcasting_time_raw'].apply(decimal_to_hms)
+    df['sum_visibility'] = df['sum_visibility_raw'].apply(seconds_to_hms)
+    df['sum_broadcasting_time'] = df['sum_broadcasting_time_raw'].apply(seconds_to_hms)
     df['visibility_share'] = df.apply(lambda row: f"{(row['sum_visibility_raw'] / row['sum_broadcasting_time_raw'] * 100):.2f}%"
                                       if row['sum_broadcasting_time_raw'] and row['sum_broadcasting_time_raw'] != 0 
                                       else "N/A", axis=1)
@@ -805,7 +771,7 @@ def calculate_percentages(n_clicks, mm_dims, ea_dims):
                                   if row['sum_mentions'] != 0 else 0, axis=1)
 
     # Formatierung avg_mention als h:mm:ss (keine Rundung, alle Dezimalstellen beibehalten)
-    df['avg_mention'] = df['avg_mention'].apply(decimal_to_hms)
+    df['avg_mention'] = df['avg_mention'].apply(seconds_to_hms)
 
     # Entferne count_bid aus dem finalen Output
     final_cols = group_by_cols + ["sum_mentions", "avg_mention", "sum_visibility", "sum_broadcasting_time", "visibility_share"]
@@ -893,8 +859,8 @@ def extrapolate_hr(n_clicks, mm_dims):
     df_merged["visibility"] = df_merged["visibility_share_factor"] * df_merged["broadcasting_time"]
     
     # Wichtig: Da avg_mention in der percent-Tabelle als h:mm:ss formatiert vorliegt,
-    # müssen wir diesen String wieder in einen numerischen Wert (Anteil eines Tages) umwandeln.
-    def hms_to_decimal(hms_str):
+    # müssen wir diesen String wieder in Sekunden umwandeln (wie broadcasting_time).
+    def hms_to_seconds(hms_str):
         try:
             parts = hms_str.split(':')
             if len(parts) != 3:
@@ -902,13 +868,12 @@ def extrapolate_hr(n_clicks, mm_dims):
             hours = float(parts[0])
             minutes = float(parts[1])
             seconds = float(parts[2])
-            total_seconds = hours * 3600 + minutes * 60 + seconds
-            return total_seconds / 86400
+            return hours * 3600 + minutes * 60 + seconds
         except Exception:
             return 0.0
 
     # Konvertiere die avg_mention-Spalte in einen numerischen Wert
-    df_merged["avg_mention_numeric"] = df_merged["avg_mention"].apply(hms_to_decimal)
+    df_merged["avg_mention_numeric"] = df_merged["avg_mention"].apply(hms_to_seconds)
     
     # Berechne neue Mentions: mentions = visibility / avg_mention_numeric
     df_merged["mentions"] = df_merged["visibility"] / df_merged["avg_mention_numeric"]
@@ -920,7 +885,7 @@ def extrapolate_hr(n_clicks, mm_dims):
     
     # Schreibe das Ergebnis in die Tabelle "hr_bewegt" in der Datenbank
     conn = sqlite3.connect(db_path)
-    df_merged.to_sql("hr_bewegt", conn, if_exists="replace", index=False)
+    with_duration_dtypes(df_merged).to_sql("hr_bewegt", conn, if_exists="replace", index=False)
     conn.close()
     
     return f"Extrapolation abgeschlossen: {len(df_merged)} Zeilen wurden in 'hr_bewegt' erstellt."
@@ -964,11 +929,11 @@ def combined_results(n_clicks1, n_clicks2, mm_dims, ea_dims):
         df_final = pd.concat([df_video, df_hr], ignore_index=True)
         
         # Berechne sponsoring_value_cpt:
-        # Formel: ((visibility * reach * 86400)/1000 * 10 * 1000000)/30
+        # Formel: ((visibility * reach)/1000 * 10 * 1000000)/30, visibility in Sekunden
         try:
-            df_final["sponsoring_value_cpt"] = (df_final["visibility"] * df_final["reach"] * 86400 / 1000 * 10 * 1000000) / 30
-            df_final["sponsorship_contacts"] = (df_final["visibility"] * df_final["reach"] * 86400 / 30)
-            df_final["ave_100"] = (df_final["visibility"]* 86400) * (df_final["advertising_price_TV"] / 30)
+            df_final["sponsoring_value_cpt"] = (df_final["visibility"] * df_final["reach"] / 1000 * 10 * 1000000) / 30
+            df_final["sponsorship_contacts"] = (df_final["visibility"] * df_final["reach"] / 30)
+            df_final["ave_100"] = df_final["visibility"] * (df_final["advertising_price_TV"] / 30)
             # Umwandlung in Integer (falls NaN, setze 0)
             df_final["sponsoring_value_cpt"] = df_final["sponsoring_value_cpt"].fillna(0).apply(lambda x: int(x))
             df_final["ave_100"] = df_final["ave_100"].fillna(0).apply(lambda x: int(x))
@@ -977,7 +942,7 @@ def combined_results(n_clicks1, n_clicks2, mm_dims, ea_dims):
         
         # Schreibe den konsolidierten DataFrame in die Tabelle "video_final"
         conn = sqlite3.connect(db_path)
-        df_final.to_sql("video_final", conn, if_exists="replace", index=False)
+        with_duration_dtypes(df_final).to_sql("video_final", conn, if_exists="replace", index=False)
         conn.close()
         
         return f"Neue Tabelle 'video_final' erstellt: {len(df_final)} Zeilen, Sponsoring_Value_CPT aktualisiert.", [], []
@@ -1034,8 +999,8 @@ def combined_results(n_clicks1, n_clicks2, mm_dims, ea_dims):
         final_df = pivot_vis.merge(pivot_bid, on=group_by_cols, how='outer') \
                             .merge(pivot_ave, on=group_by_cols, how='outer')
     
-        final_df["sum_visibility_basis"] = final_df["sum_visibility_basis"].apply(decimal_to_hms)
-        final_df["sum_visibility_hr"] = final_df["sum_visibility_hr"].apply(decimal_to_hms)
+        final_df["sum_visibility_basis"] = final_df["sum_visibility_basis"].apply(seconds_to_hms)
+        final_df["sum_visibility_hr"] = final_df["sum_visibility_hr"].apply(seconds_to_hms)
     
         # Formatierung: Umwandlung in Ganzzahlen mit Tausendertrennzeichen
         final_df["bid_count_basis"] = final_df["bid_count_basis"].apply(lambda x: format(int(x), ",d"))
@@ -1064,37 +1029,19 @@ def combined_results(n_clicks1, n_clicks2, mm_dims, ea_dims):
 def export_to_excel(n_clicks):
     if not n_clicks:
         return None
-    db_path = "data.db"
-    conn = sqlite3.connect(db_path)
-    df = pd.read_sql("SELECT * FROM video_final", conn)
-    conn.close()
-    
-    output = BytesIO()
-    # Verwende den ExcelWriter als Kontextmanager
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name="VideoFinal")
-        workbook = writer.book
-        worksheet = writer.sheets["VideoFinal"]
-        
-        # Durchlaufe alle Spalten und wende die gewünschte Formatierung an:
-        for i, col in enumerate(df.columns):
-            col_letter = get_column_letter(i+1)
-            # Für "reach": Zahl mit 2 Dezimalstellen
-            if col.lower() == ["reach", "sponsorship_contacts", "ratings_14+", "tv_ratings_14+"]:
-                for cell in worksheet[col_letter][1:]:  # Überspringe den Header
-                    cell.number_format = '0.00'
-            # Für "broadcasting_time", "visibility" und "apt": Format h:mm:ss
-            elif col.lower() in ["broadcasting_time", "visibility", "apt", "start_time_program", "end_time_program", "start_time_item"]:
-                for cell in worksheet[col_letter][1:]:
-                    cell.number_format = 'h:mm:ss'
-             # Für sponsoring_value_cpt und pr_value: Zahl mit Tausendertrennzeichen (Punkt als Trenner) ohne Dezimalstellen
-            elif col.lower() in ["sponsoring_value_cpt", "pr_value", "advertising_price_TV", "advertising_price_OTT", "ave_100", "ave_weighted"]:
-                for cell in worksheet[col_letter][1:]:
-                    cell.number_format = '#,##0'
-        # writer.save() ist hier nicht zwingend nötig, da der Kontextmanager das Speichern übernimmt.
-    output.seek(0)
+    from export import export_table_to_excel, DURATION_FORMAT, MONEY_FORMAT
+
+    # Formate je Spalte: reach-Werte mit 2 Dezimalstellen, Zeiten als h:mm:ss,
+    # Geldwerte mit Tausendertrennzeichen ohne Dezimalstellen
+    formats = {
+        **{col: '0.00' for col in ["reach", "sponsorship_contacts", "ratings_14+", "tv_ratings_14+"]},
+        **{col: DURATION_FORMAT for col in ["broadcasting_time", "visibility", "apt", "start_time_program", "end_time_program", "start_time_item"]},
+        **{col: MONEY_FORMAT for col in ["sponsoring_value_cpt", "pr_value", "advertising_price_tv", "advertising_price_ott", "ave_100", "ave_weighted"]},
+    }
+    # Write-only Workbook direkt aus dem SQLite-Cursor (konstanter Speicher)
+    content = export_table_to_excel("data.db", "video_final", "VideoFinal", formats)
     # Sende die Bytes als Download zurück
-    return dcc.send_bytes(output.getvalue(), "report_video.xlsx")
+    return dcc.send_bytes(content, "report_video.xlsx")
 
 # ---------------- bASECHECK ----------------
 
@@ -1285,72 +1232,37 @@ def calculate_nonvideo_percentages(n_clicks, mm_dims, ea_dims):
     status_msg = f"Basecheck Non-Video: {len(df_result)} Gruppen gefunden. (Distinct bid Gesamt: {overall_bid_count:,})"
     return status_msg, data, columns
 
-def select_candidate_rows(df_candidates, n_needed, country_field="country", pr_value_field="pr_value", alpha=0.7):
+def select_candidate_rows(df_candidates, n_needed, country_field="country", pr_value_field="pr_value", alpha=0.7, seed=None):
     """
     Wählt n_needed Zeilen aus df_candidates aus, wobei:
-      - Die Auswahl proportional zur Anzahl der Zeilen pro country erfolgt.
+      - Die Auswahl proportional zur Anzahl der Zeilen pro country erfolgt
+        (Aufteilung nach größtem Rest, die Summe ist genau n_needed).
       - Innerhalb jeder country-Gruppe erfolgt eine gewichtete Auswahl basierend auf pr_value.
         Dabei wird das Gewicht als: weight = alpha * (pr_value_normalized) + (1 - alpha) berechnet.
         So werden hohe pr_value berücksichtigt, aber nicht ausschließlich.
-    
+    Die Ziehung erfolgt gebündelt über sampling.sample_country_proportional.
+
     Parameter:
       - df_candidates: DataFrame mit Kandidatenzeilen.
       - n_needed: Gesamtzahl der benötigten Zeilen.
       - country_field: Feldname für die Länderinformation (Standard: "country").
       - pr_value_field: Feldname für den KPI pr_value (Standard: "pr_value").
       - alpha: Gewichtungsfaktor (zwischen 0 und 1) für pr_value.
-    
+      - seed: optionaler Seed für reproduzierbare Ziehungen.
+
     Rückgabe:
       - Liste von Dictionaries (jede Zeile repräsentiert einen Kandidaten).
     """
-    import uuid
-    import random
-    
-    total_candidates = len(df_candidates)
-    if total_candidates == 0:
+    from sampling import sample_country_proportional
+
+    if len(df_candidates) == 0 or n_needed <= 0:
         return []
-    
-    # Gruppiere nach dem Länderkriterium
-    groups = df_candidates.groupby(country_field)
-    selected = []
-    
-    # Proportionale Zuteilung: Aus jeder Gruppe n_country Zeilen auswählen
-    for country, group in groups:
-        group_size = len(group)
-        # Berechne die Anzahl der Zeilen, die aus dieser Gruppe ausgewählt werden sollen
-        n_country = round(n_needed * group_size / total_candidates)
-        # Wenn die Gruppe nicht leer ist, mindestens 1 auswählen
-        if n_country == 0 and group_size > 0:
-            n_country = 1
-        
-        # Berechne Gewichte: Normiere pr_value auf den Maximalwert innerhalb der Gruppe
-        pr_values = group[pr_value_field].fillna(0)
-        max_pr = pr_values.max()
-        if max_pr > 0:
-            normalized = pr_values / max_pr
-        else:
-            normalized = pr_values
-        # Gewicht: hohes pr_value soll bevorzugt werden, aber mit einem konstanten Anteil
-        weights = alpha * normalized + (1 - alpha)
-        
-        # Falls genug Zeilen in der Gruppe vorhanden sind, ohne Replacement
-        if group_size >= n_country:
-            sampled_group = group.sample(n=n_country, weights=weights, replace=False)
-        else:
-            sampled_group = group.sample(n=n_country, weights=weights, replace=True)
-        selected.extend(sampled_group.to_dict(orient="records"))
-    
-    # Falls insgesamt weniger als n_needed ausgewählt wurden, ergänze zufällig aus dem gesamten DataFrame
-    while len(selected) < n_needed:
-        extra_row = df_candidates.sample(n=1, replace=False).iloc[0].to_dict()
-        extra_row["bid"] = str(uuid.uuid4())
-        selected.append(extra_row)
-    
-    # Falls zu viele Zeilen ausgewählt wurden, zufälliges Trim auf genau n_needed
-    if len(selected) > n_needed:
-        selected = random.sample(selected, n_needed)
-    
-    return selected
+
+    df_cand = df_candidates.rename(columns={pr_value_field: "pr_value"}) if pr_value_field != "pr_value" else df_candidates
+    positions = sample_country_proportional(
+        np.random.default_rng(seed), df_cand, n_needed, alpha, country_field
+    )
+    return df_candidates.iloc[positions].to_dict(orient="records")
 
 
 
@@ -1478,7 +1390,7 @@ def extrapolate_nonvideo(n_clicks, mm_dims2, ea_dims2):
 
     try:
         conn = sqlite3.connect(db_path)
-        df_hr_nonvideo.to_sql("hr_non_bewegt", conn, if_exists="replace", index=False)
+        with_duration_dtypes(df_hr_nonvideo).to_sql("hr_non_bewegt", conn, if_exists="replace", index=False)
         conn.close()
         # Summiere nochmal die Zeilen für die Meldung
         msg = (
@@ -1514,7 +1426,8 @@ def export_nonvideo_to_excel(n_clicks):
     output = BytesIO()
     # ExcelWriter verwenden – hier wird das Arbeitsblatt explizit "data" genannt.
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df_export.to_excel(writer, index=False, sheet_name="data")
+        # Dauern (Sekunden) als Excel-Zeitwerte
+        excel_durations(df_export).to_excel(writer, index=False, sheet_name="data")
         workbook = writer.book
         worksheet = writer.sheets["data"]
         
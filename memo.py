@@ -0,0 +1,123 @@
+# memo.py – Memo-Cache für reine Berechnungs-Callbacks
+#
+# Prozentwerte, Basechecks, Non-Video-Ergebnisse und die Importübersicht hängen nur
+# von den gewählten Argumenten und dem Inhalt der gelesenen Tabellen ab. memoized()
+# legt ihr Ergebnis (gepickelt) in einer eigenen SQLite-Datei ab; der Schlüssel
+# besteht aus Name, Argumenten und den Generationszählern der Tabellen – nach einem
+# Import oder einer Extrapolation passt der Schlüssel also nicht mehr und es wird
+# neu gerechnet. Einträge verfallen nach MEMO_TTL_SECONDS; übersteigt der Cache
+# MEMO_MAX_BYTES, werden die am längsten nicht genutzten verworfen. Treffer und
+# Fehlversuche werden je Name gezählt (memo_stats, Übersicht im Import-Tab).
+#
+# Gecacht wird nur der reine Teil (DataFrames, Spalten, Status); Handles des
+# result_store und Schreibzugriffe (z. B. write_percent) erzeugen die Callbacks
+# bei jedem Aufruf neu.
+
+import os
+import pickle
+import sqlite3
+import time
+
+import pandas as pd
+
+from export_jobs import cache_key, table_generations
+
+MEMO_DB = os.path.join("cache", "memo.db")
+
+# Lebensdauer eines Eintrags
+MEMO_TTL_SECONDS = 24 * 3600
+
+# Obergrenze für alle gespeicherten Ergebnisse zusammen
+MEMO_MAX_BYTES = 512 * 1024 ** 2
+
+
+def _connect():
+    os.makedirs(os.path.dirname(MEMO_DB), exist_ok=True)
+    conn = sqlite3.connect(MEMO_DB, timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS memo (
+            key TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            used REAL NOT NULL
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS memo_stats (
+            name TEXT PRIMARY KEY,
+            hits INTEGER NOT NULL DEFAULT 0,
+            misses INTEGER NOT NULL DEFAULT 0
+        );
+    """)
+    return conn
+
+
+def _count(conn, name, column):
+    conn.execute("INSERT OR IGNORE INTO memo_stats (name) VALUES (?);", (name,))
+    conn.execute(f"UPDATE memo_stats SET {column} = {column} + 1 WHERE name = ?;", (name,))
+
+
+def _evict(conn, now):
+    conn.execute("DELETE FROM memo WHERE created < ?;", (now - MEMO_TTL_SECONDS,))
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM memo;").fetchone()[0]
+    if total <= MEMO_MAX_BYTES:
+        return
+    for key, size in conn.execute("SELECT key, size FROM memo ORDER BY used;").fetchall():
+        conn.execute("DELETE FROM memo WHERE key = ?;", (key,))
+        total -= size
+        if total <= MEMO_MAX_BYTES:
+            break
+
+
+def memoized(name, tables, args, compute, db_path="data.db"):
+    """
+    Liefert compute() für (name, args) aus dem Cache, solange sich keine der
+    `tables` geändert hat; sonst wird gerechnet und das Ergebnis abgelegt.
+    `args` muss JSON-serialisierbar sein.
+    """
+    key = cache_key(name, args, table_generations(db_path, *tables))
+    now = time.time()
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT value FROM memo WHERE key = ? AND created >= ?;", (key, now - MEMO_TTL_SECONDS)
+        ).fetchone()
+        if row is not None:
+            conn.execute("UPDATE memo SET used = ? WHERE key = ?;", (now, key))
+            _count(conn, name, "hits")
+            return pickle.loads(row[0])
+
+    value = compute()
+    blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    with _connect() as conn:
+        _count(conn, name, "misses")
+        if len(blob) <= MEMO_MAX_BYTES:
+            conn.execute(
+                "INSERT OR REPLACE INTO memo (key, name, value, size, created, used) VALUES (?, ?, ?, ?, ?, ?);",
+                (key, name, blob, len(blob), now, now),
+            )
+        _evict(conn, now)
+    return value
+
+
+def memo_stats():
+    """Treffer, Fehlversuche, Trefferquote und Belegung je Name."""
+    with _connect() as conn:
+        stats = pd.read_sql("""
+            SELECT s.name, s.hits, s.misses,
+                   COUNT(m.key) AS entries, COALESCE(SUM(m.size), 0) AS size
+            FROM memo_stats AS s LEFT JOIN memo AS m ON m.name = s.name
+            GROUP BY s.name ORDER BY s.name;
+        """, conn)
+    calls = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = (stats["hits"] / calls.where(calls > 0)).fillna(0).map("{:.0%}".format)
+    stats["size_mb"] = (stats.pop("size") / 1024 ** 2).round(2)
+    return stats
+
+
+def clear_memo():
+    """Verwirft alle Einträge und Zähler (z. B. beim Leeren der Datenbank)."""
+    with _connect() as conn:
+        conn.execute("DELETE FROM memo;")
+        conn.execute("DELETE FROM memo_stats;")
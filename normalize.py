@@ -0,0 +1,116 @@
+# normalize.py – Normalisierung der Dimensionsspalten beim Import
+#
+# Bisher wurde an vielen Stellen erst beim Lesen normalisiert: TRIM(hr_basis) in
+# der Importübersicht, LOWER(post_type) beim Anlegen von video/non_video,
+# .str.strip() und .str.upper() in der Extrapolation. Das erzwang Full Scans und
+# String-Arbeit je Zeile und Aufruf. Stattdessen werden die Dimensionsspalten
+# einmal beim Import nach NORMALIZATION_POLICY bereinigt:
+#   - "trim": führenden und folgenden Leerraum entfernen,
+#   - "values": bekannte Schreibweisen; Werte werden ohne Rücksicht auf Groß-/
+#     Kleinschreibung auf diese abgebildet (z. B. "hr" -> "HR", "video" -> "Video").
+# Freitext-Dimensionen (Sponsor, Kanal, …) werden nur getrimmt, ihre Schreibweise
+# bleibt erhalten. Danach können SQL und pandas direkt mit den Rohwerten
+# vergleichen (hr_basis = 'HR', post_type = 'Video') und Indizes nutzen.
+#
+# Bestehende Tabellen aus älteren Importen werden bei Bedarf einmal per UPDATE
+# nachnormalisiert; welche Richtlinie angewendet wurde, steht in _normalization.
+
+import json
+
+import pandas as pd
+
+# Alle MM- und EA-Dimensionen (auch Grundlage von bitmap_index.INDEX_COLUMNS)
+DIMENSION_COLUMNS = [
+    'hr_basis',
+    'media', 'region', 'country', 'broadcaster', 'channel', 'genre', 'sports',
+    'competition', 'season', 'event', 'venue', 'event_country', 'channel_type',
+    'post_type', 'owned_channel', 'discipline', 'j1', 'j2', 'j3', 'j4', 'j5',
+    'hr1', 'hr2', 'hr3', 'hr4', 'hr5',
+    'company', 'sponsor', 'tool', 'personal_sponsorship', 'tool_location',
+]
+
+# Spalte -> Regel; Werte, auf die Abfragen fest vergleichen (media, post_type = 'Video',
+# hr_basis), erhalten ihre kanonische Schreibweise. Übrige post_type-Werte werden nur
+# getrimmt, ihre Schreibweise bleibt wie geliefert.
+NORMALIZATION_POLICY = {col: {"trim": True} for col in DIMENSION_COLUMNS}
+NORMALIZATION_POLICY.update({
+    "hr_basis": {"trim": True, "values": ["HR", "Basis"]},
+    "media": {"trim": True, "values": ["TV/OTT", "Print", "Online", "Social Media"]},
+    "post_type": {"trim": True, "values": ["Video"]},
+})
+
+
+def policy_key(policy=NORMALIZATION_POLICY):
+    return json.dumps(policy, sort_keys=True)
+
+
+def normalize_frame(df, policy=NORMALIZATION_POLICY):
+    """Normalisiert die Textwerte der Dimensionsspalten von `df` (in place) und liefert `df`."""
+    for col, rule in policy.items():
+        if col not in df.columns or df[col].dtype != object:
+            continue
+        is_text = df[col].map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+        if not is_text.any():
+            continue
+        values = df.loc[is_text, col]
+        if rule.get("trim"):
+            values = values.str.strip()
+        if rule.get("values"):
+            canonical = {v.casefold(): v for v in rule["values"]}
+            values = values.str.casefold().map(canonical).fillna(values)
+        df.loc[is_text, col] = values
+    return df
+
+
+def _sql_expr(col, rule):
+    expr = f'"{col}"'
+    if rule.get("trim"):
+        expr = f"TRIM({expr})"
+    if rule.get("values"):
+        # Die Wertevorräte sind ASCII, LOWER() genügt hier als casefold()
+        cases = " ".join(f"WHEN '{v.lower()}' THEN '{v}'" for v in rule["values"])
+        expr = f"CASE LOWER({expr}) {cases} ELSE {expr} END"
+    return expr
+
+
+def _ensure_state(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS _normalization (
+            table_name TEXT PRIMARY KEY,
+            policy TEXT NOT NULL
+        );
+    """)
+
+
+def mark_normalized(conn, table, policy=NORMALIZATION_POLICY):
+    """Vermerkt, dass `table` vollständig nach `policy` normalisiert geschrieben wurde."""
+    _ensure_state(conn)
+    conn.execute(
+        "INSERT OR REPLACE INTO _normalization (table_name, policy) VALUES (?, ?);",
+        (table, policy_key(policy)),
+    )
+
+
+def ensure_normalized(conn, table, policy=NORMALIZATION_POLICY):
+    """
+    Normalisiert `table` einmal per UPDATE, falls sie noch nicht (oder nach einer
+    anderen Richtlinie) normalisiert wurde. Liefert True, wenn Zeilen umgeschrieben wurden.
+    """
+    _ensure_state(conn)
+    row = conn.execute("SELECT policy FROM _normalization WHERE table_name = ?;", (table,)).fetchone()
+    if row is not None and row[0] == policy_key(policy):
+        return False
+    columns = {r[1] for r in conn.execute(f'PRAGMA table_info("{table}");')}
+    rules = [(col, rule) for col, rule in policy.items() if col in columns]
+    changed = False
+    if rules:
+        assignments = ", ".join(
+            f'"{col}" = CASE WHEN typeof("{col}") = \'text\' THEN {_sql_expr(col, rule)} ELSE "{col}" END'
+            for col, rule in rules
+        )
+        differs = " OR ".join(
+            f'(typeof("{col}") = \'text\' AND "{col}" IS NOT {_sql_expr(col, rule)})' for col, rule in rules
+        )
+        changed = conn.execute(f'UPDATE "{table}" SET {assignments} WHERE {differs};').rowcount > 0
+    mark_normalized(conn, table, policy)
+    return changed
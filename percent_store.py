@@ -0,0 +1,288 @@
+# percent_store.py – Prozentwertetabellen (percent, percent_non_video) mit Zeilen-IDs
+#
+# Jede Prozentzeile trägt eine stabile row_id und eine row_version. Beim Speichern
+# aus der Oberfläche wird die Tabelle nicht mehr per to_sql(if_exists="replace")
+# ersetzt, sondern der Stand der Oberfläche über die row_id mit der gespeicherten
+# Tabelle verglichen und in EINER Transaktion als Upsert geschrieben: geänderte
+# Zeilen erhalten row_version + 1, neue Zeilen (auch Duplikate) eine neue row_id
+# und eine Version über dem bisherigen Höchststand, entfernte Zeilen werden
+# gelöscht. Unveränderte Zeilen bleiben unangetastet – darauf baut die
+# inkrementelle Extrapolation auf. Auch Neuberechnungen (write_percent) setzen die
+# Versionen fort, statt wieder bei 1 zu beginnen.
+
+import hashlib
+import json
+import sqlite3
+
+import pandas as pd
+
+import result_store
+from extrapolation import SOURCE_KEY
+from helpers import bump_generation
+from normalize import normalize_frame
+from table_backend import apply_diff
+
+ROW_KEY = "row_id"
+ROW_VERSION = "row_version"
+KEY_COLUMNS = [ROW_KEY, ROW_VERSION]
+
+# Prozenttabelle -> daraus extrapolierte HR-Tabelle
+DEPENDENT_TARGETS = {"percent": "hr_bewegt", "percent_non_video": "hr_non_bewegt"}
+
+
+def _ensure_index(conn, table):
+    conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{table}_{ROW_KEY}" ON "{table}" ({ROW_KEY});')
+
+
+def value_columns(df):
+    """Fachliche Spalten (ohne row_id/row_version)."""
+    return [c for c in df.columns if c not in KEY_COLUMNS]
+
+
+def _max_version(conn, table):
+    try:
+        return conn.execute(f'SELECT COALESCE(MAX({ROW_VERSION}), 0) FROM "{table}";').fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+
+
+def write_percent(df, table, db_path="data.db"):
+    """
+    Schreibt eine neu berechnete Prozenttabelle komplett (row_id ab 1) und liefert
+    sie inklusive der Schlüsselspalten zurück. Die Version setzt über dem bisherigen
+    Höchststand fort, damit sich (row_id, row_version) über Neuberechnungen hinweg
+    nicht wiederholen. Der Stand der abhängigen Extrapolation wird verworfen.
+    """
+    if table in DEPENDENT_TARGETS:
+        forget_extrapolation(DEPENDENT_TARGETS[table], db_path)
+    df = df[value_columns(df)].reset_index(drop=True)
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        df.insert(0, ROW_KEY, range(1, len(df) + 1))
+        df.insert(1, ROW_VERSION, _max_version(conn, table) + 1)
+        df.to_sql(table, conn, if_exists="replace", index=False)
+        _ensure_index(conn, table)
+        bump_generation(conn, table)
+    return df
+
+
+def _normalize(df, columns):
+    """Vergleichbare Zeilentupel: fehlende Werte -> None, sonst Text."""
+    values = df[columns].astype(object).where(df[columns].notna(), None)
+    return [tuple(None if v is None else str(v) for v in row)
+            for row in values.itertuples(index=False, name=None)]
+
+
+def save_percent(df, table, db_path="data.db"):
+    """
+    Gleicht `df` (Stand der Oberfläche, mit row_id, falls bekannt) mit `table` ab
+    und schreibt nur die Unterschiede als transaktionalen Upsert.
+    Liefert (Zähler, DataFrame mit row_id/row_version je Zeile von `df`).
+    Bearbeitete Dimensionswerte werden wie beim Import normalisiert.
+    """
+    df = normalize_frame(df.reset_index(drop=True))
+    columns = value_columns(df)
+    counts = {"updated": 0, "inserted": 0, "deleted": 0, "unchanged": 0}
+
+    # Lesen, Vergleichen und Schreiben in einer Transaktion (BEGIN IMMEDIATE sperrt
+    # parallele Schreiber, bis der Upsert committet ist)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            stored = pd.read_sql(f'SELECT * FROM "{table}"', conn)
+        except (sqlite3.OperationalError, pd.errors.DatabaseError):
+            stored = pd.DataFrame()
+
+        # Ohne Schlüssel oder mit geänderten Spalten: einmalig komplett neu schreiben
+        if ROW_KEY not in stored.columns or ROW_KEY not in df.columns \
+                or set(value_columns(stored)) != set(columns):
+            conn.execute("ROLLBACK;")
+            written = write_percent(df, table, db_path)
+            counts["inserted"] = len(written)
+            return counts, written[KEY_COLUMNS]
+
+        stored = stored.set_index(ROW_KEY)
+        stored_rows = dict(zip(stored.index, _normalize(stored, columns)))
+        versions = stored[ROW_VERSION].to_dict()
+        next_key = int(stored.index.max()) + 1 if len(stored) else 1
+        # Neue Zeilen erhalten ebenfalls eine noch nicht vergebene Version
+        new_version = int(stored[ROW_VERSION].max()) + 1 if len(stored) else 1
+
+        keys, new_versions = [], []
+        updates, inserts, seen = [], [], set()
+        for key, row, values in zip(df[ROW_KEY], _normalize(df, columns),
+                                    df[columns].itertuples(index=False, name=None)):
+            key = None if pd.isna(key) else int(key)
+            if key is None or key in seen or key not in stored_rows:
+                # Neue Zeile oder Duplikat einer bestehenden Zeile
+                key, version = next_key, new_version
+                next_key += 1
+                inserts.append((key, version) + values)
+            elif row != stored_rows[key]:
+                version = int(versions[key]) + 1
+                updates.append(values + (version, key))
+            else:
+                version = int(versions[key])
+                counts["unchanged"] += 1
+            seen.add(key)
+            keys.append(key)
+            new_versions.append(version)
+
+        deleted = [int(k) for k in stored_rows if k not in seen]
+
+        quoted = [f'"{c}"' for c in columns]
+        if updates:
+            conn.executemany(
+                f'UPDATE "{table}" SET {", ".join(q + " = ?" for q in quoted)}, {ROW_VERSION} = ? '
+                f'WHERE {ROW_KEY} = ?', updates)
+        if inserts:
+            conn.executemany(
+                f'INSERT INTO "{table}" ({ROW_KEY}, {ROW_VERSION}, {", ".join(quoted)}) '
+                f'VALUES ({", ".join("?" * (len(columns) + 2))})', inserts)
+        if deleted:
+            conn.executemany(f'DELETE FROM "{table}" WHERE {ROW_KEY} = ?', [(k,) for k in deleted])
+        if updates or inserts or deleted:
+            _ensure_index(conn, table)
+            bump_generation(conn, table)
+        conn.execute("COMMIT;")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK;")
+        raise
+    finally:
+        conn.close()
+
+    counts.update(updated=len(updates), inserted=len(inserts), deleted=len(deleted))
+    return counts, pd.DataFrame({ROW_KEY: keys, ROW_VERSION: new_versions})
+
+
+def save_percent_view(handle, diff, table, db_path="data.db"):
+    """
+    Übernimmt den Diff aus dem Browser in das Ergebnis hinter `handle`, speichert es
+    als Upsert nach `table` und schreibt die vergebenen row_ids/Versionen zurück.
+    Liefert (Zähler, Zeilenanzahl).
+    """
+    apply_diff(handle, diff, db_path)
+    df = result_store.get(handle, db_path)
+    if df.empty:
+        return None, 0
+    counts, keys = save_percent(df.drop(columns=[result_store.ROW_ID]), table, db_path)
+
+    # row_id/row_version neuer bzw. geänderter Zeilen ins Ergebnis zurückschreiben
+    current = df.reindex(columns=KEY_COLUMNS).reset_index(drop=True)
+    changed = (current[ROW_KEY].ne(keys[ROW_KEY]) | current[ROW_VERSION].ne(keys[ROW_VERSION])).to_numpy()
+    if changed.any():
+        ids = df[result_store.ROW_ID].to_numpy()[changed]
+        sub = keys[changed]
+        updated = {
+            int(i): {result_store.ROW_ID: int(i), ROW_KEY: int(k), ROW_VERSION: int(v)}
+            for i, k, v in zip(ids, sub[ROW_KEY], sub[ROW_VERSION])
+        }
+        apply_diff(handle, {"updated": updated}, db_path)
+    return counts, len(df)
+
+
+def format_save_status(counts, n_rows):
+    return (f"✅ Prozentwertetabelle gespeichert ({n_rows} Zeilen): "
+            f"{counts['updated']} geändert, {counts['inserted']} neu, {counts['deleted']} gelöscht.")
+
+
+# --- Inkrementelle Extrapolation ----------------------------------------------
+#
+# Je Zieltabelle (hr_bewegt, hr_non_bewegt) wird festgehalten, mit welchen
+# Parametern und welchen (row_id, row_version, row_hash) der Prozenttabelle zuletzt
+# extrapoliert wurde. row_hash ist ein Hash der fachlichen Werte; so fällt eine
+# Änderung auch dann auf, wenn sich (row_id, row_version) zufällig wiederholt. Beim nächsten Lauf müssen nur neue oder geänderte Zeilen
+# neu gezogen und die HR-Zeilen entfernter Zeilen gelöscht werden; die HR-Zeilen
+# tragen dazu ihre Herkunft in der Spalte src_percent_id (extrapolation.SOURCE_KEY).
+
+
+def row_hashes(df):
+    """Hash der fachlichen Werte je Zeile von `df` (in Zeilenreihenfolge)."""
+    columns = sorted(value_columns(df))
+    return [hashlib.sha1(json.dumps([columns, row]).encode("utf-8")).hexdigest()
+            for row in _normalize(df, columns)]
+
+
+def _ensure_state(conn):
+    # Stand aus älteren Versionen ohne row_hash verwerfen (nächster Lauf rechnet komplett)
+    columns = [row[1] for row in conn.execute('PRAGMA table_info("_extrapolation_rows");')]
+    if columns and "row_hash" not in columns:
+        conn.execute("DROP TABLE _extrapolation_rows;")
+        conn.execute("DROP TABLE IF EXISTS _extrapolation_runs;")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS _extrapolation_runs (
+            target TEXT PRIMARY KEY,
+            params TEXT NOT NULL
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS _extrapolation_rows (
+            target TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            row_version INTEGER NOT NULL,
+            row_hash TEXT NOT NULL,
+            PRIMARY KEY (target, row_id)
+        );
+    """)
+
+
+def pending_percent_rows(target, df_percent, params, db_path="data.db"):
+    """
+    Vergleicht die Prozentzeilen mit dem Stand des letzten Laufs für `target`.
+    Liefert (neue/geänderte row_ids, entfernte row_ids) – oder None, wenn komplett
+    neu extrapoliert werden muss (erster Lauf, andere Parameter, Quelldaten neu
+    importiert oder Zieltabelle ohne src_percent_id).
+    """
+    if ROW_KEY not in df_percent.columns or df_percent[ROW_KEY].isna().any():
+        return None
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        _ensure_state(conn)
+        run = conn.execute("SELECT params FROM _extrapolation_runs WHERE target = ?;", (target,)).fetchone()
+        target_cols = [row[1] for row in conn.execute(f'PRAGMA table_info("{target}");')]
+        if run is None or run[0] != json.dumps(params, sort_keys=True) or SOURCE_KEY not in target_cols:
+            return None
+        previous = {k: (v, h) for k, v, h in conn.execute(
+            "SELECT row_id, row_version, row_hash FROM _extrapolation_rows WHERE target = ?;", (target,)
+        )}
+
+    current = dict(zip(df_percent[ROW_KEY].astype(int),
+                       zip(df_percent[ROW_VERSION].astype(int), row_hashes(df_percent))))
+    changed = [k for k, v in current.items() if previous.get(k) != v]
+    removed = [k for k in previous if k not in current]
+    return changed, removed
+
+
+def record_extrapolation(target, df_percent, params, db_path="data.db"):
+    """Merkt sich Parameter und (row_id, row_version, row_hash) des abgeschlossenen Laufs."""
+    forget_extrapolation(target, db_path)
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        if ROW_KEY not in df_percent.columns or df_percent[ROW_KEY].isna().any():
+            return
+        conn.executemany(
+            "INSERT INTO _extrapolation_rows (target, row_id, row_version, row_hash) VALUES (?, ?, ?, ?);",
+            [(target, int(k), int(v), h)
+             for k, v, h in zip(df_percent[ROW_KEY], df_percent[ROW_VERSION], row_hashes(df_percent))],
+        )
+        conn.execute(
+            "INSERT INTO _extrapolation_runs (target, params) VALUES (?, ?);",
+            (target, json.dumps(params, sort_keys=True)),
+        )
+
+
+def forget_extrapolation(target, db_path="data.db"):
+    """Verwirft den Stand des letzten Laufs, bevor `target` verändert wird."""
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        _ensure_state(conn)
+        conn.execute("DELETE FROM _extrapolation_rows WHERE target = ?;", (target,))
+        conn.execute("DELETE FROM _extrapolation_runs WHERE target = ?;", (target,))
+
+
+def delete_hr_rows(conn, table, row_ids):
+    """Löscht die HR-Zeilen, die aus den Prozentzeilen `row_ids` entstanden sind."""
+    row_ids = [int(k) for k in row_ids]
+    for start in range(0, len(row_ids), 500):
+        chunk = row_ids[start:start + 500]
+        conn.execute(
+            f'DELETE FROM "{table}" WHERE {SOURCE_KEY} IN ({",".join("?" * len(chunk))});', chunk
+        )
@@ -0,0 +1,117 @@
+# percentages.py – Prozentwerte für die Non-Video-Hochrechnung
+#
+# Alle Kennzahlen werden aus je einem gruppierten Durchlauf pro Ebene abgeleitet:
+#   MM+EA (Basis): ea_hits, sum_mentions
+#   MM    (Basis): bid_mm_kombo
+#   MM    (HR):    bid_mm_kombo_hr
+#   EA    (Basis): avg_weighting_factor
+# Die abgeleiteten Spalten (hit_percentage, ids_for_HR, avg_mentions) sind reine
+# Array-Arithmetik – keine zeilenweisen apply-Aufrufe mehr.
+
+import numpy as np
+import pandas as pd
+
+
+def weight_ratio(df):
+    """ave_weighted / ave_100 je Zeile, 0 wenn ave_100 nicht positiv ist."""
+    ave_100 = pd.to_numeric(df['ave_100'], errors='coerce').to_numpy(dtype=np.float64)
+    ave_weighted = pd.to_numeric(df['ave_weighted'], errors='coerce').to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(ave_100 > 0, ave_weighted / ave_100, 0.0)
+
+
+def _lookup(df_groups, keys, counts):
+    """Ordnet die Werte einer Gruppierung über `keys` den Zeilen von df_groups zu."""
+    idx = pd.MultiIndex.from_frame(df_groups[keys])
+    positions = pd.MultiIndex.from_frame(counts.index.to_frame(index=False)).get_indexer(idx)
+    values = counts.to_numpy()
+    return np.where(positions >= 0, values[positions], np.nan) if len(values) else np.full(len(idx), np.nan)
+
+
+def nonvideo_percentages(df_nonvideo, mm_dims, ea_dims, distinct_counts=None):
+    """
+    Berechnet die Tabelle percent_non_video (unformatiert) und die Anzahl distinct bids
+    der Basis. `distinct_counts(keys, hr_basis, df_groups)` kann die exakten distinct
+    counts ersetzen (z. B. durch HLL-Schätzungen); sonst stammen sie aus den Gruppierungen.
+    """
+    mm_dims = list(mm_dims or [])
+    ea_dims = list(ea_dims or [])
+    group_by_all = mm_dims + ea_dims
+
+    is_basis = (df_nonvideo['hr_basis'] == 'Basis').to_numpy()
+    df_basis = df_nonvideo[is_basis]
+    overall_bid_count = df_basis['bid'].nunique()
+
+    ratio = pd.Series(weight_ratio(df_basis), index=df_basis.index)
+    overall_avg_weighting = ratio.mean() * 100
+
+    # Ebene MM+EA: ein Durchlauf für Gruppen, Summe mentions und – ohne
+    # distinct_counts – die distinct bids
+    aggs = {'sum_mentions': ('_mentions', 'sum')}
+    if distinct_counts is None:
+        aggs['ea_hits'] = ('bid', 'nunique')
+    level_all = (
+        df_basis.assign(_mentions=pd.to_numeric(df_basis['mentions'], errors='coerce'))
+        .groupby(group_by_all, sort=False)
+        .agg(**aggs)
+    )
+    df_result = level_all.index.to_frame(index=False)
+
+    def exact(keys, frame):
+        return frame.groupby(keys, sort=False)['bid'].nunique()
+
+    def counts_for(keys, hr_basis, frame):
+        if distinct_counts is not None:
+            return np.asarray(distinct_counts(keys, hr_basis, df_result), dtype=np.float64)
+        return np.nan_to_num(_lookup(df_result, keys, exact(keys, frame)))
+
+    if mm_dims:
+        df_result['bid_mm_kombo'] = counts_for(mm_dims, 'Basis', df_basis).astype(np.int64)
+    if distinct_counts is not None:
+        df_result['ea_hits'] = counts_for(group_by_all, 'Basis', df_basis).astype(np.int64)
+    else:
+        df_result['ea_hits'] = level_all['ea_hits'].to_numpy(dtype=np.int64)
+    if mm_dims:
+        df_hr = df_nonvideo[(df_nonvideo['hr_basis'] == 'HR').to_numpy()]
+        df_result['bid_mm_kombo_hr'] = counts_for(mm_dims, 'HR', df_hr).astype(np.int64)
+    df_result['overall_bid_count'] = overall_bid_count
+
+    # Ebene EA: mittlerer Gewichtungsfaktor
+    if ea_dims:
+        mean_ratio = ratio.groupby([df_basis[c] for c in ea_dims], sort=False).mean()
+        df_result['avg_weighting_factor'] = _lookup(df_result, ea_dims, mean_ratio) * 100
+    else:
+        df_result['avg_weighting_factor'] = overall_avg_weighting
+
+    # Abgeleitete Kennzahlen
+    ea_hits = df_result['ea_hits'].to_numpy(dtype=np.float64)
+    if mm_dims:
+        bid_mm = df_result['bid_mm_kombo'].to_numpy(dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hit_percentage = np.where(bid_mm > 0, ea_hits / bid_mm * 100, 0.0)
+        ids_for_hr = np.round(df_result['bid_mm_kombo_hr'].to_numpy(dtype=np.float64) * hit_percentage / 100)
+    else:
+        hit_percentage = np.zeros(len(df_result))
+        ids_for_hr = np.zeros(len(df_result))
+    df_result['hit_percentage'] = hit_percentage
+    df_result['ids_for_HR'] = ids_for_hr
+
+    sum_mentions = level_all['sum_mentions'].to_numpy(dtype=np.float64)
+    df_result['sum_mentions'] = sum_mentions
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_mentions = np.where(ea_hits > 0, np.maximum(np.round(sum_mentions / ea_hits), 1), 1)
+    df_result['avg_mentions'] = avg_mentions.astype(np.int64)
+
+    df_result = df_result[df_result['ea_hits'] > 0].reset_index(drop=True)
+    return df_result, overall_bid_count
+
+
+def format_nonvideo_percentages(df_result):
+    """Formatiert die Zahlen für Anzeige und Ablage wie bisher (Tausenderpunkte, 2 Nachkommastellen)."""
+    df_result = df_result.copy()
+    for col in ['bid_mm_kombo', 'bid_mm_kombo_hr', 'ea_hits', 'ids_for_HR', 'sum_mentions']:
+        if col in df_result.columns:
+            df_result[col] = df_result[col].fillna(0).astype(int).map('{:,}'.format)
+    df_result['hit_percentage'] = df_result['hit_percentage'].map('{:.2f}'.format)
+    df_result['avg_weighting_factor'] = df_result['avg_weighting_factor'].map('{:.2f}'.format)
+    return df_result
@@ -0,0 +1,105 @@
+# result_store.py – serverseitige Ablage von Ergebnistabellen hinter Handles
+#
+# Callbacks geben statt kompletter Tabellen nur noch ein Handle (32 Hex-Zeichen)
+# in einen dcc.Store. Die Daten liegen als SQLite-Tabelle _result_<handle> (mit
+# laufender Zeilen-ID) und zusätzlich im Prozess-Cache; nachgelagerte Callbacks
+# lösen das Handle mit get() wieder auf. Pro Art (z. B. DataTable-ID) werden nur
+# die letzten RESULTS_PER_KIND Ergebnisse aufbewahrt.
+
+import re
+import sqlite3
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+
+RESULT_PREFIX = "_result_"
+ROW_ID = "id"
+
+# Wie viele Ergebnisse je Art erhalten bleiben (mehrere Browser-Tabs/Nutzer)
+RESULTS_PER_KIND = 8
+
+# Anzahl der im Prozess gehaltenen DataFrames
+CACHE_SIZE = 16
+
+_HANDLE = re.compile(r"^[0-9a-f]{32}$")
+
+# Prozess-Cache: handle -> DataFrame (LRU)
+_CACHE = OrderedDict()
+
+
+def table_name(handle):
+    """SQLite-Tabelle zu einem Handle; ungültige Handles werden abgewiesen."""
+    if not isinstance(handle, str) or not _HANDLE.match(handle):
+        raise ValueError(f"Ungültiges Ergebnis-Handle: {handle!r}")
+    return RESULT_PREFIX + handle
+
+
+def _ensure_registry(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS _results (
+            handle TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            created TEXT NOT NULL
+        );
+    """)
+
+
+def _remember(handle, df):
+    _CACHE[handle] = df
+    _CACHE.move_to_end(handle)
+    while len(_CACHE) > CACHE_SIZE:
+        _CACHE.popitem(last=False)
+
+
+def put(df, kind, db_path="data.db"):
+    """Legt `df` (mit Zeilen-ID) ab und liefert das neue Handle."""
+    handle = uuid.uuid4().hex
+    table = table_name(handle)
+    df = df.reset_index(drop=True)
+    df.insert(0, ROW_ID, range(len(df)))
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        _ensure_registry(conn)
+        df.to_sql(table, conn, if_exists="replace", index=False)
+        conn.execute(f'CREATE UNIQUE INDEX "{table}_id" ON "{table}" ({ROW_ID});')
+        conn.execute(
+            "INSERT INTO _results (handle, kind, created) VALUES (?, ?, datetime('now'));",
+            (handle, kind),
+        )
+        # Ältere Ergebnisse derselben Art verwerfen
+        stale = conn.execute("""
+            SELECT handle FROM _results WHERE kind = ?
+            ORDER BY created DESC, rowid DESC LIMIT -1 OFFSET ?;
+        """, (kind, RESULTS_PER_KIND)).fetchall()
+        for (old,) in stale:
+            conn.execute(f'DROP TABLE IF EXISTS "{table_name(old)}";')
+            conn.execute("DELETE FROM _results WHERE handle = ?;", (old,))
+            _CACHE.pop(old, None)
+    _remember(handle, df)
+    return handle
+
+
+def get(handle, db_path="data.db"):
+    """Löst ein Handle zum DataFrame (inkl. Zeilen-ID) auf; leer, wenn unbekannt."""
+    if not handle:
+        return pd.DataFrame()
+    if handle in _CACHE:
+        _CACHE.move_to_end(handle)
+        return _CACHE[handle]
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        try:
+            df = pd.read_sql(f'SELECT * FROM "{table_name(handle)}" ORDER BY {ROW_ID}', conn)
+        except (sqlite3.OperationalError, pd.errors.DatabaseError):
+            return pd.DataFrame()
+    _remember(handle, df)
+    return df
+
+
+def invalidate(handle):
+    """Nach Änderungen an der SQLite-Tabelle den Prozess-Cache des Handles verwerfen."""
+    _CACHE.pop(handle, None)
+
+
+def clear_cache():
+    """Leert den Prozess-Cache (z. B. beim Leeren der Datenbank)."""
+    _CACHE.clear()
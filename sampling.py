@@ -0,0 +1,166 @@
+# sampling.py – gewichtetes, reproduzierbares Ziehen von Kandidatenzeilen
+#
+# Ersetzt die pandas-Aufrufe `sample(n=1)` je Kanal plus `sample(n=rest)` durch
+# Ziehungen auf einem NumPy-Generator. Alle Positionen einer Gruppe werden aus
+# einem einzigen Zufallsvektor bestimmt (Gumbel-Top-k, äquivalent zum
+# Efraimidis-Spirakis-Verfahren für gewichtetes Ziehen ohne Zurücklegen).
+# Gleicher Seed + gleiche Eingabe = gleiche Auswahl.
+#
+# Strategien (STRATEGIES) haben die Signatur (rng, df_cand, n, alpha) und liefern
+# n Positionen in df_cand:
+#   channel  – je Kanal eine Zeile garantiert, Rest gewichtet
+#   country  – Aufteilung proportional zur Zeilenzahl je country (größter Rest),
+#              innerhalb des Landes gewichtet nach pr_value
+#   weighted – rein gewichtet nach pr_value
+
+import numpy as np
+import pandas as pd
+
+# Gewichtung wie bisher: alpha * normalisierter pr_value + (1 - alpha)
+ALPHA = 0.7
+DEFAULT_SEED = 42
+
+
+def candidate_weights(pr_values, alpha=ALPHA):
+    """Gewichte aus pr_value: auf das Maximum normiert und mit Grundgewicht (1 - alpha)."""
+    pr_vals = np.nan_to_num(np.asarray(pr_values, dtype=np.float64), nan=0.0)
+    max_pr = pr_vals.max() if len(pr_vals) else 0.0
+    normalized = pr_vals / max_pr if max_pr > 0 else pr_vals
+    return alpha * normalized + (1 - alpha)
+
+
+def group_weights(pr_values, groups, alpha=ALPHA):
+    """Wie candidate_weights, aber pr_value je Gruppe (z. B. country) auf deren Maximum normiert."""
+    pr_vals = pd.Series(np.nan_to_num(np.asarray(pr_values, dtype=np.float64), nan=0.0))
+    max_pr = pr_vals.groupby(np.asarray(groups, dtype=object), dropna=False).transform('max').to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normalized = np.where(max_pr > 0, pr_vals.to_numpy() / max_pr, pr_vals.to_numpy())
+    return alpha * normalized + (1 - alpha)
+
+
+def largest_remainder(sizes, n):
+    """Teilt n proportional zu `sizes` auf (Hare-Niemeyer); die Summe ist genau n."""
+    sizes = np.asarray(sizes, dtype=np.float64)
+    total = sizes.sum()
+    if n <= 0 or total <= 0:
+        return np.zeros(len(sizes), dtype=np.int64)
+    quotas = n * sizes / total
+    alloc = np.floor(quotas).astype(np.int64)
+    rest = int(n - alloc.sum())
+    if rest > 0:
+        order = np.argsort(-(quotas - alloc), kind="stable")
+        alloc[order[:rest]] += 1
+    return alloc
+
+
+def row_rng(seed, row_pos):
+    """Eigener Generator je Prozentzeile – unabhängig von der Verarbeitungsreihenfolge."""
+    return np.random.default_rng([int(seed), int(row_pos)])
+
+
+def sample_positions(rng, weights, n, channels=None):
+    """
+    Zieht `n` Positionen (0..len(weights)-1) gewichtet.
+
+    Kanal-Garantie: aus jedem Kanal (in Reihenfolge des ersten Auftretens, höchstens n)
+    wird zuerst genau eine Zeile gezogen. Der Rest wird ohne Zurücklegen gezogen,
+    außer es gibt weniger Kandidaten als benötigt – dann mit Zurücklegen.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    size = len(weights)
+    if n <= 0 or size == 0:
+        return np.empty(0, dtype=np.int64)
+
+    with np.errstate(divide="ignore"):
+        log_w = np.log(weights)
+    # Ein Zufallsvektor für Garantie (Zeile 0) und Rest (Zeile 1)
+    keys = log_w + rng.gumbel(size=(2, size))
+
+    mandatory = np.empty(0, dtype=np.int64)
+    if channels is not None:
+        codes, _ = pd.factorize(pd.Series(channels), sort=False)
+        valid = np.flatnonzero(codes >= 0)
+        if len(valid):
+            # Gumbel-Max je Kanal: Position mit dem größten Schlüssel
+            order = valid[np.lexsort((-keys[0, valid], codes[valid]))]
+            first = np.r_[True, np.diff(codes[order]) != 0]
+            mandatory = order[first][:n]
+
+    remaining = n - len(mandatory)
+    if remaining <= 0:
+        return mandatory
+    if size < remaining:
+        rest = rng.choice(size, size=remaining, replace=True, p=weights / weights.sum())
+    else:
+        rest = np.argpartition(-keys[1], remaining - 1)[:remaining]
+        rest = rest[np.argsort(-keys[1, rest], kind="stable")]
+    return np.concatenate([mandatory, rest.astype(np.int64)])
+
+
+def _weighted_rest(rng, weights, keys, n):
+    """n gewichtete Positionen: Gumbel-Top-k, bzw. mit Zurücklegen bei zu wenig Kandidaten."""
+    if len(weights) < n:
+        return rng.choice(len(weights), size=n, replace=True, p=weights / weights.sum())
+    top = np.argpartition(-keys, n - 1)[:n]
+    return top[np.argsort(-keys[top], kind="stable")]
+
+
+def sample_channel_guarantee(rng, df_cand, n, alpha=ALPHA):
+    channels = df_cand['channel'] if 'channel' in df_cand.columns else None
+    return sample_positions(rng, candidate_weights(df_cand['pr_value'], alpha), n, channels)
+
+
+def sample_weighted(rng, df_cand, n, alpha=ALPHA):
+    weights = candidate_weights(df_cand['pr_value'], alpha)
+    if n <= 0 or not len(weights):
+        return np.empty(0, dtype=np.int64)
+    with np.errstate(divide="ignore"):
+        keys = np.log(weights) + rng.gumbel(size=len(weights))
+    return _weighted_rest(rng, weights, keys, n).astype(np.int64)
+
+
+def sample_country_proportional(rng, df_cand, n, alpha=ALPHA, country_field="country"):
+    """
+    Verteilt n per größtem Rest proportional zur Zeilenzahl je Land und zieht innerhalb
+    jedes Landes gewichtet (pr_value je Land normiert). Ohne Zurücklegen, außer ein Land
+    hat weniger Zeilen als ihm zugeteilt wurden. Zeilen ohne Land werden nicht gezogen.
+    """
+    if n <= 0 or df_cand.empty:
+        return np.empty(0, dtype=np.int64)
+    codes, _ = pd.factorize(df_cand[country_field], sort=True)
+    valid = np.flatnonzero(codes >= 0)
+    if not len(valid):
+        return sample_weighted(rng, df_cand, n, alpha)
+
+    weights = group_weights(df_cand['pr_value'], df_cand[country_field], alpha)
+    sizes = np.bincount(codes[valid])
+    alloc = largest_remainder(sizes, n)
+
+    # Ein Gumbel-Schlüssel je Zeile; innerhalb jedes Landes absteigend sortiert
+    with np.errstate(divide="ignore"):
+        keys = np.log(weights) + rng.gumbel(size=len(weights))
+    order = valid[np.lexsort((-keys[valid], codes[valid]))]
+    starts = np.r_[0, np.cumsum(sizes)[:-1]]
+    rank = np.arange(len(order)) - np.repeat(starts, sizes)
+    picked = order[rank < np.repeat(alloc, sizes)]
+
+    # Länder mit mehr Zuteilung als Zeilen: zusätzlich mit Zurücklegen auffüllen
+    extra = [picked]
+    for code in np.flatnonzero(alloc > sizes):
+        members = order[starts[code]:starts[code] + sizes[code]]
+        w = weights[members]
+        extra.append(members[rng.choice(len(members), size=alloc[code] - sizes[code], replace=True, p=w / w.sum())])
+    return np.concatenate(extra).astype(np.int64)
+
+
+STRATEGIES = {
+    "channel": sample_channel_guarantee,
+    "country": sample_country_proportional,
+    "weighted": sample_weighted,
+}
+DEFAULT_STRATEGY = "channel"
+
+
+def draw_positions(strategy, rng, df_cand, n, alpha=ALPHA):
+    """Zieht n Positionen aus df_cand mit der gewählten Strategie."""
+    return STRATEGIES.get(strategy or DEFAULT_STRATEGY, STRATEGIES[DEFAULT_STRATEGY])(rng, df_cand, n, alpha)
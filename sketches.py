@@ -0,0 +1,88 @@
+# sketches.py – HyperLogLog-Sketches für approximative distinct counts
+#
+# Ein Sketch besteht aus m = 2^p Registern (uint8). Sketches verschiedener Gruppen
+# lassen sich per elementweisem Maximum verlustfrei zusammenführen, daher eignen
+# sie sich für Roll-ups über Dimensionen. Der relative Standardfehler beträgt
+# 1.04 / sqrt(m). Die Präzision p legt der Aufrufer fest (cube.CUBE_SKETCH_PRECISION).
+#
+# Gespeichert werden die Sketches dünn besetzt, da Cube-Zellen meist nur wenige
+# bids enthalten: nur die belegten Register als (Gruppe, Register, Rang)-Tripel.
+# Erst beim Zusammenführen auf die (gröberen) Zielgruppen entstehen dichte Register.
+
+import numpy as np
+import pandas as pd
+
+def relative_error(precision):
+    """Relativer Standardfehler eines HLL-Sketches mit der gegebenen Präzision."""
+    return 1.04 / np.sqrt(1 << precision)
+
+
+def _bit_length(values):
+    """Exakte Bitlänge für uint64-Werte (0 für 0), vektorisiert."""
+    hi = (values >> np.uint64(32)).astype(np.float64)
+    lo = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    bl_hi = np.frexp(hi)[1]
+    bl_lo = np.frexp(lo)[1]
+    return np.where(hi > 0, 32 + bl_hi, bl_lo).astype(np.int64)
+
+
+def hash_values(values):
+    """64-bit-Hashes der Werte (deterministisch über Prozesse hinweg)."""
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+def register_updates(hashes, precision):
+    """Zerlegt Hashes in Registerindex und Rang (Position der ersten 1 + 1)."""
+    shift = np.uint64(64 - precision)
+    idx = (hashes >> shift).astype(np.int64)
+    rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+    rank = (64 - precision) - _bit_length(rest) + 1
+    return idx, rank.astype(np.uint8)
+
+
+def build_sparse_sketches(group_codes, values, precision):
+    """
+    Baut je Gruppe einen Sketch. `group_codes` ordnet jede Zeile einer Gruppe zu
+    (negative Codes werden ignoriert). Liefert (Gruppen, Register, Ränge) nur für
+    belegte Register, je (Gruppe, Register) mit dem höchsten Rang.
+    """
+    values = pd.Series(values)
+    group_codes = np.asarray(group_codes)
+    keep = (group_codes >= 0) & values.notna().to_numpy()
+    if not keep.any():
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.uint16), np.empty(0, dtype=np.uint8)
+    idx, rank = register_updates(hash_values(values[keep].to_numpy()), precision)
+    slot = group_codes[keep].astype(np.int64) * (1 << precision) + idx
+    order = np.lexsort((rank, slot))
+    slot, rank = slot[order], rank[order]
+    last = np.r_[slot[1:] != slot[:-1], True]
+    slot, rank = slot[last], rank[last]
+    # Kompakte Typen: 7 Bytes je belegtem Register
+    return (slot >> precision).astype(np.int32), (slot & ((1 << precision) - 1)).astype(np.uint16), rank
+
+
+def merge_sparse_sketches(groups, registers, ranks, group_codes, n_groups, precision):
+    """
+    Führt dünn besetzte Sketches je Zielgruppe per Maximum zusammen. `group_codes`
+    ordnet jede Quellgruppe einer Zielgruppe zu (negativ = verwerfen).
+    Ergebnis: dichte Registermatrix (n_groups, 2^precision).
+    """
+    merged = np.zeros((n_groups, 1 << precision), dtype=np.uint8)
+    targets = np.asarray(group_codes)[groups]
+    keep = targets >= 0
+    if keep.any():
+        np.maximum.at(merged, (targets[keep], registers[keep].astype(np.int64)), ranks[keep])
+    return merged
+
+
+def estimate(registers):
+    """Schätzt die Kardinalität je Sketch (HLL mit Linear-Counting für kleine Mengen)."""
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.power(2.0, -registers.astype(np.float64)), axis=1)
+    zeros = np.count_nonzero(registers == 0, axis=1)
+    with np.errstate(divide="ignore"):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    small = (raw <= 2.5 * m) & (zeros > 0)
+    return np.where(small, linear, raw)
@@ -0,0 +1,139 @@
+# summary.py – fortlaufend gepflegte Importübersicht je hr_basis
+#
+# Die Importübersicht (aggregated-table-1/2) las nach jedem Upload die komplette
+# data-Tabelle mit COUNT(DISTINCT bid) und bedingten Summen.
+# Stattdessen führt update_summaries() beim Schreiben von data je Quelle eine
+# kleine Summentabelle pro hr_basis mit:
+#   - _summary_video / _summary_non_video: Summen und distinct_bid je hr_basis,
+#   - _summary_bids: die bereits gesehenen (hr_basis, bid)-Paare je Quelle als
+#     Zustand für distinct_bid.
+# Bei "append" werden nur die neu eingefügten Zeilen (rowid > bisheriges Maximum)
+# eingerechnet, bei "replace" werden die Tabellen in einem Durchlauf neu aufgebaut.
+# Fehlendes hr_basis wird als '' geführt und beim Lesen wieder als NULL geliefert.
+
+import sqlite3
+
+import pandas as pd
+
+# Filter und Kennzahlen wie in helpers.get_aggregated_data(_opposite)
+SOURCES = {
+    "video": {
+        "where": "(media = 'TV/OTT' OR (media = 'Social Media' AND post_type IN ('Video')))",
+        "measures": {
+            "sum_visibility": "SUM(visibility)",
+            "sum_broadcasting_time": "SUM(CASE WHEN tool IS NULL OR tool = '' THEN broadcasting_time ELSE 0 END)",
+        },
+    },
+    "non_video": {
+        "where": ("media IN ('Print', 'Online', 'Social Media') "
+                  "AND (post_type IS NULL OR post_type = '' OR post_type NOT IN ('Video'))"),
+        "measures": {
+            "sum_mentions": "SUM(mentions)",
+        },
+    },
+}
+
+# hr_basis ist seit dem Import normalisiert (normalize.py)
+HR_KEY = "IFNULL(hr_basis, '')"
+
+
+def summary_table(source):
+    return f"_summary_{source}"
+
+
+def _drop(conn):
+    for source in SOURCES:
+        conn.execute(f'DROP TABLE IF EXISTS "{summary_table(source)}";')
+    conn.execute("DROP TABLE IF EXISTS _summary_bids;")
+
+
+def _create(conn):
+    for source, spec in SOURCES.items():
+        measures = ", ".join(f"{name} REAL" for name in spec["measures"])
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS "{summary_table(source)}" (
+                hr_basis TEXT PRIMARY KEY NOT NULL,
+                distinct_bid INTEGER NOT NULL DEFAULT 0,
+                {measures}
+            );
+        """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS _summary_bids (
+            source TEXT NOT NULL,
+            hr_basis TEXT NOT NULL,
+            bid NOT NULL,
+            PRIMARY KEY (source, hr_basis, bid)
+        ) WITHOUT ROWID;
+    """)
+
+
+def has_summaries(conn):
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table';")}
+    return {summary_table(s) for s in SOURCES} | {"_summary_bids"} <= names
+
+
+def max_rowid(conn):
+    """Höchste rowid in data (0, wenn leer oder nicht vorhanden) – Startpunkt des nächsten Batches."""
+    try:
+        return conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM data;").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+
+
+def update_summaries(conn, since_rowid=0):
+    """
+    Rechnet die data-Zeilen mit rowid > `since_rowid` in die Summentabellen ein.
+    `since_rowid` = 0 (oder fehlende Summentabellen) baut alles neu auf.
+    Fehlen in data benötigte Spalten, werden die Summentabellen verworfen und die
+    Übersicht fällt auf die Abfrage über data zurück.
+    """
+    if since_rowid and not has_summaries(conn):
+        since_rowid = 0
+    try:
+        if not since_rowid:
+            _drop(conn)
+        _create(conn)
+        for source, spec in SOURCES.items():
+            table = summary_table(source)
+            names = list(spec["measures"])
+            exprs = ", ".join(spec["measures"].values())
+            # Summen des Batches addieren; NULL-Summen bleiben NULL wie bei SUM()
+            updates = ", ".join(
+                f"{n} = COALESCE({n} + excluded.{n}, {n}, excluded.{n})" for n in names
+            )
+            conn.execute(f"""
+                INSERT INTO "{table}" (hr_basis, {", ".join(names)})
+                SELECT {HR_KEY}, {exprs}
+                FROM data
+                WHERE rowid > ? AND {spec["where"]}
+                GROUP BY 1
+                ON CONFLICT(hr_basis) DO UPDATE SET {updates};
+            """, (since_rowid,))
+
+            # distinct_bid: neue (hr_basis, bid)-Paare merken und je hr_basis neu zählen
+            conn.execute(f"""
+                INSERT OR IGNORE INTO _summary_bids (source, hr_basis, bid)
+                SELECT DISTINCT ?, {HR_KEY}, bid
+                FROM data
+                WHERE rowid > ? AND bid IS NOT NULL AND {spec["where"]};
+            """, (source, since_rowid))
+            conn.execute(f"""
+                UPDATE "{table}" SET distinct_bid = (
+                    SELECT COUNT(*) FROM _summary_bids AS b
+                    WHERE b.source = ? AND b.hr_basis = "{table}".hr_basis
+                );
+            """, (source,))
+    except sqlite3.OperationalError:
+        _drop(conn)
+
+
+def read_summary(source, with_distinct=True, db_path="data.db"):
+    """Übersicht je hr_basis aus der Summentabelle; None, wenn (noch) nicht vorhanden."""
+    columns = ["NULLIF(hr_basis, '') AS hr_basis"] + (["distinct_bid"] if with_distinct else []) \
+        + list(SOURCES[source]["measures"])
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        if not has_summaries(conn):
+            return None
+        return pd.read_sql(
+            f'SELECT {", ".join(columns)} FROM "{summary_table(source)}" ORDER BY hr_basis;', conn
+        )
@@ -0,0 +1,304 @@
+# table_backend.py – serverseitiges Paging, Sortieren und Filtern für DataTables
+#
+# Große Ergebnistabellen werden nicht mehr komplett per to_dict("records") an den
+# Browser geschickt. Der berechnende Callback legt das Ergebnis im result_store ab
+# (SQLite-Tabelle mit laufender Zeilen-ID in der Spalte "id") und liefert nur das
+# Handle samt Token in den dcc.Store "<table_id>-view". Ein generischer Paging-
+# Callback (page_action/sort_action/filter_action = "custom") fragt daraus genau
+# die sichtbare Seite ab. Zeilenoperationen (löschen, duplizieren, Wert setzen,
+# Zelländerungen) arbeiten über die Zeilen-IDs direkt auf der Ergebnistabelle.
+
+import math
+import sqlite3
+import uuid
+
+import pandas as pd
+from dash import ClientsideFunction, Input, Output, State, ctx, dcc
+
+import result_store
+from result_store import ROW_ID
+
+PAGE_SIZE = 50
+
+# Operatoren der DataTable-Filtersyntax -> SQL
+_FILTER_OPERATORS = [
+    ("ge ", ">="), ("le ", "<="), ("lt ", "<"), ("gt ", ">"), ("ne ", "!="), ("eq ", "="),
+    ("contains ",), ("datestartswith ",),
+]
+_SQL_OPERATORS = {"ge": ">=", "le": "<=", "lt": "<", "gt": ">", "ne": "!=", "eq": "="}
+
+
+def view_store(table_id):
+    """dcc.Store mit Handle und Token – eine Token-Änderung lädt die sichtbare Seite neu."""
+    return dcc.Store(id=f"{table_id}-view")
+
+
+def _quote(col):
+    return '"' + str(col).replace('"', '""') + '"'
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table)});")]
+
+
+def view_handle(view):
+    """Handle aus dem Inhalt des View-Stores (None, wenn noch kein Ergebnis)."""
+    return (view or {}).get("handle")
+
+
+def view_token(handle, reset=False):
+    """
+    Neuer Inhalt für den View-Store – lädt die sichtbare Seite neu.
+    Mit `reset` (neues Ergebnis) springt die Tabelle auf die erste Seite.
+    """
+    return {"handle": handle, "token": uuid.uuid4().hex, "reset": reset}
+
+
+def store_view(table_id, df, db_path="data.db"):
+    """Legt `df` als neues Ergebnis für `table_id` ab und liefert den View-Store-Inhalt."""
+    return view_token(result_store.put(df, table_id, db_path), reset=True)
+
+
+def read_view(view, db_path="data.db"):
+    """Komplettes Ergebnis hinter dem View-Store (ohne Zeilen-ID) in Anzeigereihenfolge."""
+    df = result_store.get(view_handle(view), db_path)
+    return df.drop(columns=[ROW_ID]) if ROW_ID in df.columns else df
+
+
+def _split_filter_part(part):
+    for operator_type in _FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in part:
+                name_part, value_part = part.split(operator, 1)
+                name = name_part[name_part.find("{") + 1: name_part.rfind("}")]
+                value_part = value_part.strip()
+                quote = value_part[:1]
+                if len(value_part) > 1 and quote in ("'", '"', "`") and value_part[-1] == quote:
+                    value = value_part[1:-1].replace("\\" + quote, quote)
+                else:
+                    try:
+                        value = float(value_part)
+                        if value.is_integer():
+                            value = int(value)
+                    except ValueError:
+                        value = value_part
+                return name, operator_type[0].strip(), value
+    return None, None, None
+
+
+def filter_clause(filter_query, columns):
+    """
+    Übersetzt die DataTable-Filtersyntax ({col} op wert && ...) in eine
+    parametrisierte WHERE-Klausel. Unbekannte Spalten werden ignoriert.
+    """
+    conditions, params = [], []
+    for part in (filter_query or "").split(" && "):
+        col, op, value = _split_filter_part(part)
+        if col not in columns:
+            continue
+        if op in _SQL_OPERATORS:
+            conditions.append(f"{_quote(col)} {_SQL_OPERATORS[op]} ?")
+            params.append(value)
+        elif op == "contains":
+            conditions.append(f"CAST({_quote(col)} AS TEXT) LIKE ? ESCAPE '\\'")
+            params.append("%" + _escape_like(value) + "%")
+        elif op == "datestartswith":
+            conditions.append(f"CAST({_quote(col)} AS TEXT) LIKE ? ESCAPE '\\'")
+            params.append(_escape_like(value) + "%")
+    where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+    return where, params
+
+
+def _escape_like(value):
+    return str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def query_page(handle, page_current=0, page_size=PAGE_SIZE, sort_by=None,
+               filter_query="", db_path="data.db"):
+    """Liefert (Zeilen der Seite, Seitenanzahl) für den aktuellen Sort/Filter."""
+    table = result_store.table_name(handle)
+    page_size = int(page_size or PAGE_SIZE)
+    page_current = int(page_current or 0)
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        columns = _columns(conn, table)
+        if not columns:
+            return [], 1
+        where, params = filter_clause(filter_query, columns)
+        order = [
+            f"{_quote(s['column_id'])} {'DESC' if s.get('direction') == 'desc' else 'ASC'}"
+            for s in (sort_by or []) if s.get("column_id") in columns
+        ] + [ROW_ID]
+
+        total = conn.execute(f"SELECT COUNT(*) FROM {_quote(table)}{where}", params).fetchone()[0]
+        df = pd.read_sql(
+            f"SELECT * FROM {_quote(table)}{where} ORDER BY {', '.join(order)} LIMIT ? OFFSET ?",
+            conn, params=params + [page_size, page_current * page_size],
+        )
+    return df.to_dict("records"), max(1, math.ceil(total / page_size))
+
+
+def diff_pending(diff):
+    """True, wenn der Diff-Store noch nicht übertragene Änderungen enthält."""
+    return bool(diff and (diff.get("updated") or diff.get("added") or diff.get("deleted")))
+
+
+def apply_diff(handle, diff, db_path="data.db"):
+    """
+    Überträgt den im Browser gesammelten Diff (geänderte, neue und gelöschte Zeilen,
+    siehe assets/table_ops.js) in einer Transaktion in das Ergebnis hinter `handle`.
+    Neue Zeilen erhalten dabei endgültige Zeilen-IDs. Liefert die Anzahl je Art.
+    """
+    counts = {"updated": 0, "added": 0, "deleted": 0}
+    if not handle or not diff_pending(diff):
+        return counts
+    table = result_store.table_name(handle)
+    deleted = [int(i) for i in diff.get("deleted") or []]
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        columns = [c for c in _columns(conn, table) if c != ROW_ID]
+        for row in (diff.get("updated") or {}).values():
+            fields = [c for c in columns if c in row]
+            if fields and int(row[ROW_ID]) not in deleted:
+                conn.execute(
+                    f"UPDATE {_quote(table)} SET {', '.join(f'{_quote(c)} = ?' for c in fields)} WHERE {ROW_ID} = ?",
+                    [row[c] for c in fields] + [int(row[ROW_ID])],
+                )
+                counts["updated"] += 1
+        if deleted:
+            counts["deleted"] = conn.execute(
+                f"DELETE FROM {_quote(table)} WHERE {ROW_ID} IN ({','.join('?' * len(deleted))})", deleted
+            ).rowcount
+        added = diff.get("added") or []
+        if added:
+            next_id = conn.execute(f"SELECT COALESCE(MAX({ROW_ID}), -1) + 1 FROM {_quote(table)}").fetchone()[0]
+            conn.executemany(
+                f"INSERT INTO {_quote(table)} ({ROW_ID}, {', '.join(_quote(c) for c in columns)}) "
+                f"VALUES ({', '.join('?' * (len(columns) + 1))})",
+                [[next_id + i] + [row.get(c) for c in columns] for i, row in enumerate(added)],
+            )
+            counts["added"] = len(added)
+    result_store.invalidate(handle)
+    return counts
+
+
+def diff_store(table_id):
+    """dcc.Store für die noch nicht übertragenen Änderungen einer editierbaren Tabelle."""
+    return dcc.Store(id=f"{table_id}-diff")
+
+
+def register_table_paging(app, table_id, db_path="data.db", editable=False):
+    """
+    Registriert den Paging-Callback für `table_id`. Die Tabelle braucht
+    page_action/sort_action/filter_action = "custom" und daneben view_store(table_id).
+    Bei `editable` (zusätzlich diff_store(table_id)) werden Zelländerungen im Browser
+    gesammelt und vor dem Laden einer anderen Seite ins Ergebnis übernommen.
+    """
+    outputs = [Output(table_id, "data"), Output(table_id, "page_count"), Output(table_id, "page_current")]
+    states = []
+    if editable:
+        # Auswahl per Index gilt nur für die angezeigte Seite
+        outputs += [Output(table_id, "selected_rows", allow_duplicate=True),
+                    Output(f"{table_id}-diff", "data", allow_duplicate=True)]
+        states.append(State(f"{table_id}-diff", "data"))
+
+    @app.callback(
+        *outputs,
+        Input(f"{table_id}-view", "data"),
+        Input(table_id, "page_current"),
+        Input(table_id, "page_size"),
+        Input(table_id, "sort_by"),
+        Input(table_id, "filter_query"),
+        *states,
+        prevent_initial_call=True
+    )
+    def load_page(view, page_current, page_size, sort_by, filter_query, diff=None):
+        new_result = ctx.triggered_id == f"{table_id}-view" and (view or {}).get("reset")
+        # Neues Ergebnis oder geänderter Filter: zurück auf die erste Seite
+        if new_result or any(t["prop_id"].endswith(".filter_query") for t in ctx.triggered):
+            page_current = 0
+        handle = view_handle(view)
+        if editable and not new_result:
+            # Offene Änderungen der bisherigen Seite vor dem Seitenwechsel übernehmen
+            apply_diff(handle, diff, db_path)
+        if not handle:
+            rows, page_count = [], 1
+        else:
+            rows, page_count = query_page(handle, page_current, page_size, sort_by, filter_query, db_path)
+            if (page_current or 0) >= page_count:
+                # Seite existiert nach Löschen/Filtern nicht mehr – letzte Seite zeigen
+                page_current = page_count - 1
+                rows, page_count = query_page(handle, page_current, page_size, sort_by, filter_query, db_path)
+        result = (rows, page_count, page_current)
+        return result + ([], None) if editable else result
+
+    if editable:
+        app.clientside_callback(
+            ClientsideFunction("table_ops", "record_edits"),
+            Output(f"{table_id}-diff", "data", allow_duplicate=True),
+            Input(table_id, "data_timestamp"),
+            State(table_id, "data"),
+            State(table_id, "data_previous"),
+            State(f"{table_id}-diff", "data"),
+            prevent_initial_call=True
+        )
+
+
+def register_row_operations(app, table_id, select_all=None, deselect_all=None,
+                            duplicate=None, delete=None, apply_value=None):
+    """
+    Verdrahtet die Buttons einer editierbaren Tabelle mit den clientseitigen
+    Zeilenoperationen aus assets/table_ops.js. `apply_value` ist ein Tupel
+    (Button-ID, Feldauswahl-ID, Werteingabe-ID).
+    """
+    diff = f"{table_id}-diff"
+    if select_all:
+        app.clientside_callback(
+            ClientsideFunction("table_ops", "select_all"),
+            Output(table_id, "selected_rows", allow_duplicate=True),
+            Input(select_all, "n_clicks"),
+            State(table_id, "data"),
+            prevent_initial_call=True
+        )
+    if deselect_all:
+        app.clientside_callback(
+            ClientsideFunction("table_ops", "deselect_all"),
+            Output(table_id, "selected_rows", allow_duplicate=True),
+            Input(deselect_all, "n_clicks"),
+            prevent_initial_call=True
+        )
+    if duplicate:
+        app.clientside_callback(
+            ClientsideFunction("table_ops", "duplicate"),
+            Output(table_id, "data", allow_duplicate=True),
+            Output(diff, "data", allow_duplicate=True),
+            Input(duplicate, "n_clicks"),
+            State(table_id, "data"),
+            State(table_id, "selected_rows"),
+            State(diff, "data"),
+            prevent_initial_call=True
+        )
+    if delete:
+        app.clientside_callback(
+            ClientsideFunction("table_ops", "delete_rows"),
+            Output(table_id, "data", allow_duplicate=True),
+            Output(table_id, "selected_rows", allow_duplicate=True),
+            Output(diff, "data", allow_duplicate=True),
+            Input(delete, "n_clicks"),
+            State(table_id, "data"),
+            State(table_id, "selected_rows"),
+            State(diff, "data"),
+            prevent_initial_call=True
+        )
+    if apply_value:
+        button, field, value = apply_value
+        app.clientside_callback(
+            ClientsideFunction("table_ops", "apply_field"),
+            Output(table_id, "data", allow_duplicate=True),
+            Output(diff, "data", allow_duplicate=True),
+            Input(button, "n_clicks"),
+            State(table_id, "data"),
+            State(table_id, "selected_rows"),
+            State(field, "value"),
+            State(value, "value"),
+            State(diff, "data"),
+            prevent_initial_call=True
+        )
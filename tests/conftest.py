@@ -0,0 +1,18 @@
+# conftest.py – gemeinsame Fixtures der Tests
+#
+# Aufruf aus dem Projektverzeichnis:
+#   python -m pytest -q
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Leere Datenbank in einem eigenen Arbeitsverzeichnis (cache/ liegt relativ dazu)."""
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / "data.db")
@@ -0,0 +1,55 @@
+# test_bitmap_index.py – exakte distinct counts aus dem Bitmap-Index
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import bitmap_index
+from bitmap_index import BidBitmapIndex
+
+
+def _nonvideo(n_rows=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    bid = rng.integers(0, 800, n_rows)
+    sponsor = np.array(["Tissot", "Rolex", "Omega", None], dtype=object)[rng.integers(0, 4, n_rows)]
+    return pd.DataFrame({
+        "bid": bid.astype(str),
+        "hr_basis": np.where(bid % 4 == 0, "HR", "Basis"),
+        "country": np.array(["DE", "AT", "CH"])[bid % 3],
+        "channel": [f"Kanal {b % 40}" for b in bid],
+        "sponsor": sponsor,
+        "tool": np.array(["Bande", "Trikot"])[rng.integers(0, 2, n_rows)],
+    })
+
+
+@pytest.mark.parametrize("cols", [["country"], ["country", "channel"], ["sponsor"],
+                                  ["channel", "sponsor", "tool"]])
+@pytest.mark.parametrize("intersect_max", [0, 10_000])
+def test_distinct_counts_match_groupby(cols, intersect_max, monkeypatch):
+    # Einmal per gemeinsamem Durchlauf, einmal per Schnittmenge je Gruppe
+    monkeypatch.setattr(bitmap_index, "_INTERSECT_MAX_GROUPS", intersect_max)
+    df = _nonvideo()
+    index = BidBitmapIndex(df)
+    assert {"country", "channel", "hr_basis"} <= index.functional
+    assert "sponsor" not in index.functional
+
+    for hr_basis in ("Basis", "HR"):
+        expected = df[df["hr_basis"] == hr_basis].groupby(cols)["bid"].nunique()
+        groups = expected.index.to_frame(index=False)
+        unknown = groups.head(3).assign(**{cols[0]: "unbekannt"})
+        counts = index.distinct_counts(pd.concat([groups, unknown], ignore_index=True), {"hr_basis": hr_basis})
+
+        assert counts[:len(groups)].tolist() == expected.tolist()
+        assert counts[len(groups):].tolist() == [0, 0, 0]
+
+
+def test_group_counts_match_groupby():
+    df = _nonvideo()
+    index = BidBitmapIndex(df)
+    cols = ["country", "sponsor", "hr_basis"]
+
+    counts = index.group_counts(cols).set_index(cols)["distinct_bid"].sort_index()
+    expected = df.groupby(cols)["bid"].nunique().sort_index()
+
+    assert counts.index.equals(expected.index)
+    assert counts.tolist() == expected.tolist()
@@ -0,0 +1,71 @@
+# test_duration_storage.py – Dauern als ganze Sekunden: Migration und Excel-Export
+
+import sqlite3
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from export import export_table_to_excel
+from helpers import SECONDS_PER_DAY, get_generation, migrate_duration_storage, time_values_to_seconds
+
+
+def _legacy_db(db_path):
+    """Datenbank im früheren Format: Dauern als Bruchteile eines Tages."""
+    data = pd.DataFrame({
+        "bid": [1, 2],
+        "hr_basis": ["HR", "Basis"],
+        "media": ["TV/OTT", "TV/OTT"],
+        "post_type": [None, None],
+        "tool": [None, None],
+        "mentions": [1, 1],
+        "visibility": [90 / SECONDS_PER_DAY, 0.5],
+        "broadcasting_time": [3600 / SECONDS_PER_DAY, None],
+    })
+    with sqlite3.connect(db_path) as conn:
+        data.to_sql("data", conn, index=False)
+        data.to_sql("video", conn, index=False)
+
+
+def test_time_values_to_seconds_mixed_inputs():
+    seconds = time_values_to_seconds([pd.Timedelta(minutes=1), 0.5, "00:01:30", None])
+    assert seconds.tolist() == [60, 43200, 90, pd.NA]
+    assert str(seconds.dtype) == "Int32"
+
+
+def test_migrate_duration_storage_converts_once(db_path):
+    _legacy_db(db_path)
+
+    assert sorted(migrate_duration_storage(db_path)) == ["data", "video"]
+    assert migrate_duration_storage(db_path) == []
+
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT visibility, broadcasting_time FROM video ORDER BY bid;").fetchall()
+        assert get_generation(conn, "video") > 0
+        summary = conn.execute("SELECT sum_visibility FROM _summary_video WHERE hr_basis = 'HR';").fetchone()
+    assert rows == [(90, 3600), (43200, None)]
+    assert summary == (90,)
+
+
+def test_migrate_duration_storage_skips_new_database(db_path):
+    assert migrate_duration_storage(db_path) == []
+    # Später importierte Daten gelten bereits als Sekunden
+    _legacy_db(db_path)
+    assert migrate_duration_storage(db_path) == []
+
+
+def test_export_table_to_excel_writes_excel_time_values(db_path, tmp_path):
+    _legacy_db(db_path)
+    migrate_duration_storage(db_path)
+    target = tmp_path / "video.xlsx"
+
+    export_table_to_excel(db_path, "video", target=str(target))
+
+    ws = openpyxl.load_workbook(target, read_only=True)["data"]
+    header, *rows = [list(r) for r in ws.iter_rows(values_only=True)]
+    values = [dict(zip(header, r)) for r in rows]
+    assert values[0]["visibility"] == pytest.approx(90 / SECONDS_PER_DAY)
+    assert values[1]["visibility"] == pytest.approx(0.5)
+    assert values[0]["broadcasting_time"] == pytest.approx(3600 / SECONDS_PER_DAY)
+    assert values[1].get("broadcasting_time") is None
+    assert values[0]["mentions"] == 1
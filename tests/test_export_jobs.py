@@ -0,0 +1,92 @@
+# test_export_jobs.py – Export-Jobs im Spool-Verzeichnis
+
+import os
+import threading
+import time
+
+import pytest
+
+import export_jobs
+from export_jobs import cached_export_job, job_path, run_export_job
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, "SPOOL_DIR", str(tmp_path / "exports"))
+    return tmp_path / "exports"
+
+
+def _writer(text):
+    def write(path):
+        with open(path, "w") as fh:
+            fh.write(text)
+    return write
+
+
+def _files(spool, job_id):
+    return sorted(os.listdir(spool / job_id))
+
+
+def test_concurrent_cached_exports_render_once(spool):
+    calls = []
+
+    def write(path):
+        calls.append(path)
+        time.sleep(0.2)
+        with open(path, "w") as fh:
+            fh.write("export")
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cached_export_job([1], "a.csv", write)))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len({job_id for job_id, _ in results}) == 1
+    assert sorted(cached for _, cached in results) == [False, True, True, True, True]
+    job_id = results[0][0]
+    assert _files(spool, job_id) == ["a.csv"]
+    with open(job_path(job_id, "a.csv")) as fh:
+        assert fh.read() == "export"
+    assert export_jobs._inflight == {}
+
+
+def test_parallel_runs_of_one_job_use_own_temp_files(spool):
+    temp_paths = []
+    barrier = threading.Barrier(2, timeout=5)
+
+    def write(path):
+        temp_paths.append(path)
+        _writer("export")(path)
+
+    def run():
+        barrier.wait()
+        run_export_job("a.csv", write, "0" * 32)
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(set(temp_paths)) == 2
+    assert _files(spool, "0" * 32) == ["a.csv"]
+
+
+def test_failed_export_removes_only_own_temp_file(spool):
+    job_id = run_export_job("a.csv", _writer("first"))
+
+    def fail(path):
+        with open(path, "w") as fh:
+            fh.write("partial")
+        raise RuntimeError("Export fehlgeschlagen")
+
+    with pytest.raises(RuntimeError):
+        run_export_job("a.csv", fail, job_id)
+
+    assert _files(spool, job_id) == ["a.csv"]
+    with open(job_path(job_id, "a.csv")) as fh:
+        assert fh.read() == "first"
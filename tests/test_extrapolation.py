@@ -0,0 +1,94 @@
+# test_extrapolation.py – Kandidatenindex und parallele Non-Video-Extrapolation
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import extrapolation
+from extrapolation import CandidateIndex, iter_extrapolation, normalize_keys
+
+
+def _nonvideo():
+    return pd.DataFrame({
+        "bid": list(range(8)),
+        "hr_basis": ["HR", "HR", "Basis", "HR", None, "HR", "HR", "HR"],
+        "country": ["DE", "AT", "DE", "DE", "DE", None, "AT", "DE"],
+        "channel": ["A", "B", "A", "C", "A", "B", "B", "A"],
+        "pr_value": [1.0, 2.0, 3.0, np.nan, 5.0, 6.0, 7.0, 8.0],
+    })
+
+
+def test_candidate_index_matches_row_filter():
+    df = _nonvideo()
+    index = CandidateIndex(df, ["country", "channel"])
+    hr = df[df["hr_basis"] == "HR"]
+    keys = normalize_keys(hr, ["country", "channel"])
+
+    # Jeder Schlüssel liefert genau die Zeilen des früheren Filters, in derselben Reihenfolge
+    assert len(index) == len(keys.drop_duplicates())
+    for key in keys.drop_duplicates().itertuples(index=False):
+        expected = hr[(keys["country"] == key[0]) & (keys["channel"] == key[1])]
+        taken = index.take(index.positions(key))
+        assert taken["bid"].tolist() == expected["bid"].tolist()
+
+    # Fehlende Werte werden wie in row_key als Text verglichen
+    assert index.take(index.positions(("None", "B")))["bid"].tolist() == [5]
+    assert len(index.positions(("CH", "A"))) == 0
+
+
+def test_candidate_index_sampling_frame():
+    index = CandidateIndex(_nonvideo(), ["country"])
+    frame = index.sampling_frame(index.positions(("AT",)))
+
+    assert list(frame.columns) == ["pr_value", "channel", "country"]
+    assert frame["channel"].tolist() == ["B", "B"]
+    assert frame["pr_value"].tolist() == [2.0, 7.0]
+
+
+def test_candidate_index_without_hr_rows():
+    df = _nonvideo().assign(hr_basis="Basis")
+    index = CandidateIndex(df, ["country"])
+
+    assert len(index) == 0
+    assert len(index.positions(("DE",))) == 0
+
+
+def _extrapolation_input(n_candidates=600, n_percent=40):
+    rng = np.random.default_rng(0)
+    df_nonvideo = pd.DataFrame({
+        "bid": np.arange(n_candidates),
+        "hr_basis": np.where(rng.random(n_candidates) < 0.8, "HR", "Basis"),
+        "country": rng.choice(["DE", "AT", "CH"], n_candidates),
+        "channel": rng.choice([f"Kanal {i}" for i in range(12)], n_candidates),
+        "sponsor": None,
+        "pr_value": rng.random(n_candidates) * 100,
+    })
+    df_percent = pd.DataFrame({
+        "row_id": np.arange(1, n_percent + 1),
+        "country": rng.choice(["DE", "AT", "CH", "FR"], n_percent),
+        "sponsor": rng.choice(["Tissot", "Rolex"], n_percent),
+        "ids_for_HR": rng.integers(0, 40, n_percent).astype(str),
+        "avg_mentions": "2",
+        "avg_weighting_factor": "50,0",
+    })
+    return df_percent, df_nonvideo
+
+
+@pytest.mark.parametrize("strategy", ["channel", "country", "weighted"])
+def test_parallel_extrapolation_matches_serial(strategy, tmp_path, monkeypatch):
+    monkeypatch.setattr(extrapolation, "EXTRAPOLATION_CACHE_DIR", str(tmp_path))
+    df_percent, df_nonvideo = _extrapolation_input()
+
+    def run(workers):
+        batches = list(iter_extrapolation(df_percent, df_nonvideo, ["country"], ["sponsor"],
+                                          seed=11, workers=workers, strategy=strategy))
+        return pd.concat([df for df, _ in batches], ignore_index=True), [stats for _, stats in batches]
+
+    serial, serial_stats = run(1)
+    parallel, parallel_stats = run(2)
+
+    assert len(serial) > 0
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert sum(s["produced"] for s in serial_stats) == sum(s["produced"] for s in parallel_stats)
+    # Die Arrow-Datei der Kandidaten wird nach dem Lauf entfernt
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,51 @@
+# test_normalize.py – Nachnormalisierung einer Datenbank aus früheren Versionen
+
+import sqlite3
+
+import pandas as pd
+
+from helpers import get_generation, normalize_existing_data
+
+
+def _legacy_db(db_path):
+    """Datenbank ohne _normalization: Dimensionen wie früher ungetrimmt geliefert."""
+    data = pd.DataFrame({
+        "bid": [1, 2, 3],
+        "hr_basis": [" hr", "Basis ", "HR"],
+        "media": ["tv/ott", "Print", "Social Media"],
+        "post_type": [None, None, " video"],
+        "tool": [None, None, None],
+        "sponsor": [" Tissot", "Rolex", "Omega"],
+        "mentions": [1, 1, 1],
+        "visibility": [10, 20, 30],
+        "broadcasting_time": [60, None, 90],
+    })
+    with sqlite3.connect(db_path) as conn:
+        data.to_sql("data", conn, index=False)
+        # video wie vom früheren Import ohne Normalisierung angelegt
+        data[data["media"] == "Social Media"].to_sql("video", conn, index=False)
+        pd.DataFrame({"sponsor": ["Tissot "], "visibility_share": [1.0]}).to_sql("percent", conn, index=False)
+
+
+def test_normalize_existing_data_rebuilds_derived_tables(db_path):
+    _legacy_db(db_path)
+
+    changed = normalize_existing_data(db_path)
+
+    assert changed == ["data", "video", "non_video", "percent"]
+    assert normalize_existing_data(db_path) == []
+    with sqlite3.connect(db_path) as conn:
+        video = conn.execute("SELECT bid, hr_basis, sponsor FROM video ORDER BY bid;").fetchall()
+        non_video = conn.execute("SELECT bid, hr_basis FROM non_video;").fetchall()
+        percent = conn.execute("SELECT sponsor FROM percent;").fetchall()
+        generations = [get_generation(conn, tbl) for tbl in changed]
+        summary = conn.execute("SELECT sum_visibility FROM _summary_video WHERE hr_basis = 'HR';").fetchone()
+    assert video == [(1, "HR", "Tissot"), (3, "HR", "Omega")]
+    assert non_video == [(2, "Basis")]
+    assert percent == [("Tissot",)]
+    assert min(generations) > 0
+    assert summary == (40,)
+
+
+def test_normalize_existing_data_skips_empty_database(db_path):
+    assert normalize_existing_data(db_path) == []
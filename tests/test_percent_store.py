@@ -0,0 +1,97 @@
+# test_percent_store.py – Upsert der Prozenttabellen und inkrementelle Extrapolation
+
+import sqlite3
+
+import pandas as pd
+
+from extrapolation import SOURCE_KEY
+from percent_store import (ROW_KEY, ROW_VERSION, pending_percent_rows, record_extrapolation,
+                           save_percent, write_percent)
+
+PARAMS = {"mm": ["country"], "ea": ["sponsor"]}
+
+
+def _percent():
+    return pd.DataFrame({
+        "country": ["DE", "AT", "CH"],
+        "sponsor": ["Tissot", "Tissot", "Rolex"],
+        "visibility_share": [10.0, 20.0, 30.0],
+    })
+
+
+def _stored(db_path, table="percent"):
+    with sqlite3.connect(db_path) as conn:
+        return pd.read_sql(f'SELECT * FROM "{table}" ORDER BY {ROW_KEY}', conn)
+
+
+def _create_target(db_path, table="hr_bewegt"):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(f'CREATE TABLE "{table}" ({SOURCE_KEY} INTEGER, sponsor TEXT);')
+
+
+def test_save_percent_writes_only_differences(db_path):
+    written = write_percent(_percent(), "percent", db_path)
+    edited = written.copy()
+    edited.loc[0, "visibility_share"] = 15.0
+    edited = pd.concat([edited.drop(index=2), edited.iloc[[1]].assign(sponsor="Omega")], ignore_index=True)
+
+    counts, keys = save_percent(edited, "percent", db_path)
+
+    assert (counts["updated"], counts["inserted"], counts["deleted"], counts["unchanged"]) == (1, 1, 1, 1)
+    stored = _stored(db_path).set_index(ROW_KEY)
+    assert stored.loc[1, ROW_VERSION] == 2 and stored.loc[1, "visibility_share"] == 15.0
+    assert stored.loc[2, ROW_VERSION] == 1
+    assert 3 not in stored.index
+    assert keys[ROW_KEY].tolist() == [1, 2, 4]
+    # Neue Zeilen erhalten eine noch nicht vergebene Version
+    assert stored.loc[4, ROW_VERSION] > 1
+
+
+def test_write_percent_continues_versions(db_path):
+    write_percent(_percent(), "percent", db_path)
+    save_percent(write_percent(_percent(), "percent", db_path), "percent", db_path)
+    rewritten = write_percent(_percent(), "percent", db_path)
+
+    assert rewritten[ROW_VERSION].min() > 2
+
+
+def test_pending_rows_after_edit_and_removal(db_path):
+    _create_target(db_path)
+    written = write_percent(_percent(), "percent", db_path)
+    record_extrapolation("hr_bewegt", _stored(db_path), PARAMS, db_path)
+
+    assert pending_percent_rows("hr_bewegt", _stored(db_path), PARAMS, db_path) == ([], [])
+
+    edited = written.drop(index=2)
+    edited.loc[0, "visibility_share"] = 11.0
+    save_percent(edited, "percent", db_path)
+
+    assert pending_percent_rows("hr_bewegt", _stored(db_path), PARAMS, db_path) == ([1], [3])
+    # Andere Parameter erzwingen einen kompletten Lauf
+    assert pending_percent_rows("hr_bewegt", _stored(db_path), {**PARAMS, "ea": []}, db_path) is None
+
+
+def test_pending_rows_compare_values_not_only_versions(db_path):
+    _create_target(db_path)
+    write_percent(_percent(), "percent", db_path)
+    record_extrapolation("hr_bewegt", _stored(db_path), PARAMS, db_path)
+
+    # Gleiche (row_id, row_version), anderer Wert
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(f"UPDATE percent SET visibility_share = 99.0 WHERE {ROW_KEY} = 2;")
+
+    assert pending_percent_rows("hr_bewegt", _stored(db_path), PARAMS, db_path) == ([2], [])
+
+
+def test_write_percent_forgets_dependent_extrapolation(db_path):
+    _create_target(db_path)
+    _create_target(db_path, "hr_non_bewegt")
+    write_percent(_percent(), "percent", db_path)
+    write_percent(_percent(), "percent_non_video", db_path)
+    record_extrapolation("hr_bewegt", _stored(db_path), PARAMS, db_path)
+    record_extrapolation("hr_non_bewegt", _stored(db_path, "percent_non_video"), PARAMS, db_path)
+
+    write_percent(_percent(), "percent", db_path)
+
+    assert pending_percent_rows("hr_bewegt", _stored(db_path), PARAMS, db_path) is None
+    assert pending_percent_rows("hr_non_bewegt", _stored(db_path, "percent_non_video"), PARAMS, db_path) == ([], [])
@@ -0,0 +1,100 @@
+# test_sampling.py – gewichtetes Ziehen (Gumbel-Top-k), Kanal-Garantie und Länderaufteilung
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sampling import (largest_remainder, row_rng, sample_country_proportional, sample_positions,
+                      sample_weighted)
+
+
+@pytest.mark.parametrize("n", [1, 5, 10])
+def test_weighted_draw_without_replacement_respects_k(n):
+    weights = np.linspace(0.3, 1.0, 10)
+    for stream in range(50):
+        drawn = sample_positions(row_rng(42, stream), weights, n)
+        assert len(drawn) == n
+        assert len(set(drawn.tolist())) == n
+        assert drawn.min() >= 0 and drawn.max() < len(weights)
+
+
+def test_weighted_draw_with_fewer_candidates_than_requested():
+    # Weniger Kandidaten als benötigt: mit Zurücklegen auf genau n auffüllen
+    drawn = sample_positions(row_rng(42, 0), [0.5, 1.0, 0.8], 7)
+    assert len(drawn) == 7
+    assert set(drawn.tolist()) <= {0, 1, 2}
+    assert len(sample_positions(row_rng(42, 0), [], 3)) == 0
+    assert len(sample_positions(row_rng(42, 0), [1.0], 0)) == 0
+
+
+def test_weighted_draw_follows_weights():
+    # Gewicht 0 wird nie gezogen, höhere Gewichte häufiger als niedrige
+    weights = np.array([0.0, 0.3, 1.0, 0.3, 1.0])
+    counts = np.zeros(len(weights), dtype=np.int64)
+    for stream in range(2000):
+        np.add.at(counts, sample_positions(row_rng(1, stream), weights, 2), 1)
+    assert counts[0] == 0
+    assert min(counts[2], counts[4]) > 2 * max(counts[1], counts[3])
+
+
+def test_same_seed_same_draw():
+    df_cand = pd.DataFrame({"pr_value": np.arange(20, dtype=float)})
+    first = sample_weighted(row_rng(7, 3), df_cand, 6)
+    assert first.tolist() == sample_weighted(row_rng(7, 3), df_cand, 6).tolist()
+    assert first.tolist() != sample_weighted(row_rng(7, 4), df_cand, 6).tolist()
+
+
+def test_channel_guarantee_draws_every_channel_first():
+    channels = ["A", "B", "A", "C", "B", "A", None, "C"]
+    weights = np.ones(len(channels))
+    for stream in range(50):
+        drawn = sample_positions(row_rng(42, stream), weights, 5, channels)
+        picked = [channels[p] for p in drawn]
+        # Zuerst je Kanal eine Zeile in Reihenfolge des ersten Auftretens
+        assert picked[:3] == ["A", "B", "C"]
+        # Der Rest kommt wie bisher aus allen Kandidaten, untereinander ohne Zurücklegen
+        assert len(drawn) == 5
+        assert len(set(drawn[3:].tolist())) == 2
+
+
+def test_channel_guarantee_with_more_channels_than_requested():
+    channels = ["A", "B", "C", "D"]
+    drawn = sample_positions(row_rng(42, 0), np.ones(4), 2, channels)
+    assert [channels[p] for p in drawn] == ["A", "B"]
+
+
+def test_largest_remainder_allocation():
+    assert largest_remainder([5, 3, 2], 10).tolist() == [5, 3, 2]
+    # Quoten 3.5 / 2.1 / 1.4: ganze Teile 3/2/1, der Rest geht an die größten Reste
+    assert largest_remainder([5, 3, 2], 7).tolist() == [4, 2, 1]
+    # Gleiche Reste: stabile Reihenfolge
+    assert largest_remainder([1, 1, 1], 2).tolist() == [1, 1, 0]
+    assert largest_remainder([2, 0, 1], 0).tolist() == [0, 0, 0]
+    assert largest_remainder([0, 0], 3).tolist() == [0, 0]
+
+    sizes = np.random.default_rng(0).integers(1, 50, 25)
+    for n in (1, 17, 300, 5000):
+        alloc = largest_remainder(sizes, n)
+        assert alloc.sum() == n
+        # Höchstens um eins neben der exakten Quote
+        assert np.all(np.abs(alloc - n * sizes / sizes.sum()) < 1)
+
+
+def test_country_proportional_sampling():
+    df_cand = pd.DataFrame({
+        "country": ["DE"] * 6 + ["AT"] * 3 + ["CH"] + [None] * 2,
+        "pr_value": np.arange(12, dtype=float),
+    })
+    for stream in range(20):
+        drawn = sample_country_proportional(row_rng(42, stream), df_cand, 5)
+        countries = df_cand["country"].to_numpy()[drawn]
+        # 6/3/1 auf 5 verteilt: DE 3, AT 2 (größter Rest), CH 0; ohne Land nie
+        assert sorted(countries.tolist()) == ["AT", "AT", "DE", "DE", "DE"]
+        assert len(set(drawn.tolist())) == 5
+
+
+def test_country_proportional_sampling_refills_small_countries():
+    df_cand = pd.DataFrame({"country": ["DE", "DE", "AT"], "pr_value": [1.0, 2.0, 3.0]})
+    drawn = sample_country_proportional(row_rng(42, 0), df_cand, 9)
+    countries = df_cand["country"].to_numpy()[drawn]
+    assert (countries == "DE").sum() == 6 and (countries == "AT").sum() == 3